@@ -0,0 +1,129 @@
+"""Sync WSGI vs sync views under ASGI vs the native async views.
+
+Usage: python -m benchmarks.bench_async [--users 16] [--requests 200]
+
+Each mode runs in its own process against a fresh database. Requests go
+through Django's test Client (WSGI handler, one thread per virtual user) or
+AsyncClient (ASGI handler, one task per virtual user); each virtual user
+loops over detail, vote and results requests.
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+from benchmarks.common import percentile, setup
+
+MODES = ['wsgi', 'asgi-sync', 'asgi-async']
+
+
+def seed(questions=20, choices=4):
+    from django.utils import timezone
+    from polls.models import Choice, Question
+
+    ids = []
+    for n in range(questions):
+        question = Question.objects.create(question_text=f'Question {n}?', pub_date=timezone.now())
+        ids.append([question.pk, [
+            Choice.objects.create(question=question, choice_text=f'Choice {c}').pk for c in range(choices)
+        ]])
+    return ids
+
+
+def plan(seeded, user, count):
+    """Yield (method, path, data) for one virtual user."""
+    for n in range(count):
+        question_id, choice_ids = seeded[(user + n) % len(seeded)]
+        step = n % 3
+        if step == 0:
+            yield 'get', f'/polls/{question_id}/', None
+        elif step == 1:
+            yield 'post', f'/polls/{question_id}/vote/', {'choice': choice_ids[n % len(choice_ids)]}
+        else:
+            yield 'get', f'/polls/{question_id}/results/', None
+
+
+def run_wsgi(seeded, users, count):
+    from django.db import connection
+    from django.test import Client
+
+    latencies = []
+
+    def user(index):
+        client = Client()
+        for method, path, data in plan(seeded, index, count):
+            start = time.perf_counter()
+            getattr(client, method)(path, data)
+            latencies.append(time.perf_counter() - start)
+        connection.close()
+
+    threads = [threading.Thread(target=user, args=(index,)) for index in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def run_asgi(seeded, users, count):
+    from django.test import AsyncClient
+
+    latencies = []
+
+    async def user(index):
+        client = AsyncClient()
+        for method, path, data in plan(seeded, index, count):
+            start = time.perf_counter()
+            if method == 'post':
+                # AsyncClient can't read multipart bodies on Django 4.1.
+                await client.post(path, urlencode(data), content_type='application/x-www-form-urlencoded')
+            else:
+                await client.get(path)
+            latencies.append(time.perf_counter() - start)
+
+    async def main():
+        await asyncio.gather(*(user(index) for index in range(users)))
+
+    asyncio.run(main())
+    return latencies
+
+
+def child(mode, users, count):
+    setup(POLLS_ASYNC_VIEWS=mode == 'asgi-async')
+    seeded = seed()
+    start = time.perf_counter()
+    latencies = (run_wsgi if mode == 'wsgi' else run_asgi)(seeded, users, count)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(latencies, 50) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200, help='requests per user')
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        return child(args.mode, args.users, args.requests)
+    print(f'{args.users} users x {args.requests} requests')
+    print(f'{"mode":>12} {"req/s":>10} {"p50 ms":>10} {"p99 ms":>10}')
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_async', '--mode', mode,
+             '--users', str(args.users), '--requests', str(args.requests)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f'{mode:>12} {result["rps"]:>10.0f} {result["p50"]:>10.2f} {result["p99"]:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Memory and throughput of the vote dedup filter and the rate limiter.
+
+Usage: python -m benchmarks.bench_dedup [--voters 10000000] [--error-rate 0.001]
+
+Adds ``--voters`` distinct (question, voter) keys to a RotatingBloomFilter
+sized for them, then checks as many unseen keys and reports the observed
+false-positive rate. For comparison it also reports what a Python set of the
+same keys would take.
+"""
+import argparse
+import sys
+
+from benchmarks.common import BASE_DIR, Timer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--voters', type=int, default=10000000)
+    parser.add_argument('--error-rate', type=float, default=0.001)
+    args = parser.parse_args()
+    sys.path.insert(0, str(BASE_DIR))
+    from polls.dedup import RotatingBloomFilter
+    from polls.ratelimit import TokenBucketLimiter
+
+    bloom = RotatingBloomFilter(args.voters, args.error_rate)
+    with Timer() as timer:
+        for n in range(args.voters):
+            bloom.add(f'42:voter{n}')
+    print(f'filter size: {bloom.nbytes / 2 ** 20:.1f} MiB for {args.voters} voters '
+          f'({bloom.current.hashes} hashes)')
+    print(f'add:   {args.voters / timer.elapsed:,.0f}/s')
+
+    with Timer() as timer:
+        false_positives = sum(f'42:other{n}' in bloom for n in range(args.voters))
+    print(f'check: {args.voters / timer.elapsed:,.0f}/s, '
+          f'false positives {false_positives / args.voters:.4%} (target {args.error_rate:.4%})')
+
+    sample = {f'42:voter{n}' for n in range(min(args.voters, 100000))}
+    per_key = (sys.getsizeof(sample) + sum(sys.getsizeof(key) for key in sample)) / len(sample)
+    print(f'a set of the same keys: ~{per_key * args.voters / 2 ** 20:.0f} MiB')
+
+    limiter = TokenBucketLimiter(rate=1, burst=5, max_clients=100000)
+    with Timer() as timer:
+        for n in range(args.voters):
+            limiter.allow(f'10.0.{n % 256}.{n % 65536 // 256}', now=n / 1000)
+    print(f'rate limiter: {args.voters / timer.elapsed:,.0f} checks/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Published-question listing: exclude(choice__isnull=True) vs the published index.
+
+Usage: python -m benchmarks.bench_listing [--questions 1000000] [--repeat 50]
+
+Seeds the questions (a quarter in the future, a tenth without choices) and
+times the old and new index-page queries, printing each query plan.
+"""
+import argparse
+import datetime
+
+from benchmarks.common import Timer, setup
+
+
+def seed(total, batch_size=10000):
+    from django.utils import timezone
+    from polls.models import Choice, Question
+
+    now = timezone.now()
+    for start in range(0, total, batch_size):
+        questions = Question.objects.bulk_create([
+            Question(
+                question_text=f'Question {i}?',
+                pub_date=now + datetime.timedelta(minutes=i - total * 3 // 4),
+                has_choices=i % 10 != 0,
+                is_published=i % 10 != 0 and i <= total * 3 // 4,
+            )
+            for i in range(start, min(start + batch_size, total))
+        ])
+        Choice.objects.bulk_create([
+            Choice(question=question, choice_text=f'Choice {n}')
+            for question in questions if question.has_choices
+            for n in range(2)
+        ])
+
+
+def measure(label, make_queryset, repeat):
+    from django.db import connection
+
+    queryset = make_queryset()
+    with connection.cursor() as cursor:
+        sql, params = queryset.query.sql_with_params()
+        prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        cursor.execute(prefix + sql, params)
+        plan = [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+    with Timer() as timer:
+        for _ in range(repeat):
+            list(make_queryset())
+    print(f'{label}: {timer.elapsed / repeat * 1000:.2f} ms/query')
+    for line in plan:
+        print(f'    {line}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    setup()
+    from django.utils import timezone
+    from polls.models import Question
+
+    with Timer() as timer:
+        seed(args.questions)
+    print(f'Seeded {args.questions} questions in {timer.elapsed:.1f}s')
+    measure(
+        'exclude(choice__isnull=True)',
+        lambda: Question.objects.filter(pub_date__lte=timezone.now()).order_by('-pub_date').exclude(choice__isnull=True)[:5],
+        args.repeat,
+    )
+    measure(
+        'published() on is_published',
+        lambda: Question.objects.published().order_by('-pub_date')[:5],
+        args.repeat,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Connections opened per 10k requests, with and without the connection pool.
+
+Usage: python -m benchmarks.bench_pool [--requests 10000] [--threads 16] [--max-size 8]
+
+Runs the same request against two aliases of the benchmark database: one
+with the plain backend (``CONN_MAX_AGE = 0``, so one connection per request)
+and one with ``polls.backends.pooled``. Each request goes through Django's
+``request_started``/``request_finished`` signals, which open and close the
+connections as a real request does, reads a question's results and counts a
+vote. Reports connections opened, latency percentiles and throughput.
+"""
+import argparse
+import datetime
+import random
+import threading
+
+from benchmarks.common import Timer, database_settings, percentile, setup
+
+
+def seed(alias, questions=100, choices=4):
+    from django.utils import timezone
+    from polls.models import Choice, Question
+
+    now = timezone.now()
+    created = Question.objects.using(alias).bulk_create([
+        Question(question_text=f'Pool {n}?', pub_date=now - datetime.timedelta(minutes=n),
+                 has_choices=True, is_published=True)
+        for n in range(questions)
+    ])
+    Choice.objects.using(alias).bulk_create([
+        Choice(question=question, choice_text=f'Choice {c}') for question in created for c in range(choices)
+    ])
+    return list(Choice.objects.using(alias).values_list('question_id', 'pk'))
+
+
+def run(alias, choices, total, threads):
+    """Send ``total`` requests from ``threads`` threads; return latencies in ms and the wall time."""
+    from django.core.signals import request_finished, request_started
+    from django.db.models import F
+    from polls import counters
+    from polls.models import Choice
+
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(index, count):
+        rng = random.Random(index)
+        local = []
+        for _ in range(count):
+            question_id, choice_id = rng.choice(choices)
+            with Timer() as timer:
+                request_started.send(sender=None)
+                try:
+                    list(counters.with_totals(Choice.objects.using(alias).filter(question_id=question_id)))
+                    Choice.objects.using(alias).filter(pk=choice_id).update(vote=F('vote') + 1)
+                finally:
+                    request_finished.send(sender=None)
+            local.append(timer.elapsed * 1000)
+        with lock:
+            latencies.extend(local)
+
+    per_thread = [total // threads + (index < total % threads) for index in range(threads)]
+    workers = [threading.Thread(target=worker, args=(index, count)) for index, count in enumerate(per_thread)]
+    with Timer() as timer:
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    return latencies, timer.elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--max-size', type=int, default=8, help='pool MAX_SIZE')
+    args = parser.parse_args()
+
+    database = database_settings()
+    pooled = {**database, 'ENGINE': 'polls.backends.pooled',
+              'POOL': {'ENGINE': database['ENGINE'], 'MIN_SIZE': 1, 'MAX_SIZE': args.max_size, 'TIMEOUT': 30}}
+    setup(DATABASES={'default': database, 'pooled': pooled})
+    from django.db.backends.signals import connection_created
+    from polls import pool
+
+    opened = {'default': 0}
+
+    def count(sender, connection, **kwargs):
+        if connection.alias in opened:
+            opened[connection.alias] += 1
+
+    connection_created.connect(count)
+    choices = seed('default')
+
+    print(f'{args.requests} requests from {args.threads} threads')
+    print(f'{"backend":>8} {"opened":>8} {"per 10k":>8} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+    for alias, label in (('default', 'plain'), ('pooled', 'pooled')):
+        latencies, elapsed = run(alias, choices, args.requests, args.threads)
+        connections_opened = opened['default'] if alias == 'default' else pool.stats()['pooled']['created']
+        print(f'{label:>8} {connections_opened:>8} {connections_opened * 10000 / args.requests:>8.0f} '
+              f'{args.requests / elapsed:>8.0f} {percentile(latencies, 50):>8.2f} '
+              f'{percentile(latencies, 95):>8.2f} {percentile(latencies, 99):>8.2f}')
+    stats = pool.stats()['pooled']
+    print(f'pool: {stats["size"]} open, {stats["created"]} created, {stats["timeouts"]} timeouts')
+
+
+if __name__ == '__main__':
+    main()
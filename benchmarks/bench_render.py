@@ -0,0 +1,142 @@
+"""Render time of the polls pages at 10, 100 and 1000 choices (or questions).
+
+Usage: python -m benchmarks.bench_render [--sizes 10,100,1000] [--repeat 50]
+
+Renders the templates alone, with their data already in memory, three ways:
+
+* ``url tag``: the templates as they were before ``polls.rendering``, with
+  the choice loops inline and ``{% url %}`` per row.
+* ``layer``: the current templates with ``{% question_url %}`` and the
+  choice fragment rendered every time (no ``POLLS_RESULTS_CACHE``).
+* ``cached``: the same with the results cache on, so the choice lists come
+  from their cached fragments.
+
+The detail and results pages scale with the number of choices of the
+question, the index and published list with the number of questions. Reports
+the median microseconds per render.
+"""
+import argparse
+import datetime
+import statistics
+import time
+
+from benchmarks.common import setup
+
+# The templates before polls.rendering, for comparison.
+LEGACY = {
+    'detail': '''<form action="{% url "polls:vote" question.id %}" method="post">
+{% csrf_token %}
+<fieldset>
+    <legend><h1>{{ question.question_text }}</h1></legend>
+    {% for choice in question.choice_set.all %}
+        <input type="radio" name="choice" id="choice{{ forloop.counter }}" value="{{ choice.id }}">
+        <label for="{{ forloop.counter }}">
+            {{ choice.choice_text }}
+        </label><br>
+    {% endfor %}
+</fieldset>
+<input type="submit" value="Vote">
+</form>
+<a href="{% url 'polls:index' %}">Back to Questions</a>''',
+    'results': '''<h1> {{ question.question_text }}</h1>
+<ul>
+    {% for choice in choices %}
+        <li>
+            {{ choice.choice_text }} - {{ choice.total_votes }}vote{{ choice.total_votes|pluralize }}
+        </li>
+    {% endfor %}
+</ul>
+<a href="{% url 'polls:detail' question.id %}">Vote again</a> -
+<a href="{% url 'polls:index' %}">Back to Questions</a>''',
+    'index': '''{% for question in latest_question_list %}
+    <li><a href="{% url 'polls:detail' question.id %}">{{ question.question_text }}</a></li>
+{% endfor %}''',
+    'published': '''{% for question in questions %}
+    <li><a href="{% url 'polls:detail' question.id %}">{{ question.question_text }}</a></li>
+{% endfor %}''',
+}
+
+TEMPLATES = {
+    'detail': 'polls/detail.html',
+    'results': 'polls/results.html',
+    'index': 'polls/index.html',
+    'published': 'polls/question_items.html',
+}
+
+
+def seed(sizes):
+    """Create one question per size with that many choices, and max(sizes) questions for the listings."""
+    from django.db.models import Prefetch
+    from django.utils import timezone
+    from polls.models import Choice, Question
+
+    now = timezone.now()
+    questions = Question.objects.bulk_create([
+        Question(question_text=f'Render {n}?', pub_date=now - datetime.timedelta(minutes=n),
+                 has_choices=True, is_published=True)
+        for n in range(max(sizes))
+    ])
+    for question, size in zip(questions, sizes):
+        Choice.objects.bulk_create([Choice(question=question, choice_text=f'Choice {n}') for n in range(size)])
+    prefetched = Question.objects.prefetch_related(Prefetch('choice_set', queryset=Choice.objects.order_by('pk')))
+    return {size: prefetched.get(pk=question.pk) for question, size in zip(questions, sizes)}, questions
+
+
+def contexts(question, questions, size):
+    from polls import results_cache
+
+    return {
+        'detail': {'question': question},
+        'results': {'question': question, 'choices': results_cache.get_results(question.pk)},
+        'index': {'latest_question_list': questions[:size]},
+        'published': {'questions': questions[:size]},
+    }
+
+
+def time_render(template, context, request, repeat):
+    template.render(context, request)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        template.render(context, request)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000', help='choices (or questions) per page, comma separated')
+    parser.add_argument('--repeat', type=int, default=50, help='renders per page and mode')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    setup()
+    from django.template import engines
+    from django.test import RequestFactory, override_settings
+    from polls import rendering
+
+    by_size, questions = seed(sizes)
+    request = RequestFactory().get('/polls/')
+    legacy = {page: engines['django'].from_string(source) for page, source in LEGACY.items()}
+    modes = {
+        'url tag': (lambda page: legacy[page], {}),
+        'layer': (lambda page: rendering.get_template(TEMPLATES[page]), {}),
+        'cached': (lambda page: rendering.get_template(TEMPLATES[page]), {
+            'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            'POLLS_RESULTS_CACHE': 'default',
+        }),
+    }
+
+    print(f'{"page":>10} {"size":>6}' + ''.join(f'{mode + " us":>14}' for mode in modes))
+    for page in TEMPLATES:
+        for size in sizes:
+            row = []
+            for get_template, overrides in modes.values():
+                with override_settings(**overrides):
+                    context = contexts(by_size[size], questions, size)[page]
+                    row.append(time_render(get_template(page), context, request, args.repeat))
+            print(f'{page:>10} {size:>6}' + ''.join(f'{us:>14.0f}' for us in row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Question search: the SearchTerm inverted index vs question_text__icontains.
+
+Usage: python -m benchmarks.bench_search [--questions 1000000] [--repeat 20]
+
+Seeds questions made of words drawn from a fixed vocabulary, each with a few
+choices, builds the index with add_to_index() and reports p50/p95 latency of
+both approaches for common, prefix, multi-word, rare and unmatched queries.
+One question in ``RARE_EVERY`` also gets the word ``RARE_WORD``. Also
+reports the index rows per question, and how long adding ``--choices``
+choices to one question in one transaction takes, index upkeep included.
+
+The vocabulary is small, so common words are in a fifth of the questions
+and ``icontains`` finds 20 of them after reading a hundred rows. Rare and
+unmatched words make it read most or all of the table. The README (Search)
+has the numbers for 1000000 questions.
+"""
+import argparse
+import datetime
+import random
+
+from benchmarks.common import Timer, percentile, setup
+
+VOCABULARY = [
+    f'{stem}{suffix}'
+    for stem in ('colour', 'paint', 'music', 'sport', 'garden', 'travel', 'movie', 'coffee', 'python', 'planet',
+                 'winter', 'summer', 'island', 'bridge', 'rocket', 'castle', 'forest', 'market', 'violin', 'tiger')
+    for suffix in ('', 's', 'ful', 'ing', 'er', 'ist', 'ology', 'scape', 'craft', 'ware')
+]
+
+RARE_WORD = 'aurora'
+RARE_EVERY = 1000
+
+QUERIES = ['tigerware', 'colour', 'rock', 'summer island', 'pain garden', RARE_WORD, 'summer aurora', 'zeppelin']
+
+
+def seed(total, batch_size=5000):
+    from django.utils import timezone
+    from polls import search
+    from polls.models import Choice, Question
+
+    rng = random.Random(42)
+    now = timezone.now()
+    for start in range(0, total, batch_size):
+        texts = [
+            f'{" ".join(rng.choice(VOCABULARY) for _ in range(5)).capitalize()}'
+            f'{" " + RARE_WORD if i % RARE_EVERY == 0 else ""} #{i}?'
+            for i in range(start, min(start + batch_size, total))
+        ]
+        questions = Question.objects.bulk_create([
+            Question(question_text=text, pub_date=now - datetime.timedelta(minutes=i),
+                     has_choices=True, is_published=True)
+            for i, text in enumerate(texts, start)
+        ])
+        choices = {question.pk: [rng.choice(VOCABULARY) for _ in range(3)] for question in questions}
+        Choice.objects.bulk_create([
+            Choice(question=question, choice_text=text)
+            for question in questions for text in choices[question.pk]
+        ])
+        search.add_to_index((question.pk, question.question_text, choices[question.pk]) for question in questions)
+
+
+def add_choices(count):
+    """Add ``count`` choices to a new question in one transaction, as the admin inline does."""
+    from django.db import transaction
+    from django.utils import timezone
+    from polls.models import Choice, Question
+
+    question = Question.objects.create(question_text='Which of these many options?', pub_date=timezone.now())
+    with transaction.atomic():
+        for n in range(count):
+            Choice.objects.create(question=question, choice_text=f'Option number {n}')
+
+
+def measure(label, run, repeat):
+    timings = []
+    for _ in range(repeat):
+        with Timer() as timer:
+            results = run()
+        timings.append(timer.elapsed * 1000)
+    print(f'    {label:<10} p50 {percentile(timings, 50):8.2f} ms   p95 {percentile(timings, 95):8.2f} ms'
+          f'   {len(results)} result(s)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--choices', type=int, default=1000, help='choices added to one question in one transaction')
+    args = parser.parse_args()
+    setup()
+    from django.db import connection
+    from polls import search
+    from polls.models import Question, SearchTerm
+
+    with Timer() as timer:
+        seed(args.questions)
+    print(f'Seeded and indexed {args.questions} questions in {timer.elapsed:.1f}s')
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    print(f'{SearchTerm.objects.count() / args.questions:.1f} index rows per question')
+    with Timer() as timer:
+        add_choices(args.choices)
+    print(f'Added {args.choices} choices to one question in {timer.elapsed:.2f}s')
+
+    for query in QUERIES:
+        print(f'{query!r}:')
+        measure('index', lambda: search.search_questions(query), args.repeat)
+
+        def icontains():
+            questions = Question.objects.published()
+            for word in query.split():
+                questions = questions.filter(question_text__icontains=word)
+            return list(questions.order_by('-pub_date')[:20])
+
+        measure('icontains', icontains, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Boot time and time to first response of a fresh worker, with and without warm-up.
+
+Usage:
+    python -m benchmarks.bench_startup [--runs 10] [--path /polls/]
+                                       [--setting POLLS_PAGE_CACHE=... ...]
+                                       [--save baseline.json] [--compare baseline.json]
+
+Migrates and seeds the benchmark database once, then boots ``--runs`` fresh
+interpreters per mode (``POLLS_WARM_UP`` on and off). Each one goes through
+the phases of ``polls.startup`` and serves one request to ``--path``. Reports
+the median of each phase, the boot time before the first request, the first
+request itself, and the time to first response, measured from spawning the
+interpreter (interpreter startup included).
+
+``--save`` and ``--compare`` work as in ``benchmarks.loadtest``: the run
+fails if the time to first response or the first request of a mode got
+slower than the baseline by more than ``--threshold``.
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import BASE_DIR, Timer, configure, setup
+from benchmarks.loadtest import parse_setting
+from polls.startup import PHASES, profile_boot
+
+MODES = {'warm': True, 'cold': False}
+
+
+def seed(questions=50, choices=4):
+    from django.utils import timezone
+    from polls.models import Choice, Question
+
+    now = timezone.now()
+    created = Question.objects.bulk_create([
+        Question(question_text=f'Startup {n}?', pub_date=now - datetime.timedelta(minutes=n),
+                 has_choices=True, is_published=True)
+        for n in range(questions)
+    ])
+    Choice.objects.bulk_create([
+        Choice(question=question, choice_text=f'Choice {n}') for question in created for n in range(choices)
+    ])
+
+
+def child(args):
+    """Boot in this (fresh) interpreter and print the profile as JSON."""
+    overrides = dict(json.loads(args.child_settings))
+    profile = profile_boot(args.warm_up, args.path, configure=lambda: configure(**overrides))
+    profile['first_response'] = time.time() - args.spawned_at
+    del profile['modules']
+    print(json.dumps(profile))
+
+
+def boot(warm_up, path, settings):
+    command = [sys.executable, '-m', 'benchmarks.bench_startup', '--child', '--path', path,
+               '--child-settings', json.dumps(settings), '--spawned-at', repr(time.time())]
+    if not warm_up:
+        command.append('--no-warm-up')
+    process = subprocess.run(command, cwd=BASE_DIR, capture_output=True, text=True, check=True)
+    return json.loads(process.stdout)
+
+
+def summarize(profiles):
+    """Return the medians, in milliseconds, of a mode's runs."""
+    phases = {phase: statistics.median(p['timings'][phase] for p in profiles) * 1000 for phase in profiles[0]['timings']}
+    boot_ms = statistics.median(
+        sum(seconds for phase, seconds in p['timings'].items() if phase != 'first_request') for p in profiles
+    ) * 1000
+    return {
+        'phases_ms': phases,
+        'boot_ms': boot_ms,
+        'first_request_ms': phases['first_request'],
+        'first_response_ms': statistics.median(p['first_response'] for p in profiles) * 1000,
+        'status': profiles[0]['status'],
+    }
+
+
+def print_report(report):
+    print(f'{"ms":>22}' + ''.join(f'{mode:>10}' for mode in report))
+    for phase, _ in PHASES:
+        print(f'{phase:>22}' + ''.join(
+            f'{row["phases_ms"][phase]:>10.1f}' if phase in row['phases_ms'] else f'{"-":>10}' for row in report.values()
+        ))
+    for metric, label in (('boot_ms', 'boot'), ('first_response_ms', 'time to first response')):
+        print(f'{label:>22}' + ''.join(f'{row[metric]:>10.1f}' for row in report.values()))
+
+
+def compare(report, baseline, threshold):
+    """Return a list of regressions of ``report`` against ``baseline``."""
+    regressions = []
+    for mode, row in report.items():
+        before = baseline.get(mode)
+        if before is None:
+            continue
+        for metric in ('first_response_ms', 'first_request_ms'):
+            if row[metric] > before[metric] * (1 + threshold):
+                regressions.append(f'{mode}: {metric} {before[metric]:.1f} -> {row[metric]:.1f}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='fresh interpreters booted per mode')
+    parser.add_argument('--path', default='/polls/', help='path of the first request')
+    parser.add_argument('--setting', type=parse_setting, action='append', default=[],
+                        help='Django setting for the run as NAME=JSON, e.g. POLLS_PAGE_CACHE="default"')
+    parser.add_argument('--save', help='write the report to this JSON file')
+    parser.add_argument('--compare', help='flag regressions against this JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.20,
+                        help='relative slowdown counted as a regression (default: 0.20)')
+    # Used by the parent to boot each child.
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--child-settings', default='[]', help=argparse.SUPPRESS)
+    parser.add_argument('--spawned-at', type=float, help=argparse.SUPPRESS)
+    parser.add_argument('--no-warm-up', dest='warm_up', action='store_false', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    # The children share the database migrated and seeded here.
+    if not os.environ.get('BENCH_DB_NAME') and os.environ.get('BENCH_DB_ENGINE', 'sqlite3').endswith('sqlite3'):
+        os.environ['BENCH_DB_NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    setup(**dict(args.setting))
+    seed()
+
+    report = {}
+    for mode, warm_up in MODES.items():
+        with Timer() as timer:
+            profiles = [boot(warm_up, args.path, args.setting) for _ in range(args.runs)]
+        report[mode] = summarize(profiles)
+        print(f'Booted {args.runs} {mode} workers in {timer.elapsed:.1f}s, first response {report[mode]["status"]}')
+    print_report(report)
+
+    if args.save:
+        options = {key: value for key, value in vars(args).items() if key in ('runs', 'path', 'setting')}
+        with open(args.save, 'w') as target:
+            json.dump({'options': options, 'results': report}, target, indent=2)
+        print(f'Saved baseline to {args.save}')
+    if args.compare:
+        with open(args.compare) as source:
+            baseline = json.load(source)
+        regressions = compare(report, baseline['results'], args.threshold)
+        if regressions:
+            print(f'Regressions against {args.compare}:')
+            for regression in regressions:
+                print(f'    {regression}')
+            sys.exit(1)
+        print(f'No regressions against {args.compare}.')
+
+
+if __name__ == '__main__':
+    main()
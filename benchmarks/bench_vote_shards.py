@@ -0,0 +1,57 @@
+"""Concurrent voters hammering one choice, for several shard counts.
+
+Usage: python -m benchmarks.bench_vote_shards [--voters 16] [--votes 200] [--shards 0 1 4 16]
+
+Shard count 0 is the plain ``UPDATE choice SET vote = vote + 1`` path. On
+SQLite every write takes the database-wide lock, so sharding only pays off on
+a server database such as PostgreSQL (see ``benchmarks/common.py``).
+"""
+import argparse
+import threading
+
+from benchmarks.common import Timer, setup
+
+
+def run(shards, voters, votes):
+    from django.db import connection
+    from django.utils import timezone
+    from polls import counters
+    from polls.models import Choice, Question
+
+    question = Question.objects.create(question_text=f'Shards {shards}?', pub_date=timezone.now())
+    choice = Choice.objects.create(question=question, choice_text='Hot choice')
+    barrier = threading.Barrier(voters)
+
+    def voter():
+        barrier.wait()
+        for _ in range(votes):
+            counters.increment(choice.pk, shards=shards)
+        connection.close()
+
+    threads = [threading.Thread(target=voter) for _ in range(voters)]
+    with Timer() as timer:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    counters.rollup([choice.pk])
+    choice.refresh_from_db()
+    assert choice.vote == voters * votes, (choice.vote, voters * votes)
+    return choice.vote / timer.elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--voters', type=int, default=16)
+    parser.add_argument('--votes', type=int, default=200, help='votes per voter')
+    parser.add_argument('--shards', type=int, nargs='+', default=[0, 1, 4, 16])
+    args = parser.parse_args()
+    setup()
+    print(f'{args.voters} voters x {args.votes} votes')
+    print(f'{"shards":>8} {"votes/s":>12}')
+    for shards in args.shards:
+        print(f'{shards:>8} {run(shards, args.voters, args.votes):>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
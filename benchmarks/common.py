@@ -0,0 +1,106 @@
+"""Shared setup for the benchmark scripts.
+
+The scripts configure Django on their own so they never touch the project
+database. By default they use a throwaway SQLite file; point them at another
+database with the ``BENCH_DB_*`` environment variables, e.g.::
+
+    BENCH_DB_ENGINE=django.db.backends.postgresql BENCH_DB_NAME=bench \\
+        python -m benchmarks.bench_vote_shards
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def database_settings():
+    """Return the DATABASES['default'] entry for the benchmark database."""
+    engine = os.environ.get('BENCH_DB_ENGINE', 'django.db.backends.sqlite3')
+    if engine.endswith('sqlite3'):
+        name = os.environ.get('BENCH_DB_NAME') or os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+        return {'ENGINE': engine, 'NAME': name, 'OPTIONS': {'timeout': 60}}
+    return {
+        'ENGINE': engine,
+        'NAME': os.environ.get('BENCH_DB_NAME', 'bench'),
+        'USER': os.environ.get('BENCH_DB_USER', ''),
+        'PASSWORD': os.environ.get('BENCH_DB_PASSWORD', ''),
+        'HOST': os.environ.get('BENCH_DB_HOST', ''),
+        'PORT': os.environ.get('BENCH_DB_PORT', ''),
+    }
+
+
+def configure(**overrides):
+    """Configure the benchmark settings, without setting up Django."""
+    sys.path.insert(0, str(BASE_DIR))
+    from django.conf import settings
+
+    options = dict(
+        DEBUG=False,
+        SECRET_KEY='benchmark',
+        ALLOWED_HOSTS=['*'],
+        USE_TZ=True,
+        ROOT_URLCONF='sondage.urls',
+        DATABASES={'default': database_settings()},
+        DEFAULT_AUTO_FIELD='django.db.models.BigAutoField',
+        INSTALLED_APPS=[
+            'polls.apps.PollsConfig',
+            'django.contrib.admin',
+            'django.contrib.auth',
+            'django.contrib.contenttypes',
+            'django.contrib.sessions',
+            'django.contrib.messages',
+            'django.contrib.staticfiles',
+        ],
+        MIDDLEWARE=[
+            'django.contrib.sessions.middleware.SessionMiddleware',
+            'django.middleware.common.CommonMiddleware',
+            'django.contrib.auth.middleware.AuthenticationMiddleware',
+            'django.contrib.messages.middleware.MessageMiddleware',
+        ],
+        TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'DIRS': [BASE_DIR / 'templates'],
+            'APP_DIRS': True,
+            'OPTIONS': {'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ]},
+        }],
+        STATIC_URL='static/',
+    )
+    options.update(overrides)
+    settings.configure(**options)
+
+
+def setup(**overrides):
+    """Configure Django for a benchmark run and migrate a fresh database."""
+    configure(**overrides)
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command('migrate', verbosity=0)
+
+
+class Timer:
+    """Context manager measuring elapsed wall time in seconds."""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+
+
+def percentile(values, pct):
+    """Return the pct-th percentile (0-100) of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
@@ -0,0 +1,221 @@
+"""Load test of the whole project URLconf with concurrent virtual users.
+
+Usage:
+    python -m benchmarks.loadtest [--questions 1000] [--choices 4] [--votes 100000]
+                                  [--users 16] [--requests 200]
+                                  [--mix index=1,detail=3,vote=2,results=3]
+                                  [--setting POLLS_VOTE_SHARDS=8 ...]
+                                  [--save baseline.json] [--compare baseline.json]
+
+Seeds the given volumes into a fresh database, then runs ``--users`` threads,
+each sending ``--requests`` requests through Django's test Client to
+``sondage.urls``. Each request picks a page at random, weighted by
+``--mix``. Reports throughput, latency percentiles and database queries per
+request, overall and per page.
+
+``--save`` writes the report as a JSON baseline. ``--compare`` checks the run
+against a saved baseline and exits with status 1 if any page got slower by
+more than ``--threshold`` (p50/p95 latency or throughput), or started running
+more queries. Compare runs made on the same machine with the same options.
+"""
+import argparse
+import datetime
+import json
+import random
+import sys
+import threading
+import time
+
+from benchmarks.common import Timer, percentile, setup
+
+PAGES = ('index', 'detail', 'vote', 'results')
+DEFAULT_MIX = 'index=1,detail=3,vote=2,results=3'
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        page, _, weight = part.partition('=')
+        if page not in PAGES:
+            raise argparse.ArgumentTypeError(f'unknown page {page!r}, expected one of {", ".join(PAGES)}')
+        mix[page] = float(weight or 1)
+    return mix
+
+
+def parse_setting(value):
+    name, _, raw = value.partition('=')
+    try:
+        return name, json.loads(raw)
+    except ValueError:
+        return name, raw
+
+
+def seed(questions, choices, votes, batch_size=5000):
+    """Create published questions with choices and spread ``votes`` over the choices at random."""
+    from django.utils import timezone
+    from polls.models import Choice, Question
+
+    rng = random.Random(0)
+    now = timezone.now()
+    seeded = []
+    per_choice = votes / max(1, questions * choices)
+    for start in range(0, questions, batch_size):
+        batch = Question.objects.bulk_create([
+            Question(question_text=f'Question {n}?', pub_date=now - datetime.timedelta(minutes=n),
+                     has_choices=True, is_published=True)
+            for n in range(start, min(start + batch_size, questions))
+        ])
+        created = Choice.objects.bulk_create([
+            Choice(question=question, choice_text=f'Choice {c}', vote=round(rng.uniform(0, 2 * per_choice)))
+            for question in batch for c in range(choices)
+        ])
+        by_question = {}
+        for choice in created:
+            by_question.setdefault(choice.question_id, []).append(choice.pk)
+        seeded.extend(by_question.items())
+    return seeded
+
+
+def request_for(page, seeded, rng):
+    """Return (method, path, data) for a request to the given page."""
+    if page == 'index':
+        return 'get', '/polls/', None
+    question_id, choice_ids = rng.choice(seeded)
+    if page == 'vote':
+        return 'post', f'/polls/{question_id}/vote/', {'choice': rng.choice(choice_ids)}
+    if page == 'results':
+        return 'get', f'/polls/{question_id}/results/', None
+    return 'get', f'/polls/{question_id}/', None
+
+
+def run(seeded, users, count, mix):
+    """Run the virtual users; return {page: [(seconds, queries, status)]} and the wall time."""
+    from django.db import connection
+    from django.test import Client
+    from polls import metrics
+
+    samples = {page: [] for page in mix}
+    lock = threading.Lock()
+    pages, weights = list(mix), list(mix.values())
+
+    def user(index):
+        client = Client()
+        rng = random.Random(index)
+        local = []
+        for _ in range(count):
+            page = rng.choices(pages, weights)[0]
+            method, path, data = request_for(page, seeded, rng)
+            stats = metrics.RequestStats()
+            token = metrics.current.set(stats)
+            start = time.perf_counter()
+            try:
+                response = getattr(client, method)(path, data)
+            finally:
+                metrics.current.reset(token)
+            local.append((page, time.perf_counter() - start, stats.queries, response.status_code))
+        with lock:
+            for page, seconds, queries, status in local:
+                samples[page].append((seconds, queries, status))
+        connection.close()
+
+    threads = [threading.Thread(target=user, args=(index,)) for index in range(users)]
+    with Timer() as timer:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return samples, timer.elapsed
+
+
+def summarize(samples, elapsed):
+    """Return {'all': {...}, page: {...}} with throughput, latency percentiles and queries per request."""
+    def summary(rows):
+        latencies = [seconds * 1000 for seconds, _, _ in rows]
+        return {
+            'requests': len(rows),
+            'rps': len(rows) / elapsed if elapsed else 0,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'queries_per_request': sum(queries for _, queries, _ in rows) / len(rows) if rows else 0,
+            'errors': sum(status >= 400 for _, _, status in rows),
+        }
+
+    report = {page: summary(rows) for page, rows in samples.items()}
+    report['all'] = summary([row for rows in samples.values() for row in rows])
+    return report
+
+
+def print_report(report):
+    print(f'{"page":>8} {"requests":>9} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"queries":>8} {"errors":>7}')
+    for page, row in report.items():
+        print(f'{page:>8} {row["requests"]:>9} {row["rps"]:>9.0f} {row["p50_ms"]:>9.2f} {row["p95_ms"]:>9.2f} '
+              f'{row["p99_ms"]:>9.2f} {row["queries_per_request"]:>8.2f} {row["errors"]:>7}')
+
+
+def compare(report, baseline, threshold):
+    """Return a list of regressions of ``report`` against ``baseline``."""
+    regressions = []
+    for page, row in report.items():
+        before = baseline.get(page)
+        if before is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            if row[metric] > before[metric] * (1 + threshold):
+                regressions.append(f'{page}: {metric} {before[metric]:.2f} -> {row[metric]:.2f}')
+        if row['rps'] < before['rps'] * (1 - threshold):
+            regressions.append(f'{page}: req/s {before["rps"]:.0f} -> {row["rps"]:.0f}')
+        # Query counts are deterministic enough to flag any increase.
+        if row['queries_per_request'] > before['queries_per_request'] + 0.05:
+            regressions.append(f'{page}: queries/request {before["queries_per_request"]:.2f} '
+                               f'-> {row["queries_per_request"]:.2f}')
+        if row['errors'] > before['errors']:
+            regressions.append(f'{page}: errors {before["errors"]} -> {row["errors"]}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=1000)
+    parser.add_argument('--choices', type=int, default=4, help='choices per question')
+    parser.add_argument('--votes', type=int, default=100000, help='votes already cast, spread over the choices')
+    parser.add_argument('--users', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200, help='requests per user')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'relative weight of each page (default: {DEFAULT_MIX})')
+    parser.add_argument('--setting', type=parse_setting, action='append', default=[],
+                        help='Django setting for the run as NAME=JSON, e.g. POLLS_VOTE_SHARDS=8')
+    parser.add_argument('--save', help='write the report to this JSON file')
+    parser.add_argument('--compare', help='flag regressions against this JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative latency/throughput change counted as a regression (default: 0.10)')
+    args = parser.parse_args()
+
+    setup(**dict(args.setting))
+    with Timer() as timer:
+        seeded = seed(args.questions, args.choices, args.votes)
+    print(f'Seeded {args.questions} questions x {args.choices} choices in {timer.elapsed:.1f}s')
+    print(f'{args.users} users x {args.requests} requests, mix {args.mix}')
+    samples, elapsed = run(seeded, args.users, args.requests, args.mix)
+    report = summarize(samples, elapsed)
+    print_report(report)
+
+    if args.save:
+        options = {key: value for key, value in vars(args).items() if key not in ('save', 'compare')}
+        with open(args.save, 'w') as target:
+            json.dump({'options': options, 'results': report}, target, indent=2)
+        print(f'Saved baseline to {args.save}')
+    if args.compare:
+        with open(args.compare) as source:
+            baseline = json.load(source)
+        regressions = compare(report, baseline['results'], args.threshold)
+        if regressions:
+            print(f'Regressions against {args.compare}:')
+            for regression in regressions:
+                print(f'    {regression}')
+            sys.exit(1)
+        print(f'No regressions against {args.compare}.')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,31 @@
-from django.contrib import admin
+import datetime
 
 from django.contrib import admin
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.utils import timezone
+from django.utils.text import smart_split, unescape_string_literal
+
 from .models import Question, Choice
+from .pagination import EstimatedCountPaginator
+from . import counters, search
 
 class ChoiceInLine(admin.TabularInline):
     model = Choice
     extra = 3
+    readonly_fields = ['total_votes']
+
+    def get_queryset(self, request):
+        # Totals in the same query as the choices instead of one per row.
+        return counters.with_totals(super().get_queryset(request)).order_by('pk')
+
+    @admin.display(description='Total votes')
+    def total_votes(self, obj):
+        """Votes including those not yet rolled up from the shards."""
+        if obj.pk is None:
+            return 0
+        if hasattr(obj, 'total_votes'):
+            return obj.total_votes
+        return counters.total_votes(obj)
     
     
 class QuestionAdmin(admin.ModelAdmin):
@@ -18,6 +38,28 @@ class QuestionAdmin(admin.ModelAdmin):
     list_display = ('question_text', 'pub_date', 'was_published_recently')
     list_filter = ['pub_date']
     search_fields = ['question_text']
+    # Estimate the size of the unfiltered table instead of counting it.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        now = timezone.now()
+        return super().get_queryset(request).annotate(published_recently=ExpressionWrapper(
+            Q(pub_date__gte=now - datetime.timedelta(days=1), pub_date__lte=now),
+            output_field=BooleanField(),
+        ))
+
+    def get_search_results(self, request, queryset, search_term):
+        """Search question texts through the index in polls.search, one filter per word."""
+        for bit in smart_split(search_term):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            queryset = search.filter_question_text(queryset, bit)
+        return queryset, False
+
+    @admin.display(boolean=True, ordering='published_recently', description='Published recently?')
+    def was_published_recently(self, obj):
+        return obj.published_recently
     
 
-admin.site.register(Question, QuestionAdmin)
\ No newline at end of file
+admin.site.register(Question, QuestionAdmin)
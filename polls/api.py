@@ -0,0 +1,155 @@
+"""JSON API for results and votes.
+
+* ``GET api/<pk>/results/``: ``{"question": id, "question_text": ..., "choices":
+  [{"id", "choice_text", "total_votes"}, ...]}``, with an ``ETag``. A request
+  whose ``If-None-Match`` matches gets a 304. With ``POLLS_RESULTS_CACHE`` on
+  (and no read-your-votes buffer) the ETag is the question's results version
+  and is checked before the results are read; otherwise it is a hash of the
+  body.
+* ``POST api/<pk>/vote/`` with the JSON body ``{"choice": id}``: counts the
+  vote and answers with the updated results, in the same shape, instead of
+  redirecting. Other content types get a 415, rate limited clients a 429
+  with ``Retry-After``, voters who already voted a 409.
+* ``GET api/results/?ids=1,2,3``: ``{"results": [...], "missing": [ids]}`` for
+  up to ``MAX_BATCH_IDS`` questions; ids that aren't published questions are
+  listed in ``missing``.
+
+Database queries per request, with vote shards and the vote buffer off:
+
+=========================  ==========================================
+results, 304 or cache hit  1 (published check)
+results, cache miss        2 (published check, choices with totals)
+vote                       3 (choice lookup, counter update, results)
+vote, buffered             2 (choice lookup, results, unless cached)
+batch                      1, whatever the number of ids
+=========================  ==========================================
+
+Vote shards add no query to reads (totals are a join) and one or two to a
+vote when a shard row has to be created.
+"""
+import json
+import math
+
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, set_response_etag
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST, require_safe
+
+from . import counters, ratelimit, results_cache, routers, vote_buffer
+from .models import Choice, Question
+from .views import record_vote
+
+MAX_BATCH_IDS = 100
+
+
+def results_version_etag(question_id):
+    """Return the ETag of the question's results without reading them, or None if it can't."""
+    cache = results_cache.get_cache()
+    if cache is None:
+        return None
+    if vote_buffer.enabled() and vote_buffer.get_config()['READ_YOUR_VOTES']:
+        # Buffered votes show up in the results before the version is bumped.
+        return None
+    return f'"{question_id}-{results_cache.get_version(cache, question_id)}"'
+
+
+def results_payload(question):
+    return {
+        'question': question.pk,
+        'question_text': question.question_text,
+        'choices': vote_buffer.with_pending(results_cache.get_results(question.pk)),
+    }
+
+
+@require_safe
+@routers.read_from_replica
+def results(request, pk):
+    """Results of a published question, answering 304 when the client's copy is current."""
+    question = get_object_or_404(Question.objects.published().only('pk', 'question_text'), pk=pk)
+    etag = results_version_etag(question.pk)
+    if etag is not None:
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+    response = JsonResponse(results_payload(question))
+    if etag is None:
+        set_response_etag(response)
+    else:
+        response['ETag'] = etag
+    return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
+@csrf_exempt
+@require_POST
+def vote(request, pk):
+    """Count a vote and return the updated results.
+
+    Exempt from CSRF, as clients of the API have no form to take a token
+    from. The vote is still tied to the client's cookies (the dedup voter and
+    the sticky-primary window), so only JSON bodies are accepted: a form on
+    another site can't send one, and a cross-origin ``fetch()`` with that
+    content type needs a CORS preflight this site never grants.
+    """
+    if request.content_type != 'application/json':
+        return JsonResponse({'error': 'unsupported_media_type'}, status=415)
+    rejected = ratelimit.rejection(request, pk)
+    if rejected is not None:
+        reason, wait = rejected
+        response = JsonResponse({'error': reason}, status=429 if reason == 'rate_limited' else 409)
+        if wait:
+            response['Retry-After'] = str(math.ceil(wait))
+        return response
+    try:
+        choice = Choice.objects.select_related('question').get(
+            pk=json.loads(request.body)['choice'], question__in=Question.objects.published().filter(pk=pk),
+        )
+    except (KeyError, TypeError, ValueError, Choice.DoesNotExist):
+        get_object_or_404(Question.objects.published(), pk=pk)
+        return JsonResponse({'error': 'invalid_choice'}, status=400)
+    record_vote(request, pk, choice.pk)
+    response = JsonResponse(results_payload(choice.question))
+    routers.make_sticky(response)
+    return ratelimit.remember(request, pk, response)
+
+
+def parse_ids(value):
+    """Parse ``?ids=`` into a list of distinct question ids, in request order."""
+    try:
+        ids = list(dict.fromkeys(int(part) for part in value.split(',') if part.strip()))
+    except ValueError:
+        raise ValueError('ids must be comma-separated integers.')
+    if not ids:
+        raise ValueError('ids is required.')
+    if len(ids) > MAX_BATCH_IDS:
+        raise ValueError(f'At most {MAX_BATCH_IDS} ids per request.')
+    return ids
+
+
+@require_safe
+@routers.read_from_replica
+def batch_results(request):
+    """Results of many published questions (``?ids=1,2,3``) in one query."""
+    try:
+        ids = parse_ids(request.GET.get('ids', ''))
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    rows = counters.with_totals(
+        # published() as a join.
+        Choice.objects.filter(question_id__in=ids, question__is_published=True)
+    ).order_by('question_id', 'pk').values('question_id', 'question__question_text', 'id', 'choice_text', 'total_votes')
+    found = {}
+    for row in rows:
+        question = found.setdefault(row['question_id'], {
+            'question': row['question_id'],
+            'question_text': row['question__question_text'],
+            'choices': [],
+        })
+        question['choices'].append({'id': row['id'], 'choice_text': row['choice_text'],
+                                    'total_votes': row['total_votes']})
+    for question in found.values():
+        question['choices'] = vote_buffer.with_pending(question['choices'])
+    return JsonResponse({
+        'results': [found[question_id] for question_id in ids if question_id in found],
+        'missing': [question_id for question_id in ids if question_id not in found],
+    })
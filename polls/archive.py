@@ -0,0 +1,114 @@
+"""Archival of old polls out of the hot ``Question`` and ``Choice`` tables.
+
+``manage.py archive_polls --older-than DAYS`` moves every question published
+more than DAYS ago, a batch at a time, into ``ArchivedQuestion``: one row per
+question holding its text, date and final results (votes still held in
+shards included). The question, its choices and everything hanging off them
+(vote shards, events, vote buckets, search terms) are then deleted.
+
+``ResultsView`` falls back to the archive for questions it can't find, so
+results URLs keep working; voting on an archived poll is a 404.
+
+The archive lives in the ``default`` database unless ``POLLS_ARCHIVE_DATABASE``
+names another alias, e.g. a separate SQLite file (migrate it with
+``manage.py migrate --database <alias>``). Archive only polls that no longer
+get votes: votes still held by the vote buffer for an archived choice are
+dropped when the buffer is flushed.
+"""
+import statistics
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+
+from . import counters
+from .models import ArchivedQuestion, Choice, Question
+
+
+def archive_database():
+    return getattr(settings, 'POLLS_ARCHIVE_DATABASE', 'default')
+
+
+def get_archived(question_id):
+    """Return the archived question with the given id, or None."""
+    return ArchivedQuestion.objects.using(archive_database()).filter(pk=question_id).first()
+
+
+async def aget_archived(question_id):
+    return await ArchivedQuestion.objects.using(archive_database()).filter(pk=question_id).afirst()
+
+
+def archive_batch(question_ids):
+    """Copy the questions and their results to the archive, then delete them; return (questions, choices)."""
+    results = defaultdict(list)
+    rows = counters.with_totals(Choice.objects.filter(question_id__in=question_ids)).order_by('question_id', 'pk')
+    for row in rows.values('question_id', 'id', 'choice_text', 'total_votes'):
+        results[row.pop('question_id')].append(row)
+    now = timezone.now()
+    archived = [
+        ArchivedQuestion(id=pk, question_text=text, pub_date=pub_date, archived_at=now, results=results[pk])
+        for pk, text, pub_date in Question.objects.filter(pk__in=question_ids).values_list('pk', 'question_text', 'pub_date')
+    ]
+    using = archive_database()
+    # Archive first: if the delete fails, the next run archives the batch again.
+    with transaction.atomic(using=using):
+        ArchivedQuestion.objects.using(using).filter(pk__in=question_ids).delete()
+        ArchivedQuestion.objects.using(using).bulk_create(archived)
+    with transaction.atomic():
+        Question.objects.filter(pk__in=question_ids).delete()
+    return len(archived), sum(len(choices) for choices in results.values())
+
+
+def archive(cutoff, batch_size=500):
+    """Archive every question published before ``cutoff``; yield (questions, choices) per batch."""
+    while True:
+        ids = list(Question.objects.filter(pub_date__lt=cutoff).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return
+        yield archive_batch(ids)
+
+
+def table_sizes(models=(Question, Choice)):
+    """Return {table: (rows, bytes or None)} for the hot tables."""
+    sizes = {}
+    connection = connections[Question.objects.db]
+    for model in models:
+        table = model._meta.db_table
+        size = None
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                try:
+                    cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name = %s', [table])
+                    size = cursor.fetchone()[0]
+                except DatabaseError:
+                    # SQLite built without the dbstat table.
+                    pass
+            elif connection.vendor == 'postgresql':
+                cursor.execute('SELECT pg_total_relation_size(%s)', [table])
+                size = cursor.fetchone()[0]
+        sizes[table] = (model.objects.count(), size)
+    return sizes
+
+
+# (label, queryset factory) timed by time_queries().
+QUERIES = [
+    ('published list', lambda: Question.objects.published().order_by('-pub_date', '-id')[:50]),
+    ('admin changelist', lambda: Question.objects.order_by('-pub_date')[:100]),
+    ('exclude(choice__isnull=True)',
+     lambda: Question.objects.filter(pub_date__lte=timezone.now()).exclude(choice__isnull=True).order_by('-pub_date')[:5]),
+]
+
+
+def time_queries(repeat=5):
+    """Return {label: median milliseconds} for the listing queries the hot tables serve."""
+    timings = {}
+    for label, make_queryset in QUERIES:
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(make_queryset())
+            samples.append((time.perf_counter() - start) * 1000)
+        timings[label] = statistics.median(samples)
+    return timings
@@ -0,0 +1,60 @@
+"""ASGI handler that produces streamed chunks off the event loop.
+
+Django 4.1's ``ASGIHandler`` iterates a ``StreamingHttpResponse`` on the event
+loop. The streaming views here (the published list with
+``POLLS_STREAM_PUBLISHED_QUESTIONS``, ``polls:export``) produce their chunks
+from ``QuerySet.iterator()``, and any query on the event loop raises
+``SynchronousOnlyOperation``. ``StreamingASGIHandler`` asks for each chunk
+with ``sync_to_async(thread_sensitive=True)`` instead, so the chunks are
+produced in the thread that ran the view, on the same database connection,
+while the loop keeps serving other requests. ``sondage/asgi.py`` uses it.
+"""
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+
+_END = object()
+
+
+def _next_part(parts):
+    return next(parts, _END)
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """``ASGIHandler`` that pulls the parts of streaming responses in a thread."""
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': self.response_headers(response),
+        })
+        # Access __iter__ and not streaming_content, as the base class does.
+        parts = iter(response)
+        next_part = sync_to_async(_next_part, thread_sensitive=True)
+        while (part := await next_part(parts)) is not _END:
+            for chunk, _ in self.chunk_bytes(part):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+    @staticmethod
+    def response_headers(response):
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+        return headers
+
+
+def get_asgi_application():
+    """``django.core.asgi.get_asgi_application()`` with the streaming handler."""
+    django.setup(set_prefix=False)
+    return StreamingASGIHandler()
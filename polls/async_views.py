@@ -0,0 +1,85 @@
+"""Native async versions of the detail, results and vote views.
+
+Under ASGI the sync views each run through a thread-sensitive
+``sync_to_async`` hop; these use the async ORM instead. They are wired up in
+``polls/urls.py`` when ``POLLS_ASYNC_VIEWS`` is True.
+"""
+from asgiref.sync import sync_to_async
+from django.db.models import Prefetch
+from django.http import Http404, HttpResponseRedirect
+from django.shortcuts import render
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views import View
+
+from .models import Question, Choice
+from . import archive, counters, events, ratelimit, results_cache, routers, vote_buffer
+
+
+async def aget_published_or_404(queryset, **kwargs):
+    """Async counterpart of ``get_object_or_404`` for published questions."""
+    try:
+        return await queryset.aget(**kwargs)
+    except Question.DoesNotExist:
+        raise Http404('No question matches the given query.')
+
+
+def detail_queryset():
+    # Prefetched: the template can't query from an async view.
+    return Question.objects.published().prefetch_related(
+        Prefetch('choice_set', queryset=Choice.objects.order_by('pk')),
+    )
+
+
+@method_decorator(routers.read_from_replica, name='dispatch')
+class DetailView(View):
+    template_name = 'polls/detail.html'
+
+    async def get(self, request, pk):
+        question = await aget_published_or_404(detail_queryset(), pk=pk)
+        return render(request, self.template_name, {'question': question})
+
+
+@method_decorator(routers.read_from_replica, name='dispatch')
+class ResultsView(View):
+    template_name = 'polls/results.html'
+
+    async def get(self, request, pk):
+        try:
+            question = await aget_published_or_404(Question.objects.published(), pk=pk)
+        except Http404:
+            archived = await archive.aget_archived(pk)
+            if archived is None:
+                raise
+            return render(request, self.template_name, {
+                'question': archived, 'choices': archived.results, 'archived': True,
+            })
+        context = {
+            'question': question,
+            'choices': vote_buffer.with_pending(await results_cache.aget_results(question.pk)),
+        }
+        if events.enabled():
+            context['timeline'] = await sync_to_async(events.timeline)(question.pk)
+        return render(request, self.template_name, context)
+
+
+@routers.stick_to_primary
+@ratelimit.guard_vote
+async def vote(request, question_id):
+    """Voting page for question choices."""
+    try:
+        selected_choice = await Choice.objects.aget(
+            pk=request.POST["choice"],
+            question__in=Question.objects.published().filter(pk=question_id),
+        )
+    except (KeyError, ValueError, Choice.DoesNotExist):
+        question = await aget_published_or_404(detail_queryset(), pk=question_id)
+        return render(request, "polls/detail.html", {'question': question, "error_message": "You didn't select a choice."})
+    if vote_buffer.enabled():
+        await sync_to_async(vote_buffer.add)(selected_choice.pk)
+    else:
+        await counters.aincrement(selected_choice.pk)
+        await results_cache.abump(question_id)
+    if events.enabled():
+        await sync_to_async(events.record)(request, question_id, selected_choice.pk)
+    return HttpResponseRedirect(reverse("polls:results", args=(question_id,)))
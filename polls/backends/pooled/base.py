@@ -0,0 +1,50 @@
+"""Database engine wrapping another backend with ``polls.pool``.
+
+``DATABASES[alias]['POOL']['ENGINE']`` names the real backend; its wrapper is
+subclassed so that opening a connection takes one from the alias's pool and
+closing gives it back.
+"""
+from functools import lru_cache
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+from django.db.utils import load_backend
+
+from polls import pool
+
+
+class PooledConnectionMixin:
+
+    def get_new_connection(self, conn_params):
+        base = super()
+        self.connection_pool = pool.get_pool(self, lambda: base.get_new_connection(conn_params))
+        return self.connection_pool.acquire()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # After a database error, only give the connection back if it still works.
+        broken = self.errors_occurred and not self.is_usable()
+        with self.wrap_database_errors:
+            self.connection_pool.release(self.connection, broken=broken)
+
+
+@lru_cache(maxsize=None)
+def pooled_wrapper_class(engine):
+    wrapper_class = load_backend(engine).DatabaseWrapper
+    return type(f'Pooled{wrapper_class.__name__}', (PooledConnectionMixin, wrapper_class), {
+        '__module__': __name__,
+    })
+
+
+class DatabaseWrapper:
+    """Build the pooled subclass of the backend named in ``POOL['ENGINE']``."""
+
+    def __new__(cls, settings_dict, alias=DEFAULT_DB_ALIAS):
+        engine = settings_dict.get('POOL', {}).get('ENGINE')
+        if not engine or engine == 'polls.backends.pooled':
+            raise ImproperlyConfigured(
+                f"DATABASES[{alias!r}]['POOL']['ENGINE'] must name the backend to pool, "
+                f"e.g. 'django.db.backends.postgresql'."
+            )
+        return pooled_wrapper_class(engine)(settings_dict, alias)
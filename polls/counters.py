@@ -0,0 +1,89 @@
+"""Vote counting, optionally spread over sharded counter rows.
+
+With ``POLLS_VOTE_SHARDS`` unset (or 0) a vote is a single
+``UPDATE ... SET vote = vote + 1`` on the choice row. During live events set
+it to the number of shards per choice: each vote then increments a random
+``VoteShard`` row, and ``rollup()`` (``manage.py rollup_votes``) periodically
+folds the shards back into ``Choice.vote``.
+"""
+import random
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Choice, VoteShard
+
+
+def shard_count():
+    """Return the configured number of shards per choice (0 disables sharding)."""
+    return getattr(settings, 'POLLS_VOTE_SHARDS', 0)
+
+
+def increment(choice_id, shards=None):
+    """Count one vote for the choice with the given id."""
+    shards = shard_count() if shards is None else shards
+    if shards <= 0:
+        # To avoid race condition
+        Choice.objects.filter(pk=choice_id).update(vote=F('vote') + 1)
+        return
+    shard = random.randrange(shards)
+    updated = VoteShard.objects.filter(choice_id=choice_id, shard=shard).update(count=F('count') + 1)
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            VoteShard.objects.create(choice_id=choice_id, shard=shard, count=1)
+    except IntegrityError:
+        # Another voter created the shard first.
+        VoteShard.objects.filter(choice_id=choice_id, shard=shard).update(count=F('count') + 1)
+
+
+async def aincrement(choice_id):
+    """Async counterpart of ``increment()``."""
+    if shard_count() <= 0:
+        await Choice.objects.filter(pk=choice_id).aupdate(vote=F('vote') + 1)
+    else:
+        # Creating a shard needs a transaction, which the async ORM lacks.
+        await sync_to_async(increment)(choice_id)
+
+
+def with_totals(queryset):
+    """Annotate a Choice queryset with ``total_votes`` (rolled up votes plus pending shards)."""
+    return queryset.annotate(
+        total_votes=F('vote') + Coalesce(Sum('shards__count'), Value(0)),
+    )
+
+
+def total_votes(choice):
+    """Return the total votes of a single choice, shards included."""
+    pending = choice.shards.aggregate(total=Coalesce(Sum('count'), Value(0)))['total']
+    return choice.vote + pending
+
+
+def rollup(choice_ids=None):
+    """Fold the shard counts into ``Choice.vote`` and reset the shards.
+
+    Each choice is rolled up in its own short transaction so voters are only
+    blocked for one choice at a time. Returns the number of votes folded.
+    """
+    pending = VoteShard.objects.filter(count__gt=0)
+    if choice_ids is not None:
+        pending = pending.filter(choice_id__in=choice_ids)
+    folded = 0
+    for choice_id in pending.values_list('choice_id', flat=True).distinct().iterator():
+        with transaction.atomic():
+            shards = VoteShard.objects.select_for_update().filter(choice_id=choice_id, count__gt=0)
+            counts = dict(shards.values_list('pk', 'count'))
+            total = sum(counts.values())
+            if not total:
+                continue
+            Choice.objects.filter(pk=choice_id).update(vote=F('vote') + total)
+            # Subtract what was read rather than zeroing, so nothing counted
+            # in between is lost on backends without row locks.
+            for pk, count in counts.items():
+                VoteShard.objects.filter(pk=pk).update(count=F('count') - count)
+            folded += total
+    return folded
@@ -0,0 +1,138 @@
+"""One vote per voter per question, remembered in a rotating Bloom filter.
+
+Set ``POLLS_VOTE_DEDUP`` to turn it on::
+
+    POLLS_VOTE_DEDUP = {
+        'KEY': 'cookie',          # 'cookie', 'session' or 'ip'
+        'CAPACITY': 1000000,      # (question, voter) pairs per generation
+        'ERROR_RATE': 0.001,      # chance a new voter is taken for a repeat one
+        'ROTATE_SECONDS': 86400,  # start a new generation at least this often
+    }
+
+The filter keeps two generations and checks both, so a vote is remembered
+for between one and two generations. Memory is fixed by ``CAPACITY`` and
+``ERROR_RATE`` (about 1.8 MB per generation for the values above) instead of
+growing with the number of voters. The filter lives in process memory, so
+each worker process enforces the limit on its own.
+"""
+import hashlib
+import math
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.signals import setting_changed
+
+VOTER_COOKIE = 'polls_voter'
+
+DEFAULTS = {
+    'KEY': 'cookie',
+    'CAPACITY': 1000000,
+    'ERROR_RATE': 0.001,
+    'ROTATE_SECONDS': 86400,
+}
+
+
+class BloomFilter:
+    """Fixed-size set membership with false positives but no false negatives."""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+    def add(self, item):
+        bits = self.bits
+        for position in self.positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+
+class RotatingBloomFilter:
+    """Two Bloom filter generations; the older one is dropped on rotation."""
+
+    def __init__(self, capacity, error_rate, rotate_seconds=None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rotate_seconds = rotate_seconds
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous = None
+        self.rotated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return sum(len(bloom.bits) for bloom in (self.current, self.previous) if bloom is not None)
+
+    def rotate(self):
+        self.previous = self.current
+        self.current = BloomFilter(self.capacity, self.error_rate)
+        self.rotated_at = time.monotonic()
+
+    def __contains__(self, item):
+        with self._lock:
+            return item in self.current or (self.previous is not None and item in self.previous)
+
+    def add(self, item):
+        with self._lock:
+            expired = self.rotate_seconds and time.monotonic() - self.rotated_at >= self.rotate_seconds
+            if self.current.count >= self.capacity or expired:
+                self.rotate()
+            self.current.add(item)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'POLLS_VOTE_DEDUP', {})}
+
+
+def enabled():
+    return bool(getattr(settings, 'POLLS_VOTE_DEDUP', None))
+
+
+_filter = None
+_filter_lock = threading.Lock()
+
+
+def get_filter():
+    global _filter
+    if _filter is None:
+        with _filter_lock:
+            if _filter is None:
+                config = get_config()
+                _filter = RotatingBloomFilter(config['CAPACITY'], config['ERROR_RATE'], config['ROTATE_SECONDS'])
+    return _filter
+
+
+def voter_key(request):
+    """Return (key, new_cookie) identifying the voter; new_cookie is set when a cookie was issued."""
+    kind = get_config()['KEY']
+    if kind == 'ip':
+        return request.META.get('REMOTE_ADDR', ''), None
+    if kind == 'session' and getattr(request, 'session', None) is not None and request.session.session_key:
+        return request.session.session_key, None
+    voter = request.COOKIES.get(VOTER_COOKIE)
+    if voter:
+        return voter, None
+    voter = uuid.uuid4().hex
+    return voter, voter
+
+
+def _setting_changed(setting, **kwargs):
+    global _filter
+    if setting == 'POLLS_VOTE_DEDUP':
+        _filter = None
+
+
+setting_changed.connect(_setting_changed)
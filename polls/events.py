@@ -0,0 +1,284 @@
+"""Append-only vote event log and the per-minute buckets materialized from it.
+
+With ``POLLS_VOTE_EVENTS`` set, every counted vote is also recorded as a
+``VoteEvent``::
+
+    POLLS_VOTE_EVENTS = {
+        'BATCH_SIZE': 100,  # events written per bulk INSERT
+        'INTERVAL': 1.0,    # seconds between background writes of a partial batch
+        'ATTEMPTS': 5,      # failed writes of the queued events before they are dropped
+        'LAG': 5,           # seconds the materializer waits for a missing id
+    }
+
+Events are queued in process and written with ``bulk_create``. The same
+durability bound applies as for the vote buffer without a log: at most
+``BATCH_SIZE`` events, or ``INTERVAL`` seconds worth, are lost per process
+on a crash. Events whose write fails stay queued for the next flush, and
+whatever is queued is written when the process exits. After ``ATTEMPTS``
+failed writes in a row they are dropped and logged, so a database outage
+can't grow the queue without bound. A batch rejected with an
+``IntegrityError`` (e.g. a vote for a choice deleted meanwhile) is written
+one event at a time instead, and only the events that fail are dropped.
+
+``materialize()`` (``manage.py materialize_votes``) folds the events after
+the stored high-water mark into per-choice, per-minute ``VoteBucket`` rows,
+a batch at a time. Ids are assigned on insert, so an event from a slow or
+retried write can commit after a higher id is visible. The materializer
+therefore only folds ids that follow the high-water mark without a gap. When
+the next id is missing, it waits up to ``LAG`` seconds from when it first
+saw the gap, then skips the gap: a rolled back insert leaves one for good.
+Run a single materializer at a time. ``rebuild()`` recomputes everything
+from the log in the same streaming passes.
+
+The results page reads its totals from the vote counters, which are never
+behind; the buckets feed its "Votes over time" table (``timeline()``).
+"""
+import atexit
+import hashlib
+import logging
+import threading
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .dedup import VOTER_COOKIE
+from .models import MaterializerState, VoteBucket, VoteEvent
+from .vote_buffer import Flusher
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 100,
+    'INTERVAL': 1.0,
+    'ATTEMPTS': 5,
+    'LAG': 5,
+}
+
+STATE_NAME = 'tallies'
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'POLLS_VOTE_EVENTS', {})}
+
+
+def enabled():
+    return bool(getattr(settings, 'POLLS_VOTE_EVENTS', None))
+
+
+def voter_hash(request):
+    """Return a short keyed hash of whatever identifies the voter."""
+    voter = (
+        request.COOKIES.get(VOTER_COOKIE)
+        or (getattr(request, 'session', None) and request.session.session_key)
+        or request.META.get('REMOTE_ADDR', '')
+    )
+    return hashlib.blake2b(voter.encode(), key=settings.SECRET_KEY.encode()[:64], digest_size=8).hexdigest()
+
+
+class EventQueue:
+    """Events waiting to be written in one bulk INSERT."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.events = []
+        # Failed writes in a row.
+        self.failures = 0
+
+    def add(self, event):
+        with self._lock:
+            self.events.append(event)
+            return len(self.events)
+
+    def drain(self):
+        with self._lock:
+            events, self.events = self.events, []
+            return events
+
+    def requeue(self, events, attempts):
+        """Put drained events back in front of the newer ones after a failed write.
+
+        Return False, and drop them instead, once ``attempts`` writes in a row failed.
+        """
+        with self._lock:
+            self.failures += 1
+            if self.failures >= attempts:
+                self.failures = 0
+                return False
+            self.events[:0] = events
+            return True
+
+    def written(self):
+        with self._lock:
+            self.failures = 0
+
+
+_queue = EventQueue()
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def drop(events, reason):
+    logger.error('Dropped %d vote event(s) (%s): %s', len(events), reason,
+                 ', '.join(f'choice {event.choice_id} at {event.created.isoformat()}' for event in events))
+
+
+def write_each(events):
+    """Write the events one by one, dropping those the database rejects; return how many were written."""
+    rejected = []
+    for event in events:
+        # Ids the rolled back bulk INSERT may have set.
+        event.pk = None
+        try:
+            with transaction.atomic():
+                event.save(force_insert=True)
+        except IntegrityError:
+            rejected.append(event)
+    if rejected:
+        drop(rejected, 'rejected by the database')
+    return len(events) - len(rejected)
+
+
+def flush():
+    """Write the queued events and return how many were written."""
+    events = _queue.drain()
+    if not events:
+        return 0
+    try:
+        # In a savepoint, so a failure doesn't break a surrounding transaction.
+        with transaction.atomic():
+            VoteEvent.objects.bulk_create(events)
+    except IntegrityError:
+        written = write_each(events)
+    except Exception:
+        attempts = get_config()['ATTEMPTS']
+        if not _queue.requeue(events, attempts):
+            drop(events, f'{attempts} failed writes')
+        raise
+    else:
+        written = len(events)
+    _queue.written()
+    return written
+
+
+def record(request, question_id, choice_id):
+    """Queue a VoteEvent for a counted vote."""
+    global _flusher
+    config = get_config()
+    event = VoteEvent(question_id=question_id, choice_id=choice_id,
+                      created=timezone.now(), voter_hash=voter_hash(request))
+    if _flusher is None and config['INTERVAL']:
+        with _flusher_lock:
+            if _flusher is None:
+                _flusher = Flusher(config['INTERVAL'], flush, name='vote-event-flusher')
+                _flusher.start()
+    if _queue.add(event) >= config['BATCH_SIZE']:
+        flush()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception('Writing queued vote events at exit failed')
+
+
+def minute(moment):
+    return moment.replace(second=0, microsecond=0)
+
+
+def fold(events):
+    """Add a batch of (choice_id, question_id, created) events to the buckets."""
+    buckets = Counter()
+    questions = {}
+    for choice_id, question_id, created in events:
+        buckets[choice_id, minute(created)] += 1
+        questions[choice_id] = question_id
+
+    minutes = {moment for _, moment in buckets}
+    existing = {
+        (bucket.choice_id, bucket.minute): bucket
+        for bucket in VoteBucket.objects.select_for_update().filter(choice_id__in=list(questions), minute__in=minutes)
+    }
+    for key, votes in buckets.items():
+        if key in existing:
+            existing[key].votes += votes
+    VoteBucket.objects.bulk_update(existing.values(), ['votes'])
+    VoteBucket.objects.bulk_create([
+        VoteBucket(choice_id=choice_id, question_id=questions[choice_id], minute=moment, votes=votes)
+        for (choice_id, moment), votes in buckets.items() if (choice_id, moment) not in existing
+    ])
+
+
+def consecutive(events):
+    """Return how many of the (pk, ...) rows at the start of ``events`` have consecutive ids."""
+    first = events[0][0]
+    for index, event in enumerate(events):
+        if event[0] != first + index:
+            return index
+    return len(events)
+
+
+def materialize(batch_size=10000, lag=None):
+    """Fold every event past the high-water mark into the buckets; return how many were folded."""
+    lag = get_config()['LAG'] if lag is None else lag
+    folded = 0
+    while True:
+        with transaction.atomic():
+            state, _ = MaterializerState.objects.select_for_update().get_or_create(name=STATE_NAME)
+            events = list(
+                VoteEvent.objects.filter(pk__gt=state.last_event_id)
+                .order_by('pk').values_list('pk', 'choice_id', 'question_id', 'created')[:batch_size]
+            )
+            if not events:
+                return folded
+            if events[0][0] != state.last_event_id + 1:
+                # The missing ids may belong to writes that haven't committed yet.
+                now = timezone.now()
+                if state.gap_seen_at is None:
+                    state.gap_seen_at = now
+                    state.save(update_fields=['gap_seen_at'])
+                if now - state.gap_seen_at < timedelta(seconds=lag):
+                    return folded
+                logger.warning('Skipping vote event ids %d to %d, missing for %ss',
+                               state.last_event_id + 1, events[0][0] - 1, lag)
+            events = events[:consecutive(events)]
+            fold([event[1:] for event in events])
+            state.last_event_id = events[-1][0]
+            state.gap_seen_at = None
+            state.save(update_fields=['last_event_id', 'gap_seen_at'])
+        folded += len(events)
+
+
+def rebuild(batch_size=10000, lag=None):
+    """Drop the buckets and rebuild them from the whole log."""
+    with transaction.atomic():
+        VoteBucket.objects.all().delete()
+        MaterializerState.objects.update_or_create(name=STATE_NAME, defaults={'last_event_id': 0, 'gap_seen_at': None})
+    return materialize(batch_size, lag)
+
+
+def timeline(question_id, minutes=60):
+    """Return [(minute, votes)] for the question over the last ``minutes`` minutes."""
+    since = minute(timezone.now()) - timedelta(minutes=minutes)
+    return list(
+        VoteBucket.objects.filter(question_id=question_id, minute__gte=since)
+        .values('minute').annotate(votes=Sum('votes')).order_by('minute').values_list('minute', 'votes')
+    )
+
+
+def _setting_changed(setting, **kwargs):
+    global _flusher
+    if setting == 'POLLS_VOTE_EVENTS':
+        with _flusher_lock:
+            if _flusher is not None:
+                _flusher.stop()
+            _flusher = None
+
+
+setting_changed.connect(_setting_changed)
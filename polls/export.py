@@ -0,0 +1,103 @@
+"""Streaming export of every question with its choices and vote counts.
+
+Used by ``manage.py export_results`` and the ``polls:export`` endpoint. Rows
+come straight from a database cursor (``QuerySet.iterator()``) ordered by
+question, and each output format is a generator of text chunks, so memory
+stays flat however many choices there are. Questions without choices are left
+out. The CSV columns are a superset of what ``manage.py import_polls`` reads.
+The generators query the database as they are iterated, so under ASGI the
+endpoint relies on ``polls.asgi`` producing the chunks off the event loop.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, time
+from itertools import groupby, islice
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import counters
+from .models import Choice
+
+FORMATS = ('csv', 'jsonl')
+CSV_HEADER = ['question_id', 'question_text', 'pub_date', 'choice_id', 'choice_text', 'votes']
+ROWS_PER_CHUNK = 500
+
+
+def parse_since(value):
+    """Parse an ISO date or datetime; raise ValueError if it is neither."""
+    since = parse_datetime(value)
+    if since is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid date {value!r}')
+        since = datetime.combine(day, time.min)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def export_rows(since=None, chunk_size=2000):
+    """Yield (question_id, question_text, pub_date, choice_id, choice_text, votes) ordered by question."""
+    choices = Choice.objects.order_by('question_id', 'pk')
+    if since is not None:
+        choices = choices.filter(question__pub_date__gte=since)
+    # Shards can outlive POLLS_VOTE_SHARDS being turned off, so always count them.
+    choices = counters.with_totals(choices)
+    return choices.values_list(
+        'question_id', 'question__question_text', 'question__pub_date', 'pk', 'choice_text', 'total_votes',
+    ).iterator(chunk_size=chunk_size)
+
+
+def csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    while True:
+        chunk = list(islice(rows, ROWS_PER_CHUNK))
+        if not chunk:
+            break
+        writer.writerows(
+            (question_id, text, pub_date.isoformat(), choice_id, choice_text, votes)
+            for question_id, text, pub_date, choice_id, choice_text, votes in chunk
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def jsonl_chunks(rows):
+    lines = []
+    for (question_id, text, pub_date), choices in groupby(rows, key=lambda row: row[:3]):
+        lines.append(json.dumps({
+            'id': question_id,
+            'question_text': text,
+            'pub_date': pub_date.isoformat(),
+            'choices': [
+                {'id': choice_id, 'choice_text': choice_text, 'votes': votes}
+                for *_, choice_id, choice_text, votes in choices
+            ],
+        }) + '\n')
+        if len(lines) >= ROWS_PER_CHUNK:
+            yield ''.join(lines)
+            lines = []
+    yield ''.join(lines)
+
+
+def export_chunks(file_format, since=None, chunk_size=2000):
+    """Yield the export as text chunks in the given format."""
+    rows = export_rows(since, chunk_size)
+    return csv_chunks(rows) if file_format == 'csv' else jsonl_chunks(rows)
+
+
+def gzip_chunks(chunks):
+    """Gzip-compress a stream of text chunks on the fly."""
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
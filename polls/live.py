@@ -0,0 +1,191 @@
+"""Live results pushed to browsers over Server-Sent Events.
+
+``polls:results_stream`` is served natively by ``LiveResultsRouter``, which
+wraps the ASGI application in ``sondage/asgi.py``. (Django 4.1 can't stream
+from an async iterator, so the endpoint speaks ASGI directly.) Under WSGI
+the same URL returns a single snapshot and tells the browser to reconnect.
+
+A single in-process ``Broadcaster`` fans results out to every subscriber:
+
+* ``Broadcaster.notify()`` only marks a question as changed. It is cheap and
+  thread-safe, and it runs on every ``results_cache.results_changed`` signal,
+  so the sync views feed it too.
+* Once per ``POLLS_LIVE_INTERVAL`` seconds a publisher task loads the results
+  of each changed question that has subscribers once, and queues the same
+  encoded message to all of them. A question gets at most one message per
+  interval however many votes land.
+* When the results cache is enabled, the publisher also checks the version of
+  each watched question, which picks up votes handled by other processes.
+* Every subscriber has a bounded queue (``POLLS_LIVE_QUEUE_SIZE``). A slow
+  consumer loses its oldest snapshots, never the newest one.
+"""
+import asyncio
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.dispatch import receiver
+from django.urls import Resolver404, resolve
+
+from .models import Question
+from . import results_cache, vote_buffer
+
+KEEPALIVE = 15
+
+
+def encode_event(question_id, results):
+    data = json.dumps({'question': question_id, 'choices': results})
+    return f'event: results\ndata: {data}\n\n'.encode()
+
+
+async def snapshot(question_id):
+    """Return the current results of a question as an encoded SSE message."""
+    results = vote_buffer.with_pending(await results_cache.aget_results(question_id))
+    return encode_event(question_id, results)
+
+
+class Subscriber:
+    """One connected client and its bounded queue of messages."""
+
+    def __init__(self, question_id, maxsize):
+        self.question_id = question_id
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def put(self, message):
+        if self.queue.full():
+            # Stale snapshot, superseded by the one being queued.
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class Broadcaster:
+    """Coalesces result changes and fans them out to subscribers."""
+
+    def __init__(self):
+        self.subscribers = {}
+        self.versions = {}
+        self._changed = set()
+        self._lock = threading.Lock()
+        self._task = None
+
+    @property
+    def interval(self):
+        return getattr(settings, 'POLLS_LIVE_INTERVAL', 1.0)
+
+    def notify(self, *question_ids):
+        """Mark questions as changed; safe to call from any thread."""
+        with self._lock:
+            self._changed.update(question_ids)
+
+    def subscribe(self, question_id):
+        subscriber = Subscriber(question_id, getattr(settings, 'POLLS_LIVE_QUEUE_SIZE', 1))
+        self.subscribers.setdefault(question_id, set()).add(subscriber)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscribers = self.subscribers.get(subscriber.question_id, set())
+        subscribers.discard(subscriber)
+        if not subscribers:
+            self.subscribers.pop(subscriber.question_id, None)
+            self.versions.pop(subscriber.question_id, None)
+
+    async def changed_questions(self):
+        """Return the watched questions that changed since the last call."""
+        with self._lock:
+            changed, self._changed = self._changed, set()
+        cache = results_cache.get_cache()
+        if cache is not None:
+            for question_id in list(self.subscribers):
+                version = await results_cache.aget_version(cache, question_id)
+                if self.versions.setdefault(question_id, version) != version:
+                    self.versions[question_id] = version
+                    changed.add(question_id)
+        return changed & self.subscribers.keys()
+
+    async def publish(self):
+        """Send one snapshot of every changed question to its subscribers."""
+        for question_id in await self.changed_questions():
+            message = await snapshot(question_id)
+            for subscriber in self.subscribers.get(question_id, ()):
+                subscriber.put(message)
+
+    async def run(self):
+        while self.subscribers:
+            await asyncio.sleep(self.interval)
+            await self.publish()
+            await sync_to_async(close_old_connections)()
+
+
+broadcaster = Broadcaster()
+
+
+@receiver(results_cache.results_changed)
+def notify(sender, question_ids, **kwargs):
+    broadcaster.notify(*question_ids)
+
+
+async def send_response(send, status, body=b'', content_type=b'text/plain'):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', content_type)]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream_results(scope, receive, send, question_id):
+    """Stream a question's results until the client goes away."""
+    if scope['method'] != 'GET':
+        return await send_response(send, 405)
+    published = await Question.objects.published().filter(pk=question_id).aexists()
+    if not published:
+        return await send_response(send, 404, b'Not Found')
+    subscriber = broadcaster.subscribe(question_id)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        await send({'type': 'http.response.body', 'body': await snapshot(question_id), 'more_body': True})
+        await sync_to_async(close_old_connections)()
+        while not disconnected.done():
+            message = asyncio.ensure_future(subscriber.queue.get())
+            await asyncio.wait({message, disconnected}, timeout=KEEPALIVE,
+                               return_when=asyncio.FIRST_COMPLETED)
+            if message.done():
+                body = message.result()
+            else:
+                message.cancel()
+                body = b': keepalive\n\n'
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        disconnected.cancel()
+        broadcaster.unsubscribe(subscriber)
+
+
+class LiveResultsRouter:
+    """ASGI middleware serving ``polls:results_stream`` without going through Django views."""
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'].endswith('/stream/'):
+            try:
+                match = resolve(scope['path'])
+            except Resolver404:
+                match = None
+            if match is not None and match.view_name == 'polls:results_stream':
+                return await stream_results(scope, receive, send, match.kwargs['pk'])
+        return await self.application(scope, receive, send)
@@ -0,0 +1,40 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from polls import archive
+
+
+class Command(BaseCommand):
+    help = 'Move polls published more than --older-than days ago, with their final results, to the archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, required=True, metavar='DAYS',
+                            help='Archive questions published more than DAYS days ago.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Questions moved per transaction.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options['older_than'])
+        sizes_before, timings_before = archive.table_sizes(), archive.time_queries()
+        questions = choices = 0
+        start = time.perf_counter()
+        for batch_questions, batch_choices in archive.archive(cutoff, options['batch_size']):
+            questions += batch_questions
+            choices += batch_choices
+            self.stdout.write(f'Archived {questions} question(s) so far.')
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'Archived {questions} question(s) with {choices} choice(s) published before '
+            f'{cutoff:%Y-%m-%d} in {elapsed:.2f}s.'
+        )
+        sizes_after, timings_after = archive.table_sizes(), archive.time_queries()
+        self.stdout.write(f'{"table":<28} {"rows before":>12} {"rows after":>12} {"bytes before":>13} {"bytes after":>13}')
+        for table, (rows, size) in sizes_before.items():
+            rows_after, size_after = sizes_after[table]
+            self.stdout.write(f'{table:<28} {rows:>12} {rows_after:>12} {size or "-":>13} {size_after or "-":>13}')
+        self.stdout.write(f'{"query":<28} {"ms before":>12} {"ms after":>12}')
+        for label, before in timings_before.items():
+            self.stdout.write(f'{label:<28} {before:>12.2f} {timings_after[label]:>12.2f}')
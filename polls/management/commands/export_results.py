@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from polls import export
+
+
+class Command(BaseCommand):
+    help = 'Stream every question with its choices and vote counts as CSV or JSONL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=export.FORMATS, default='csv',
+                            help='Output format (default: csv).')
+        parser.add_argument('--since',
+                            help='Only export questions published at or after this ISO date or datetime.')
+        parser.add_argument('--gzip', action='store_true', help='Gzip-compress the output.')
+        parser.add_argument('--output', '-o', default='-', help="File to write, or '-' for stdout.")
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched from the database cursor at a time.')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = export.parse_since(options['since'])
+            except ValueError as exc:
+                raise CommandError(exc)
+        chunks = export.export_chunks(options['format'], since, options['chunk_size'])
+        path = options['output']
+        if path == '-':
+            if options['gzip']:
+                sys.stdout.buffer.writelines(export.gzip_chunks(chunks))
+            else:
+                for chunk in chunks:
+                    self.stdout.write(chunk, ending='')
+            return
+        start = time.perf_counter()
+        if options['gzip']:
+            with open(path, 'wb') as target:
+                target.writelines(export.gzip_chunks(chunks))
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as target:
+                target.writelines(chunks)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'Wrote {os.path.getsize(path)} bytes to {path} in {elapsed:.2f}s.')
@@ -0,0 +1,121 @@
+import csv
+import json
+import sys
+import time
+from itertools import groupby, islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from polls import page_cache, scheduler, search
+from polls.models import Choice, Question
+
+
+def read_jsonl(lines):
+    """Yield (question_text, pub_date, choices) from lines of JSON objects."""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            yield row['question_text'], row.get('pub_date'), row.get('choices', [])
+        except (ValueError, KeyError) as exc:
+            raise CommandError(f'Line {number}: {exc!r}')
+
+
+def read_csv(lines):
+    """Yield (question_text, pub_date, choices) from CSV rows, one row per choice.
+
+    Consecutive rows with the same question_text make up one question.
+    """
+    rows = csv.DictReader(lines)
+    for question_text, group in groupby(rows, key=lambda row: row['question_text']):
+        group = list(group)
+        choices = [row['choice_text'] for row in group if row.get('choice_text')]
+        yield question_text, group[0].get('pub_date'), choices
+
+
+def parse_pub_date(value):
+    if not value:
+        return timezone.now()
+    pub_date = parse_datetime(value)
+    if pub_date is None:
+        raise CommandError(f'Invalid pub_date {value!r}')
+    if timezone.is_naive(pub_date):
+        pub_date = timezone.make_aware(pub_date)
+    return pub_date
+
+
+class Command(BaseCommand):
+    help = 'Import questions and their choices from a CSV or JSONL file in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format (default: from the file extension).')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Questions inserted per transaction.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        reader = read_csv if file_format == 'csv' else read_jsonl
+        source = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        imported = skipped = choices = 0
+        start = time.perf_counter()
+        with source:
+            rows = reader(source)
+            while batch := list(islice(rows, options['batch_size'])):
+                batch_imported, batch_choices = self.import_batch(batch)
+                imported += batch_imported
+                skipped += len(batch) - batch_imported
+                choices += batch_choices
+        if imported:
+            page_cache.invalidate()
+        elapsed = time.perf_counter() - start
+        rate = (imported + skipped) / elapsed if elapsed else 0
+        self.stdout.write(
+            f'Imported {imported} question(s) with {choices} choice(s), '
+            f'skipped {skipped} duplicate(s) in {elapsed:.2f}s ({rate:.0f} rows/s).'
+        )
+
+    def existing_texts(self, texts):
+        return set(Question.objects.filter(question_text__in=texts).values_list('question_text', flat=True))
+
+    def import_batch(self, batch):
+        """Insert one batch, skipping questions whose text already exists."""
+        by_text = {}
+        for question_text, pub_date, choices in batch:
+            by_text.setdefault(question_text, (parse_pub_date(pub_date), choices))
+        try:
+            return self.insert_new(by_text)
+        except IntegrityError:
+            # Another import added one of the texts since the check: check again.
+            return self.insert_new(by_text)
+
+    def insert_new(self, by_text):
+        with transaction.atomic():
+            existing = self.existing_texts(by_text)
+            new = {text: row for text, row in by_text.items() if text not in existing}
+            # bulk_create skips the signals that maintain is_published. Without
+            # ignore_conflicts every row is inserted or the batch rolls back.
+            questions = Question.objects.bulk_create(
+                [Question(question_text=text, pub_date=pub_date, has_choices=bool(choices),
+                          is_published=scheduler.is_live(choices, pub_date))
+                 for text, (pub_date, choices) in new.items()],
+            )
+            for pub_date, choices in new.values():
+                scheduler.schedule(pub_date)
+            ids = {question.question_text: question.pk for question in questions}
+            if None in ids.values():
+                # Backends that don't return primary keys (MySQL); every text is ours.
+                ids = dict(Question.objects.filter(question_text__in=new).values_list('question_text', 'pk'))
+            created = Choice.objects.bulk_create(
+                [Choice(question_id=ids[text], choice_text=choice_text)
+                 for text, (pub_date, choices) in new.items()
+                 for choice_text in choices],
+            )
+            search.add_to_index((ids[text], text, choices) for text, (pub_date, choices) in new.items())
+        return len(new), len(created)
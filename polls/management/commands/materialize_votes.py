@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from polls import events
+
+
+class Command(BaseCommand):
+    help = 'Fold new vote events into the per-choice, per-minute buckets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Drop the buckets and rebuild them from the whole event log.')
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Events folded per transaction.')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep materializing every INTERVAL seconds instead of running once.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            folded = events.rebuild(options['batch_size'])
+            self.stdout.write(f'Rebuilt buckets from {folded} event(s).')
+        while True:
+            folded = events.materialize(options['batch_size'])
+            self.stdout.write(f'Materialized {folded} event(s).')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,85 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.startup import PHASES
+
+BASE_DIR = Path(__file__).resolve().parents[3]
+
+
+def boot(warm_up=True, path='/polls/'):
+    """Boot the project in a fresh interpreter; return (profile, {module: (self_us, cumulative_us)})."""
+    command = [sys.executable, '-X', 'importtime', '-m', 'polls.startup', '--path', path]
+    if not warm_up:
+        command.append('--no-warm-up')
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(BASE_DIR), env.get('PYTHONPATH')]))
+    process = subprocess.run(command, cwd=BASE_DIR, env=env, capture_output=True, text=True)
+    imports = {}
+    errors = []
+    for line in process.stderr.splitlines():
+        if line.startswith('import time:'):
+            self_us, cumulative_us, module = line[len('import time:'):].split('|')
+            if self_us.strip().isdigit():
+                imports[module.strip()] = (int(self_us), int(cumulative_us))
+        else:
+            errors.append(line)
+    if process.returncode:
+        raise CommandError('\n'.join(errors) or f'polls.startup exited with {process.returncode}')
+    return json.loads(process.stdout), imports
+
+
+class Command(BaseCommand):
+    help = 'Break down the time to boot the project and serve a first request, per phase and per imported module.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Boot this many times and report the medians.')
+        parser.add_argument('--top', type=int, default=20,
+                            help='Show this many of the slowest imports.')
+        parser.add_argument('--path', default='/polls/',
+                            help='Path of the first request.')
+        parser.add_argument('--no-warm-up', dest='warm_up', action='store_false',
+                            help='Boot without polls.warmup, as with POLLS_WARM_UP = False.')
+
+    def handle(self, *args, **options):
+        timings = defaultdict(list)
+        imports = defaultdict(list)
+        for _ in range(max(1, options['repeat'])):
+            profile, modules = boot(options['warm_up'], options['path'])
+            for phase, seconds in profile['timings'].items():
+                timings[phase].append(seconds * 1000)
+            for module, times in modules.items():
+                imports[module].append(times)
+        # Attribute each module's own import time to the phase that first imported it.
+        phase_of = {module: phase for phase, modules in profile['modules'].items() for module in modules}
+        import_ms = defaultdict(float)
+        for module, times in imports.items():
+            import_ms[phase_of.get(module)] += statistics.median(self_us for self_us, _ in times) / 1000
+
+        self.stdout.write(f'{"phase":<15}{"ms":>10}{"imports ms":>12}{"modules":>9}  description')
+        total = 0
+        for phase, description in PHASES:
+            if phase not in timings:
+                continue
+            ms = statistics.median(timings[phase])
+            total += ms
+            self.stdout.write(
+                f'{phase:<15}{ms:>10.1f}{import_ms[phase]:>12.1f}{len(profile["modules"][phase]):>9}  {description}'
+            )
+        self.stdout.write(f'{"total":<15}{total:>10.1f}')
+        if profile['status'] >= 400:
+            self.stderr.write(f'The first request to {options["path"]} got a {profile["status"]}.')
+
+        top = options['top']
+        for label, index in (('self', 0), ('cumulative', 1)):
+            self.stdout.write(f'\nSlowest imports by {label} time:')
+            medians = {module: statistics.median(times[index] for times in samples) for module, samples in imports.items()}
+            for module, us in sorted(medians.items(), key=lambda item: item[1], reverse=True)[:top]:
+                self.stdout.write(f'{us / 1000:>10.1f} ms  {module}  ({phase_of.get(module, "before boot")})')
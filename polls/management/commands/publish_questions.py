@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from polls import scheduler
+
+
+class Command(BaseCommand):
+    help = 'Publish the scheduled questions whose pub_date has passed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep publishing every INTERVAL seconds instead of running once.')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            published = scheduler.publish_due()
+            self.stdout.write(f'Published {len(published)} question(s).')
+            if not interval:
+                break
+            time.sleep(interval)
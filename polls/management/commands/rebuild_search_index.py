@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from polls import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the question search index from the Question and Choice tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Questions indexed per transaction.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        indexed = search.rebuild_index(options['batch_size'])
+        self.stdout.write(f'Indexed {indexed} question(s) in {time.perf_counter() - start:.2f}s.')
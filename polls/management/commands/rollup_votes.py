@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from polls import counters
+
+
+class Command(BaseCommand):
+    help = 'Fold sharded vote counters back into Choice.vote.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep rolling up every INTERVAL seconds instead of running once.')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            folded = counters.rollup()
+            self.stdout.write(f'Rolled up {folded} vote(s).')
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,157 @@
+"""In-memory request metrics, exported in the Prometheus text format.
+
+``polls.middleware.PerformanceMiddleware`` records one ``RequestStats`` per
+sampled request. The stats are aggregated into fixed-bucket histograms per
+URL name and served by ``polls:metrics`` (``/polls/_metrics``) to staff users
+and to scrapers that send ``Authorization: Bearer <POLLS_METRICS_TOKEN>``.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import pool, results_cache
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# (metric name, help text, buckets, RequestStats attribute)
+HISTOGRAMS = [
+    ('polls_request_duration_seconds', 'Wall time spent handling the request.', TIME_BUCKETS, 'duration'),
+    ('polls_db_queries', 'Database queries run per request.', COUNT_BUCKETS, 'queries'),
+    ('polls_db_duration_seconds', 'Time spent in database queries per request.', TIME_BUCKETS, 'db_time'),
+    ('polls_template_render_seconds', 'Time spent rendering template responses.', TIME_BUCKETS, 'render_time'),
+    ('polls_response_size_bytes', 'Size of the response body.', SIZE_BUCKETS, 'size'),
+]
+
+# (metric name, polls.pool stats key, type, help text)
+POOL_METRICS = [
+    ('polls_db_pool_connections', 'size', 'gauge', 'Connections open in the pool, idle or in use.'),
+    ('polls_db_pool_in_use', 'in_use', 'gauge', 'Pooled connections handed out.'),
+    ('polls_db_pool_waiting', 'waiting', 'gauge', 'Requests waiting for a pooled connection.'),
+    ('polls_db_pool_created_total', 'created', 'counter', 'Connections the pool has opened.'),
+    ('polls_db_pool_timeouts_total', 'timeouts', 'counter', 'Requests that gave up waiting for a connection.'),
+]
+
+
+class Histogram:
+    """Cumulative-on-export histogram with fixed upper bounds."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class RequestStats:
+    """What one request cost."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.duration = 0
+        self.queries = 0
+        self.db_time = 0
+        self.render_time = 0
+        self.size = 0
+
+
+current = ContextVar('polls_request_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper adding query count and time to the current request."""
+    stats = current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - start
+
+
+def render(response):
+    """Render a template response now, counting the time towards the current request."""
+    stats = current.get()
+    start = time.perf_counter()
+    response.render()
+    if stats is not None:
+        stats.render_time += time.perf_counter() - start
+
+
+def install(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    install(connection)
+
+
+class Registry:
+    """Histograms per (metric, view name)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+
+    def record(self, view_name, stats):
+        with self._lock:
+            for name, _, buckets, attribute in HISTOGRAMS:
+                key = (name, view_name)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(buckets)
+                self.histograms[key].observe(getattr(stats, attribute))
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+
+    def export(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, help_text, _, _ in HISTOGRAMS:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, view_name), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{view="{view_name}",le="{bound}"}} {count}')
+                    lines.append(f'{name}_sum{{view="{view_name}"}} {histogram.sum}')
+                    lines.append(f'{name}_count{{view="{view_name}"}} {histogram.count}')
+        cache = results_cache.stats.as_dict()
+        lines.append('# HELP polls_results_cache_hits_total Results cache hits.')
+        lines.append('# TYPE polls_results_cache_hits_total counter')
+        lines.append(f'polls_results_cache_hits_total {cache["hits"]}')
+        lines.append('# HELP polls_results_cache_misses_total Results cache misses.')
+        lines.append('# TYPE polls_results_cache_misses_total counter')
+        lines.append(f'polls_results_cache_misses_total {cache["misses"]}')
+        for name, key, kind, help_text in POOL_METRICS:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for alias, stats in sorted(pool.stats().items()):
+                lines.append(f'{name}{{alias="{alias}"}} {stats[key]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
@@ -0,0 +1,92 @@
+import asyncio
+import random
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from . import metrics, pool
+
+
+class PerformanceMiddleware:
+    """Record wall time, DB queries and time, template render time and response size per URL name.
+
+    Add ``'polls.middleware.PerformanceMiddleware'`` near the top of
+    ``MIDDLEWARE``. ``POLLS_METRICS_SAMPLE_RATE`` (default 1.0) sets the
+    fraction of requests that are measured.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Mark the instance as a coroutine function, like MiddlewareMixin.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def sample(self):
+        return random.random() < getattr(settings, 'POLLS_METRICS_SAMPLE_RATE', 1.0)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.sample():
+            return self.get_response(request)
+        for connection in connections.all(initialized_only=True):
+            metrics.install(connection)
+        stats = metrics.RequestStats()
+        token = metrics.current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        if not self.sample():
+            return await self.get_response(request)
+        stats = metrics.RequestStats()
+        token = metrics.current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.finish(request, response, stats)
+
+    def process_template_response(self, request, response):
+        stats = metrics.current.get()
+        if stats is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                stats.render_time += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, stats):
+        stats.duration = time.perf_counter() - stats.start
+        if not response.streaming:
+            stats.size = len(response.content)
+        match = request.resolver_match
+        view_name = match.view_name if match is not None else 'unresolved'
+        metrics.registry.record(view_name, stats)
+        return response
+
+
+class PoolOverloadMiddleware(MiddlewareMixin):
+    """Answer 503 with ``Retry-After`` when the view found the connection pool exhausted.
+
+    Add ``'polls.middleware.PoolOverloadMiddleware'`` to ``MIDDLEWARE`` when
+    using the ``polls.backends.pooled`` engine (see ``polls/pool.py``).
+    """
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, pool.PoolOverloaded):
+            response = HttpResponse('The server is busy, try again shortly.', status=503, content_type='text/plain')
+            response['Retry-After'] = '1'
+            return response
+        return None
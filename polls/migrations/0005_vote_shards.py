@@ -0,0 +1,32 @@
+# Generated by Django 4.1.1 on 2026-10-17 07:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0004_alter_question_pub_date'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='question',
+            name='question_text',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.CreateModel(
+            name='VoteShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('choice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='polls.choice')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='voteshard',
+            constraint=models.UniqueConstraint(fields=('choice', 'shard'), name='unique_choice_shard'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.1.1 on 2026-10-17 07:05
+
+from django.db import migrations, models
+
+
+def backfill_has_choices(apps, schema_editor):
+    Question = apps.get_model('polls', 'Question')
+    Choice = apps.get_model('polls', 'Choice')
+    Question.objects.update(
+        has_choices=models.Exists(Choice.objects.filter(question=models.OuterRef('pk'))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0005_vote_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='has_choices',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(backfill_has_choices, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('has_choices', True)), fields=['-pub_date'], name='question_published_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.1.1 on 2026-10-17 07:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0006_question_has_choices'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='question',
+            name='question_published_idx',
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('has_choices', True)), fields=['-pub_date', '-id'], name='question_published_idx'),
+        ),
+    ]
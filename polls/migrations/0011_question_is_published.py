@@ -0,0 +1,33 @@
+# Generated by Django 4.1.1 on 2026-10-17 07:52
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_is_published(apps, schema_editor):
+    Question = apps.get_model('polls', 'Question')
+    Question.objects.filter(has_choices=True, pub_date__lte=timezone.now()).update(is_published=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0010_search_terms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='is_published',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(backfill_is_published, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='question',
+            name='question_published_idx',
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-pub_date', '-id'], name='question_published_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.1 on 2026-10-17 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0011_question_is_published'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedQuestion',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('question_text', models.CharField(max_length=255)),
+                ('pub_date', models.DateTimeField(verbose_name='date published')),
+                ('archived_at', models.DateTimeField()),
+                ('results', models.JSONField()),
+            ],
+        ),
+    ]
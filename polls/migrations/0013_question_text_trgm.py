@@ -0,0 +1,44 @@
+import logging
+
+from django.db import DatabaseError, migrations, transaction
+
+logger = logging.getLogger('polls.search')
+
+CREATE_INDEX = (
+    "CREATE INDEX IF NOT EXISTS polls_question_text_trgm ON polls_question "
+    "USING gin (UPPER(question_text::text) gin_trgm_ops)"
+)
+
+
+def create_trigram_index(apps, schema_editor):
+    """On PostgreSQL, index question_text for the admin's icontains search (see polls.search)."""
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    try:
+        # In a savepoint: a failed statement aborts the migration's transaction.
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DatabaseError as exc:
+        logger.warning(
+            "Could not enable pg_trgm (%s); the admin question search will scan the table. "
+            "Have a superuser run CREATE EXTENSION pg_trgm, then migrate polls 0012 and 0013 again.", exc,
+        )
+        return
+    schema_editor.execute(CREATE_INDEX)
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS polls_question_text_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0012_archived_question'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.1 on 2026-10-17 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0013_question_text_trgm'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('has_choices', True), ('is_published', False)), fields=['pub_date'], name='question_scheduled_idx'),
+        ),
+    ]
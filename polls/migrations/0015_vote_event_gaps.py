@@ -0,0 +1,21 @@
+# Generated by Django 4.1.1 on 2026-10-17 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0014_question_scheduled_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='materializerstate',
+            name='gap_seen_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.DeleteModel(
+            name='ChoiceTally',
+        ),
+    ]
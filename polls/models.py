@@ -4,9 +4,37 @@ from django.db import models
 from django.utils import timezone
 from django.contrib import admin
 
+class QuestionQuerySet(models.QuerySet):
+    def published(self):
+        """Questions with choices whose pub_date has passed (see polls.scheduler)."""
+        return self.filter(is_published=True)
+
+
 class Question(models.Model):
     question_text = models.CharField(max_length=255, unique=True)
     pub_date = models.DateTimeField('date published')
+    # Kept in sync by polls.signals so listings don't have to join Choice.
+    has_choices = models.BooleanField(default=False, editable=False)
+    # has_choices and pub_date has passed; kept in sync by polls.scheduler so
+    # published() doesn't depend on the clock.
+    is_published = models.BooleanField(default=False, editable=False)
+
+    objects = QuestionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Partial rather than (is_published, pub_date): Django renders the
+            # filter as a bare "WHERE is_published", which SQLite only matches
+            # against an index with the same condition.
+            # The id tie-breaker serves keyset pagination (polls.pagination).
+            models.Index(fields=['-pub_date', '-id'], condition=models.Q(is_published=True), name='question_published_idx'),
+            # Date filter and ordering of the admin changelist, which lists every question.
+            models.Index(fields=['-pub_date'], name='question_pub_date_idx'),
+            # The scheduled questions polls.scheduler.publish_due() looks for, a
+            # handful however large the table is.
+            models.Index(fields=['pub_date'], condition=models.Q(is_published=False, has_choices=True),
+                         name='question_scheduled_idx'),
+        ]
 
     @admin.display(
         boolean=True,
@@ -26,4 +54,90 @@ class Choice(models.Model):
     vote = models.IntegerField(default=0)
 
     def __str__(self):
-        return self.choice_text
\ No newline at end of file
+        return self.choice_text
+
+class VoteShard(models.Model):
+    """One of several counter rows that absorb votes for a choice.
+
+    Votes land on a random shard so concurrent voters don't all wait on the
+    same row lock. The shard counts are folded back into ``Choice.vote`` by
+    ``polls.counters.rollup``.
+    """
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE, related_name='shards')
+    shard = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['choice', 'shard'], name='unique_choice_shard'),
+        ]
+
+    def __str__(self):
+        return f'{self.choice} #{self.shard}'
+
+
+class VoteEvent(models.Model):
+    """One vote, appended to a log that is never updated (see ``polls.events``)."""
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
+    created = models.DateTimeField()
+    # Truncated keyed hash of the voter, for audits without storing who voted.
+    voter_hash = models.CharField(max_length=16, blank=True)
+
+    def __str__(self):
+        return f'{self.choice} at {self.created}'
+
+
+class VoteBucket(models.Model):
+    """Votes per choice and minute, folded in from VoteEvent by ``polls.events.materialize``."""
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE, db_index=False)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, db_index=False)
+    minute = models.DateTimeField()
+    votes = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['choice', 'minute'], name='unique_choice_minute'),
+        ]
+        indexes = [
+            models.Index(fields=['question', 'minute'], name='votebucket_question_minute'),
+        ]
+
+
+class MaterializerState(models.Model):
+    """High-water mark: the last VoteEvent id folded into the buckets."""
+    name = models.CharField(max_length=50, primary_key=True)
+    last_event_id = models.BigIntegerField(default=0)
+    # When the materializer first found the id after last_event_id missing.
+    gap_seen_at = models.DateTimeField(null=True)
+
+
+class SearchTerm(models.Model):
+    """Inverted index entry: a word of the question or its choices (see ``polls.search``)."""
+    term = models.CharField(max_length=64)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='search_terms')
+    # Occurrences, with words of the question text counting more than those of choices.
+    weight = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'question'], name='unique_search_term'),
+        ]
+        indexes = [
+            # Postings of a term in rank order, so a search reads only the top of the list.
+            models.Index(fields=['term', '-weight', '-question'], name='searchterm_rank_idx'),
+        ]
+
+
+class ArchivedQuestion(models.Model):
+    """A question moved out of the hot tables by ``polls.archive``, with its final results."""
+    # The id the question had, so its results URL keeps working.
+    id = models.BigIntegerField(primary_key=True)
+    question_text = models.CharField(max_length=255)
+    pub_date = models.DateTimeField('date published')
+    archived_at = models.DateTimeField()
+    # [{'id', 'choice_text', 'total_votes'}, ...], as polls.results_cache returns them.
+    results = models.JSONField()
+
+    def __str__(self):
+        return self.question_text
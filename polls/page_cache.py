@@ -0,0 +1,106 @@
+"""Whole-page cache for the question listings, with conditional GET support.
+
+Enable it by naming a cache alias in ``POLLS_PAGE_CACHE``. Cached pages
+expire after ``POLLS_PAGE_CACHE_TIMEOUT`` seconds. Saving or deleting a
+question, changing whether it has choices, or a scheduled question going live
+(``polls.scheduler``) invalidates every cached page by bumping a generation
+counter.
+
+Responses carry an ``ETag`` and ``Last-Modified`` header (also when caching
+is off) and ``If-None-Match``/``If-Modified-Since`` requests get a 304.
+With the cache on, pages are rendered from the primary on a miss, also in
+views that read from a replica (see ``polls.routers``).
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseBase
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from . import metrics, routers
+
+GENERATION_KEY = 'polls:pages:generation'
+
+
+def get_cache():
+    """Return the configured cache, or None if page caching is off."""
+    alias = getattr(settings, 'POLLS_PAGE_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def invalidate():
+    """Drop every cached listing page."""
+    cache = get_cache()
+    if cache is None:
+        return
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def get_generation(cache):
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def page_ttl():
+    """Seconds a listing may be cached."""
+    return getattr(settings, 'POLLS_PAGE_CACHE_TIMEOUT', 300)
+
+
+def render_entry(view, request, *args, **kwargs):
+    """Run the view and return a cacheable entry, or the response itself if it can't be cached."""
+    response = view(request, *args, **kwargs)
+    if hasattr(response, 'render') and callable(response.render):
+        metrics.render(response)
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return response
+    return {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'etag': f'"{hashlib.md5(response.content).hexdigest()}"',
+        'last_modified': time.time(),
+    }
+
+
+def cached_page(view):
+    """Serve a listing view from the page cache, answering conditional GETs with 304."""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        cache = get_cache()
+        entry = None
+        if cache is not None:
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = f'polls:page:{get_generation(cache)}:{path}'
+            entry = cache.get(key)
+        if entry is None:
+            if cache is None:
+                entry = render_entry(view, request, *args, **kwargs)
+            else:
+                # Under the generation just read: a lagging replica may predate it.
+                with routers.on_primary():
+                    entry = render_entry(view, request, *args, **kwargs)
+            if isinstance(entry, HttpResponseBase):
+                return entry
+            if cache is not None:
+                cache.set(key, entry, page_ttl())
+        response = get_conditional_response(
+            request, etag=entry['etag'], last_modified=int(entry['last_modified']),
+        )
+        if response is None:
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+        return response
+    return wrapped
@@ -0,0 +1,283 @@
+"""Database connection pool shared by all threads (WSGI) and requests (ASGI).
+
+Django opens a connection the first time a request touches the database and
+closes it when the request ends (unless ``CONN_MAX_AGE`` keeps it for the
+thread). Under vote bursts that connection setup dominates ``vote()``.
+With the ``polls.backends.pooled`` engine, opening takes a connection from a
+per-alias pool and closing hands it back::
+
+    DATABASES = {
+        'default': {
+            'ENGINE': 'polls.backends.pooled',
+            'NAME': 'sondage', 'USER': ..., 'HOST': ...,
+            'POOL': {
+                'ENGINE': 'django.db.backends.postgresql',  # the real backend
+                'MIN_SIZE': 2,        # opened on first use and kept open
+                'MAX_SIZE': 20,       # connections open at once, idle or in use
+                'TIMEOUT': 5,         # seconds to wait for a free connection
+                'MAX_LIFETIME': 1800, # seconds before a connection is replaced
+                'CHECK_AFTER': 30,    # idle seconds after which it's pinged first
+            },
+        },
+    }
+
+Keep ``CONN_MAX_AGE`` at 0: the pool, not the thread, holds on to connections.
+A request that can't get a connection within ``TIMEOUT`` raises
+``PoolOverloaded``, which ``polls.middleware.PoolOverloadMiddleware`` turns
+into a 503. The pool is thread-safe. Async views reach it through Django's
+``sync_to_async`` threads, so waiting never blocks the event loop.
+"""
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+DEFAULTS = {
+    'MIN_SIZE': 0,
+    'MAX_SIZE': 10,
+    'TIMEOUT': 5.0,
+    'MAX_LIFETIME': 1800,
+    'CHECK_AFTER': 30,
+}
+
+
+class PoolOverloaded(OperationalError):
+    """No connection became free within the pool's timeout."""
+
+
+def ping(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute('SELECT 1')
+    finally:
+        cursor.close()
+
+
+class Waiter:
+    """A request queued for a connection; ``release()`` hands it one directly."""
+
+    def __init__(self, lock):
+        self.condition = threading.Condition(lock)
+        self.connection = None
+        self.may_open = False
+
+
+class ConnectionPool:
+    """A bounded LIFO pool of DB-API connections made by ``connect()``.
+
+    Waiting requests are served first come, first served: a released
+    connection (or the slot of a closed one) goes straight to the oldest
+    waiter instead of to whichever thread asks next.
+    """
+
+    def __init__(self, connect, min_size=0, max_size=10, timeout=5.0, max_lifetime=1800, check_after=30,
+                 check=ping):
+        self.connect = connect
+        self.check = check
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self._lock = threading.Lock()
+        self._idle = deque()  # (connection, last released), most recent last
+        self._waiters = deque()
+        self._opened_at = {}  # id(connection) -> when it was opened
+        self.size = 0
+        self.in_use = 0
+        self.created = 0
+        self.timeouts = 0
+        self.closed = False
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def _open(self):
+        """Open a connection for a slot already counted in ``size``."""
+        try:
+            connection = self.connect()
+        except Exception:
+            self._free_slot()
+            raise
+        with self._lock:
+            self._opened_at[id(connection)] = time.monotonic()
+            self.created += 1
+        return connection
+
+    def _free_slot(self):
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.may_open = True
+                waiter.condition.notify()
+            else:
+                self.size -= 1
+
+    def _discard(self, connection):
+        with self._lock:
+            self._opened_at.pop(id(connection), None)
+        self._free_slot()
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _expired(self, connection, now):
+        return self.max_lifetime is not None and now - self._opened_at[id(connection)] >= self.max_lifetime
+
+    def fill(self):
+        """Open connections until ``min_size`` are open."""
+        while True:
+            with self._lock:
+                if self.size >= self.min_size:
+                    return
+                self.size += 1
+            self._put_back(self._open(), time.monotonic())
+
+    def _wait(self):
+        """Queue for a connection; return it, or None if a slot to open one was freed."""
+        waiter = Waiter(self._lock)
+        self._waiters.append(waiter)
+        deadline = time.monotonic() + self.timeout
+        while waiter.connection is None and not waiter.may_open:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._waiters.remove(waiter)
+                self.timeouts += 1
+                raise PoolOverloaded(
+                    f'No database connection free after {self.timeout}s '
+                    f'({self.in_use} in use, {len(self._waiters)} waiting).'
+                )
+            waiter.condition.wait(remaining)
+        self.in_use += 1
+        return waiter.connection
+
+    def acquire(self):
+        """Return a healthy connection, waiting up to ``timeout`` for one to be free."""
+        while True:
+            with self._lock:
+                if self._idle and not self._waiters:
+                    connection, released = self._idle.pop()
+                    self.in_use += 1
+                elif self.size < self.max_size and not self._waiters:
+                    self.size += 1
+                    self.in_use += 1
+                    connection = None
+                else:
+                    # Connections handed over by release() were just in use: no checks needed.
+                    connection = self._wait()
+                    if connection is not None:
+                        return connection
+            if connection is None:
+                try:
+                    return self._open()
+                except Exception:
+                    with self._lock:
+                        self.in_use -= 1
+                    raise
+            # Checks run outside the lock: they may hit the network.
+            now = time.monotonic()
+            healthy = not self._expired(connection, now)
+            if healthy and now - released >= self.check_after:
+                try:
+                    self.check(connection)
+                except Exception:
+                    healthy = False
+            if healthy:
+                return connection
+            with self._lock:
+                self.in_use -= 1
+            self._discard(connection)
+
+    def _put_back(self, connection, now):
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.connection = connection
+                waiter.condition.notify()
+            else:
+                self._idle.append((connection, now))
+
+    def release(self, connection, broken=False):
+        """Take back a connection; broken or expired ones are closed."""
+        with self._lock:
+            self.in_use -= 1
+        if not broken:
+            try:
+                # Leave no transaction open for the next user.
+                connection.rollback()
+            except Exception:
+                broken = True
+        now = time.monotonic()
+        if broken or self.closed or self._expired(connection, now):
+            self._discard(connection)
+        else:
+            self._put_back(connection, now)
+
+    def close(self):
+        """Close the idle connections now and the others as they come back."""
+        with self._lock:
+            self.closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            for connection in idle:
+                self._opened_at.pop(id(connection), None)
+            self.size -= len(idle)
+        for connection in idle:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'in_use': self.in_use,
+                'waiting': self.waiting,
+                'created': self.created,
+                'timeouts': self.timeouts,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_config(settings_dict):
+    return {**DEFAULTS, **settings_dict.get('POOL', {})}
+
+
+def get_pool(wrapper, connect):
+    """Return the pool of the wrapper's alias, creating and filling it on first use."""
+    pool = _pools.get(wrapper.alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(wrapper.alias)
+            if pool is None:
+                config = get_config(wrapper.settings_dict)
+                pool = ConnectionPool(
+                    connect, min_size=config['MIN_SIZE'], max_size=config['MAX_SIZE'],
+                    timeout=config['TIMEOUT'], max_lifetime=config['MAX_LIFETIME'],
+                    check_after=config['CHECK_AFTER'],
+                )
+                _pools[wrapper.alias] = pool
+        pool.fill()
+    return pool
+
+
+def stats():
+    """Return ``{alias: pool stats}`` for every pool opened so far."""
+    return {alias: pool.stats() for alias, pool in list(_pools.items())}
+
+
+def close_all():
+    """Close every pool, e.g. before the database is dropped; new ones open on next use."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,151 @@
+"""Token-bucket rate limiting and vote deduplication in front of ``vote()``.
+
+``POLLS_VOTE_RATE_LIMIT`` turns the limiter on::
+
+    POLLS_VOTE_RATE_LIMIT = {
+        'RATE': 1.0,           # tokens added per second and client IP
+        'BURST': 5,            # bucket size
+        'MAX_CLIENTS': 100000, # least recently seen clients are forgotten beyond this
+    }
+
+Both checks run before the view touches the database: a client out of tokens
+gets a 429, and a voter the dedup filter (``polls.dedup``) has already seen
+for the question is sent to the results page without the vote being counted.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.http import HttpResponse, HttpResponseRedirect
+from django.urls import reverse
+
+from . import dedup
+
+DEFAULTS = {
+    'RATE': 1.0,
+    'BURST': 5,
+    'MAX_CLIENTS': 100000,
+}
+
+
+class TokenBucketLimiter:
+    """Per-client token buckets held in a bounded LRU map."""
+
+    def __init__(self, rate, burst, max_clients):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, client, now=None):
+        """Take a token for ``client``; return 0 if allowed, else seconds until the next token."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self.buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate
+            self.buckets[client] = (tokens, now)
+            if len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+            return wait
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'POLLS_VOTE_RATE_LIMIT', {})}
+
+
+_limiter = None
+
+
+def get_limiter():
+    """Return the process-wide limiter, or None if rate limiting is off."""
+    global _limiter
+    if not getattr(settings, 'POLLS_VOTE_RATE_LIMIT', None):
+        return None
+    if _limiter is None:
+        config = get_config()
+        _limiter = TokenBucketLimiter(config['RATE'], config['BURST'], config['MAX_CLIENTS'])
+    return _limiter
+
+
+def rejection(request, question_id):
+    """Return why the request must not vote: ('rate_limited', seconds to wait), ('duplicate', 0) or None."""
+    limiter = get_limiter()
+    if limiter is not None:
+        wait = limiter.allow(request.META.get('REMOTE_ADDR', ''))
+        if wait:
+            return 'rate_limited', wait
+    if dedup.enabled():
+        voter, _ = dedup.voter_key(request)
+        if f'{question_id}:{voter}' in dedup.get_filter():
+            return 'duplicate', 0
+    return None
+
+
+def reject(request, question_id):
+    """Return the early response for a request that must not vote, or None."""
+    rejected = rejection(request, question_id)
+    if rejected is None:
+        return None
+    reason, wait = rejected
+    if reason == 'rate_limited':
+        response = HttpResponse('Too many votes, slow down.', status=429, content_type='text/plain')
+        response['Retry-After'] = str(math.ceil(wait))
+        return response
+    return HttpResponseRedirect(reverse('polls:results', args=(question_id,)))
+
+
+def remember(request, question_id, response):
+    """Add the voter to the dedup filter, issuing the voter cookie if needed."""
+    if not dedup.enabled():
+        return response
+    voter, new_cookie = dedup.voter_key(request)
+    dedup.get_filter().add(f'{question_id}:{voter}')
+    if new_cookie:
+        response.set_cookie(dedup.VOTER_COOKIE, new_cookie, max_age=365 * 24 * 3600, httponly=True, samesite='Lax')
+    return response
+
+
+def counted(request, question_id, response):
+    """Remember the voter once their vote went through."""
+    if response.status_code != 302:
+        return response
+    return remember(request, question_id, response)
+
+
+def guard_vote(view):
+    """Apply the rate limit and the one-vote-per-voter rule to a sync or async vote view."""
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapped(request, question_id):
+            rejected = reject(request, question_id)
+            if rejected is not None:
+                return rejected
+            return counted(request, question_id, await view(request, question_id))
+    else:
+        @wraps(view)
+        def wrapped(request, question_id):
+            rejected = reject(request, question_id)
+            if rejected is not None:
+                return rejected
+            return counted(request, question_id, view(request, question_id))
+    return wrapped
+
+
+def _setting_changed(setting, **kwargs):
+    global _limiter
+    if setting == 'POLLS_VOTE_RATE_LIMIT':
+        _limiter = None
+
+
+setting_changed.connect(_setting_changed)
@@ -0,0 +1,121 @@
+"""Rendering layer for the polls pages.
+
+Three caches, all per process except the fragments:
+
+* Templates: ``get_template()`` keeps compiled templates in a dict instead
+  of going through the template loaders on every render. Skipped with
+  ``DEBUG`` on, so edited templates show up.
+* URLs: ``question_url('polls:detail', pk)`` reverses the URL once, with a
+  placeholder id, and afterwards only pastes the id between the prefix and
+  suffix. ``{% url %}`` resolves the whole pattern again for each row of a
+  listing. The ``{% question_url %}`` tag in ``polls_tags`` wraps it.
+* Choice-list fragments: ``{% choice_fragment %}`` caches the rendered list
+  of choices of the detail and results pages under the question's results
+  version (``polls.results_cache``), so any vote or choice change renders it
+  again. Fragments are cached when ``POLLS_RESULTS_CACHE`` is set, unless
+  ``POLLS_CACHE_FRAGMENTS`` is False or the vote buffer shows voters their
+  own votes (``READ_YOUR_VOTES``): buffered votes change the results without
+  bumping the version. A fragment must not be older than its version, so on
+  a miss the choices are read from the primary (``polls.routers``), or come
+  from ``results_cache.get_results()``, which does the same. Only the async
+  detail page, which prefetches its choices from the replica, doesn't cache
+  its fragment while reading from a replica.
+
+``python -m benchmarks.bench_render`` times each page at 10, 100 and 1000
+choices with and without these caches.
+"""
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.template import loader
+from django.urls import get_script_prefix, get_urlconf, reverse
+from django.utils.safestring import mark_safe
+
+from . import results_cache, routers, vote_buffer
+
+# Stands in for the id when reversing; made of digits so int converters match it.
+PLACEHOLDER = 987654321
+
+_templates = {}
+_url_parts = {}
+
+
+def get_template(name):
+    """Return the compiled template, loading it once per process."""
+    if settings.DEBUG:
+        return loader.get_template(name)
+    template = _templates.get(name)
+    if template is None:
+        template = _templates[name] = loader.get_template(name)
+    return template
+
+
+def url_parts(name):
+    """Return the (prefix, suffix) around the id in the URL named ``name``."""
+    # The script prefix and urlconf can differ per request.
+    key = (name, get_script_prefix(), get_urlconf())
+    parts = _url_parts.get(key)
+    if parts is None:
+        prefix, _, suffix = reverse(name, args=(PLACEHOLDER,)).rpartition(str(PLACEHOLDER))
+        parts = _url_parts[key] = (prefix, suffix)
+    return parts
+
+
+def question_url(name, pk):
+    """``reverse(name, args=(pk,))`` for URLs taking one integer, without resolving the pattern."""
+    prefix, suffix = url_parts(name)
+    return f'{prefix}{int(pk)}{suffix}'
+
+
+def fragment_cache():
+    """Return the cache holding choice-list fragments, or None if they aren't cached."""
+    if not getattr(settings, 'POLLS_CACHE_FRAGMENTS', True):
+        return None
+    if vote_buffer.enabled() and vote_buffer.get_config()['READ_YOUR_VOTES']:
+        return None
+    return results_cache.get_cache()
+
+
+def prefetched_choices(question):
+    return 'choice_set' in getattr(question, '_prefetched_objects_cache', {})
+
+
+def choices_of(question):
+    """The question's choices in order, lazily: a cached fragment never runs the query."""
+    if prefetched_choices(question):
+        return question.choice_set.all()
+    return question.choice_set.order_by('pk')
+
+
+def render_choices(template_name, question, choices=None):
+    """Render the choice list of a question, from the fragment cache when possible."""
+    cache = fragment_cache()
+    key = None
+    if cache is not None:
+        key = f'polls:fragment:{template_name}:{question.pk}:{results_cache.get_version(cache, question.pk)}'
+        html = cache.get(key)
+        if html is not None:
+            return mark_safe(html)
+    fresh = True
+    if choices is None:
+        choices = choices_of(question)
+        if key is not None and routers.reading_from_replica():
+            if prefetched_choices(question):
+                # Read from the replica by an async view, which can't query here.
+                fresh = False
+            else:
+                # using(): the related manager would follow the question to the replica.
+                choices = choices.using('default')
+    html = get_template(template_name).render({'question': question, 'choices': choices})
+    if key is not None and fresh:
+        cache.set(key, str(html), getattr(settings, 'POLLS_RESULTS_CACHE_TIMEOUT', 300))
+    return html
+
+
+def _setting_changed(setting, **kwargs):
+    if setting in ('TEMPLATES', 'DEBUG'):
+        _templates.clear()
+    elif setting == 'ROOT_URLCONF':
+        _url_parts.clear()
+
+
+setting_changed.connect(_setting_changed)
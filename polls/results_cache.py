@@ -0,0 +1,156 @@
+"""Cache of per-choice results, invalidated by a per-question version counter.
+
+Enable it by naming a cache alias in ``POLLS_RESULTS_CACHE`` (e.g.
+``'default'``). Use a shared backend such as Memcached or Redis in production
+so that every worker sees the version bumps; locmem is only right for a
+single process and for tests.
+
+Entries are stored under ``polls:results:<question id>:<version>``. Anything
+that changes the results (votes, choice edits, new choices) bumps the
+version, so stale entries are simply never read again and expire on their
+own. Misses are computed on the primary, also in views that read from a
+replica (``polls.routers``): the version was read first, so the entry is at
+least as new as it.
+Every bump also sends ``results_changed``, which drives the live results
+stream (``polls.live``).
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.dispatch import Signal
+
+from . import counters, routers
+from .models import Choice
+
+
+class Stats:
+    """Thread-safe hit/miss counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+stats = Stats()
+
+# Sent with ``question_ids`` whenever results change, whether or not caching is on.
+results_changed = Signal()
+
+
+def get_cache():
+    """Return the configured cache, or None if results caching is off."""
+    alias = getattr(settings, 'POLLS_RESULTS_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def version_key(question_id):
+    return f'polls:results:version:{question_id}'
+
+
+def get_version(cache, question_id):
+    version = cache.get(version_key(question_id))
+    if version is None:
+        # Start from the clock rather than 1 so an evicted counter can't
+        # come back at a version whose stale entry is still cached.
+        cache.add(version_key(question_id), time.time_ns(), None)
+        version = cache.get(version_key(question_id))
+    return version
+
+
+async def aget_version(cache, question_id):
+    version = await cache.aget(version_key(question_id))
+    if version is None:
+        await cache.aadd(version_key(question_id), time.time_ns(), None)
+        version = await cache.aget(version_key(question_id))
+    return version
+
+
+def bump(*question_ids):
+    """Invalidate the cached results of the given questions."""
+    results_changed.send(sender=None, question_ids=question_ids)
+    cache = get_cache()
+    if cache is None:
+        return
+    for question_id in question_ids:
+        try:
+            cache.incr(version_key(question_id))
+        except ValueError:
+            cache.set(version_key(question_id), time.time_ns(), None)
+
+
+async def abump(*question_ids):
+    """Async counterpart of ``bump()``."""
+    results_changed.send(sender=None, question_ids=question_ids)
+    cache = get_cache()
+    if cache is None:
+        return
+    for question_id in question_ids:
+        try:
+            await cache.aincr(version_key(question_id))
+        except ValueError:
+            await cache.aset(version_key(question_id), time.time_ns(), None)
+
+
+def results_queryset(question_id):
+    return counters.with_totals(Choice.objects.filter(question_id=question_id).order_by('pk'))
+
+
+def as_result(choice):
+    return {'id': choice.pk, 'choice_text': choice.choice_text, 'total_votes': choice.total_votes}
+
+
+def compute_results(question_id):
+    """Return the choices of a question with their vote totals as plain dicts."""
+    return [as_result(choice) for choice in results_queryset(question_id)]
+
+
+async def acompute_results(question_id):
+    return [as_result(choice) async for choice in results_queryset(question_id)]
+
+
+def get_results(question_id):
+    """Return the results of a question, from the cache when possible."""
+    cache = get_cache()
+    if cache is None:
+        return compute_results(question_id)
+    key = f'polls:results:{question_id}:{get_version(cache, question_id)}'
+    results = cache.get(key)
+    stats.record(results is not None)
+    if results is None:
+        with routers.on_primary():
+            results = compute_results(question_id)
+        cache.set(key, results, getattr(settings, 'POLLS_RESULTS_CACHE_TIMEOUT', 300))
+    return results
+
+
+async def aget_results(question_id):
+    """Async counterpart of ``get_results()``."""
+    cache = get_cache()
+    if cache is None:
+        return await acompute_results(question_id)
+    key = f'polls:results:{question_id}:{await aget_version(cache, question_id)}'
+    results = await cache.aget(key)
+    stats.record(results is not None)
+    if results is None:
+        with routers.on_primary():
+            results = await acompute_results(question_id)
+        await cache.aset(key, results, getattr(settings, 'POLLS_RESULTS_CACHE_TIMEOUT', 300))
+    return results
@@ -0,0 +1,170 @@
+"""Read-replica routing for the polls views.
+
+List the replica aliases in ``POLLS_READ_REPLICAS`` and add the router::
+
+    DATABASES = {'default': {...}, 'replica': {...}}
+    DATABASE_ROUTERS = ['polls.routers.ReplicaRouter']
+    POLLS_READ_REPLICAS = ['replica']
+    POLLS_STICKY_PRIMARY_SECONDS = 5
+
+Only views wrapped in ``read_from_replica`` read from a replica (the index,
+published list, detail and results pages), and only for polls models.
+Everything else, including the reads inside ``vote`` and ``add_question``,
+uses the primary. Writes always go to the primary.
+
+After a write, ``stick_to_primary`` sets a cookie so that the same client
+reads from the primary for ``POLLS_STICKY_PRIMARY_SECONDS``. The redirect to
+the results page then shows the client's own vote even while the replicas
+lag behind. Keep the window above the usual replication lag.
+
+The results, fragment and page caches stay on with replicas. Their entries
+are stored under a version (or generation) that every write bumps, so an
+entry computed from a lagging replica could be older than its version and
+hide a vote from the sticky client. ``on_primary()`` makes the reads of a
+cache miss go to the primary instead, and entries are never older than their
+version. Cache hits, and everything else the views read, still come from the
+replica.
+"""
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+from . import metrics
+
+STICKY_COOKIE = 'polls_primary_until'
+
+# Alias the polls models are read from during the current request; None means the primary.
+current_replica = ContextVar('polls_current_replica', default=None)
+
+
+def replicas():
+    return getattr(settings, 'POLLS_READ_REPLICAS', [])
+
+
+def sticky_seconds():
+    return getattr(settings, 'POLLS_STICKY_PRIMARY_SECONDS', 5)
+
+
+def reading_from_replica():
+    return current_replica.get() is not None
+
+
+@contextmanager
+def on_primary():
+    """Read the polls models from the primary inside the block, e.g. to fill a cache entry."""
+    token = current_replica.set(None)
+    try:
+        yield
+    finally:
+        current_replica.reset(token)
+
+
+class ReplicaRouter:
+    """Send polls reads to the replica chosen for the request, and all writes to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'polls':
+            return current_replica.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+
+def is_sticky(request):
+    """Whether the client wrote recently enough that it must read from the primary."""
+    try:
+        return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def choose_replica(request):
+    aliases = replicas()
+    if not aliases or is_sticky(request):
+        return None
+    return random.choice(aliases)
+
+
+async def _run_on(alias, coroutine):
+    token = current_replica.set(alias)
+    try:
+        return await coroutine
+    finally:
+        current_replica.reset(token)
+
+
+def iterate_on(alias, iterator):
+    """Yield from ``iterator``, reading from ``alias`` while each item is produced.
+
+    Streaming responses are consumed after the view, and with it
+    ``read_from_replica``, has returned: pass the view's ``current_replica``.
+    """
+    iterator = iter(iterator)
+    while True:
+        token = current_replica.set(alias)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            current_replica.reset(token)
+        yield item
+
+
+def read_from_replica(view):
+    """Run a sync or async read-only view against a replica, unless the client is sticky."""
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            return await _run_on(choose_replica(request), view(request, *args, **kwargs))
+        return wrapped
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        alias = choose_replica(request)
+        token = current_replica.set(alias)
+        try:
+            response = view(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                # Async views, and dispatch() of async class-based views.
+                return _run_on(alias, response)
+            # Template responses query the database when rendered.
+            if hasattr(response, 'render') and callable(response.render):
+                metrics.render(response)
+            return response
+        finally:
+            current_replica.reset(token)
+    return wrapped
+
+
+def make_sticky(response):
+    seconds = sticky_seconds()
+    if replicas() and seconds:
+        response.set_cookie(STICKY_COOKIE, f'{time.time() + seconds:.3f}', max_age=seconds,
+                            httponly=True, samesite='Lax')
+    return response
+
+
+def stick_to_primary(view):
+    """Pin the client to the primary for a while after the view redirects (i.e. wrote)."""
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            response = await view(request, *args, **kwargs)
+            return make_sticky(response) if response.status_code == 302 else response
+    else:
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            return make_sticky(response) if response.status_code == 302 else response
+    return wrapped
@@ -0,0 +1,91 @@
+"""Scheduled publication: the published set as a flag instead of a clock filter.
+
+``Question.is_published`` is true once a question has choices and its
+``pub_date`` has passed, and ``Question.objects.published()`` filters on the
+flag alone. Listing queries are then the same from one request to the next,
+so the database and the caches in front of it can reuse their results.
+
+The flag is set when a question is saved and when it gains or loses its
+choices (``polls.signals``). Questions dated in the future are picked up by
+``publish_due()``, which flips the flag of every question whose time has
+come and sends ``questions_published``; receivers drop cached pages that
+listed the published set.
+
+``tick()`` runs at the start of every request and costs nothing until the
+next scheduled question in this process is due. It also looks for questions
+scheduled by other processes (or bulk inserted) every
+``POLLS_PUBLISH_RECHECK_SECONDS`` (default 60). For exact timing across
+processes, run ``manage.py publish_questions --interval 1`` as well.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Question
+
+# Sent with ``question_ids`` when scheduled questions go live.
+questions_published = Signal()
+
+_lock = threading.Lock()
+_running = threading.Lock()
+_next_due = None
+# Not checking right at startup keeps the first requests free of extra queries.
+_checked = time.monotonic()
+
+
+def recheck_seconds():
+    return getattr(settings, 'POLLS_PUBLISH_RECHECK_SECONDS', 60)
+
+
+def is_live(has_choices, pub_date, now=None):
+    """Whether a question with these values belongs in the published set."""
+    return bool(has_choices) and pub_date <= (now or timezone.now())
+
+
+def schedule(pub_date):
+    """Note that a question goes live at ``pub_date``, so ``tick()`` publishes it on time."""
+    global _next_due
+    with _lock:
+        if pub_date > timezone.now() and (_next_due is None or pub_date < _next_due):
+            _next_due = pub_date
+
+
+def next_due():
+    """When the next question known to this process goes live, or None."""
+    return _next_due
+
+
+def publish_due(now=None):
+    """Publish every question whose time has come; return their ids."""
+    global _next_due, _checked
+    now = now or timezone.now()
+    # These queries read the scheduled questions through their partial index.
+    scheduled = Question.objects.filter(is_published=False, has_choices=True)
+    due = list(scheduled.filter(pub_date__lte=now).values_list('pk', flat=True))
+    # The conditions again: a question may have lost its choices since.
+    if due and scheduled.filter(pk__in=due, pub_date__lte=now).update(is_published=True) < len(due):
+        due = list(Question.objects.filter(pk__in=due, is_published=True).values_list('pk', flat=True))
+    upcoming = scheduled.filter(pub_date__gt=now).order_by('pub_date').values_list('pub_date', flat=True).first()
+    with _lock:
+        _next_due = upcoming
+        _checked = time.monotonic()
+    if due:
+        questions_published.send(sender=Question, question_ids=due)
+    return due
+
+
+def tick(**kwargs):
+    """Publish due questions if one is due or the periodic recheck is; cheap otherwise."""
+    due = _next_due is not None and _next_due <= timezone.now()
+    if not due and time.monotonic() - _checked < recheck_seconds():
+        return
+    # One request per process does the work; the others carry on.
+    if _running.acquire(blocking=False):
+        try:
+            publish_due()
+        finally:
+            _running.release()
+
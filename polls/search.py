@@ -0,0 +1,319 @@
+"""Question search: an indexed substring filter for the admin, and the word
+index behind ``/polls/search/``.
+
+The admin's ``search_fields`` turns into a ``LIKE '%term%'`` match on
+``question_text``, which scans the whole table. The database gets an index
+that can answer that query instead:
+
+* PostgreSQL: a ``pg_trgm`` GIN index on the ``UPPER(question_text::text)``
+  expression Django's ``icontains`` compares against, created by migration
+  ``0013_question_text_trgm``. Enabling the extension needs a privileged
+  role; without one the migration logs a warning and skips the index.
+* SQLite: an external-content FTS5 table with the trigram tokenizer, kept in
+  sync with ``polls_question`` by triggers. ``filter_question_text()``
+  queries it with ``MATCH``. ``install()`` (run after every ``migrate``)
+  creates it, and recreates the triggers that SQLite drops whenever a
+  migration rebuilds ``polls_question``.
+
+Other databases, and terms shorter than three characters (which have no
+trigram), fall back to ``icontains``.
+
+``search_questions()`` ranks published questions by the words of their text
+and choices. The inverted index lives in ``SearchTerm``: one row per
+(word, question), plus one per word prefix of two or more characters, so
+both whole-word and prefix lookups are equality matches on the
+``(term, question)`` unique index, and the postings of each term are
+indexed in rank order. Terms stop at ``MAX_PREFIX_LENGTH`` characters:
+longer words are indexed under their first six, and longer query words are
+looked up the same way, then checked against the words of the few
+questions that rank. Indexing every prefix of every word made the index 65%
+larger (56 rows per benchmark question instead of 34). Words of the
+question text weigh more than words of its choices, and whole words more
+than prefixes.
+
+Signals in ``polls.signals`` call ``reindex_on_commit()`` whenever a
+question or one of its choices changes. It reindexes each question once
+when the transaction commits, so saving a question's N choices in one
+transaction (the admin inline) rebuilds its entries once, not N times.
+Bulk inserts call ``add_to_index()`` themselves, and ``manage.py
+rebuild_search_index`` indexes existing data.
+"""
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.db import connections, transaction
+from django.db.models import F, FilteredRelation, Q
+from django.db.models.expressions import RawSQL
+from django.db.utils import OperationalError
+
+from .models import Choice, Question, SearchTerm
+
+FTS_TABLE = 'polls_question_fts'
+
+SQLITE_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"question_text, content='polls_question', content_rowid='id', tokenize='trigram')"
+)
+
+SQLITE_TRIGGERS = {
+    f'{FTS_TABLE}_ai': (
+        f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON polls_question BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, question_text) VALUES (new.id, new.question_text); END"
+    ),
+    f'{FTS_TABLE}_ad': (
+        f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON polls_question BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, question_text) VALUES ('delete', old.id, old.question_text); END"
+    ),
+    f'{FTS_TABLE}_au': (
+        f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF question_text ON polls_question BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, question_text) VALUES ('delete', old.id, old.question_text); "
+        f"INSERT INTO {FTS_TABLE}(rowid, question_text) VALUES (new.id, new.question_text); END"
+    ),
+}
+
+MIN_TERM_LENGTH = 3
+
+_fts_tables = {}
+
+
+def install(using='default'):
+    """Create the SQLite FTS table, or repair it; safe to run repeatedly.
+
+    Migrations that rebuild ``polls_question`` drop its triggers, so missing
+    triggers are recreated and the FTS table rebuilt from scratch.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or 'polls_question' not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(SQLITE_TABLE)
+        except OperationalError:
+            # SQLite older than 3.34 has no trigram tokenizer.
+            return
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'polls_question'")
+        existing = {name for name, in cursor.fetchall()}
+        missing = [sql for name, sql in SQLITE_TRIGGERS.items() if name not in existing]
+        for statement in missing:
+            cursor.execute(statement)
+        if missing:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    _fts_tables.pop(using, None)
+
+
+def has_fts(using='default'):
+    """Whether the SQLite FTS5 table exists on the given database."""
+    if using not in _fts_tables:
+        connection = connections[using]
+        _fts_tables[using] = connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+    return _fts_tables[using]
+
+
+def filter_question_text(queryset, term):
+    """Filter a Question queryset to texts containing ``term``, case-insensitively."""
+    if len(term) >= MIN_TERM_LENGTH and has_fts(queryset.db):
+        phrase = '"{}"'.format(term.replace('"', '""'))
+        return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [phrase]))
+    return queryset.filter(question_text__icontains=term)
+
+
+WORD_RE = re.compile(r'\w+')
+STOP_WORDS = frozenset(
+    'a an and are as at be by can do does for from how i in is it of on or the to '
+    'was we what when where which who why will with you your'.split()
+)
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_LENGTH = 6
+MAX_QUERY_WORDS = 8
+CANDIDATES_PER_RESULT = 3
+RARITY_SAMPLE = 1000
+# Words are compared by their postings among this many of the newest questions.
+RARITY_WINDOW = 100000
+QUESTION_WEIGHT = 3
+CHOICE_WEIGHT = 1
+
+
+def tokenize(text):
+    """Split text into lowercase, accent-free words, without stop words."""
+    text = text.casefold()
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+    max_length = SearchTerm._meta.get_field('term').max_length
+    return [word[:max_length] for word in WORD_RE.findall(text) if word not in STOP_WORDS]
+
+
+def question_terms(question_text, choice_texts):
+    """Return {term: weight} for a question and the texts of its choices."""
+    weights = Counter()
+    texts = [(question_text, QUESTION_WEIGHT)] + [(text, CHOICE_WEIGHT) for text in choice_texts]
+    for text, weight in texts:
+        for word in tokenize(text):
+            weights[word[:MAX_PREFIX_LENGTH]] += 2 * weight
+            for end in range(MIN_PREFIX_LENGTH, min(len(word), MAX_PREFIX_LENGTH)):
+                weights[word[:end]] += weight
+    return weights
+
+
+def add_to_index(questions):
+    """Insert index entries for new questions, given as (question_id, question_text, choice_texts)."""
+    SearchTerm.objects.bulk_create(
+        [SearchTerm(term=term, question_id=question_id, weight=weight)
+         for question_id, text, choice_texts in questions
+         for term, weight in question_terms(text, choice_texts).items()],
+        batch_size=1000,
+    )
+
+
+def index_questions(question_ids):
+    """Replace the index entries of the given questions."""
+    question_ids = list(question_ids)
+    texts = dict(Question.objects.filter(pk__in=question_ids).values_list('pk', 'question_text'))
+    choices = defaultdict(list)
+    for question_id, choice_text in Choice.objects.filter(question_id__in=texts).values_list('question_id', 'choice_text'):
+        choices[question_id].append(choice_text)
+    with transaction.atomic():
+        SearchTerm.objects.filter(question_id__in=question_ids).delete()
+        add_to_index((question_id, text, choices[question_id]) for question_id, text in texts.items())
+
+
+_pending = threading.local()
+
+
+def pending_questions(using):
+    """Ids of the questions waiting to be reindexed on this thread's connection to ``using``."""
+    if not hasattr(_pending, 'ids'):
+        _pending.ids = defaultdict(set)
+    return _pending.ids[using]
+
+
+def reindex_on_commit(question_ids, using='default'):
+    """Reindex the questions once the current transaction commits, each of them once."""
+    pending_questions(using).update(question_ids)
+    # Registered on every call: a rolled back transaction drops its callbacks,
+    # and the ids it left behind are reindexed, harmlessly, with the next commit.
+    transaction.on_commit(lambda: reindex_pending(using), using=using)
+
+
+def reindex_pending(using='default'):
+    pending = pending_questions(using)
+    if pending:
+        question_ids = list(pending)
+        pending.clear()
+        index_questions(question_ids)
+
+
+def rebuild_index(batch_size=1000):
+    """Index every question, a batch at a time; return how many were indexed."""
+    indexed = 0
+    last_id = 0
+    while True:
+        ids = list(Question.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return indexed
+        index_questions(ids)
+        indexed += len(ids)
+        last_id = ids[-1]
+
+
+def postings_count(term, cap=RARITY_SAMPLE, after=0):
+    """How many questions with an id above ``after`` the term is indexed for, counting no further than ``cap``."""
+    return SearchTerm.objects.filter(term=term, question_id__gt=after)[:cap].count()
+
+
+def rarity(words):
+    """Return {word: sort key}, rarest lowest, or None if a word has no postings at all.
+
+    The counts are taken over the newest ``RARITY_WINDOW`` questions, so a
+    word in one question in a thousand stays below ``RARITY_SAMPLE`` however
+    many questions there are; over the whole table it would tie with the
+    common words at the cap. A word none of them has is looked up among the
+    older questions.
+    """
+    newest = Question.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    after = max(newest - RARITY_WINDOW, 0)
+    recent = {word: postings_count(word, after=after) for word in words}
+    older = {word: postings_count(word) if after else 0 for word, count in recent.items() if not count}
+    if not all(older.values()):
+        return None
+    return {word: (count, older.get(word, 0)) for word, count in recent.items()}
+
+
+def starts_words(words, tokens):
+    """Whether each of ``words`` starts one of ``tokens``."""
+    return all(any(token.startswith(word) for token in tokens) for word in words)
+
+
+def having_words(questions, words, limit):
+    """The first ``limit`` questions whose text or choices have, for each of ``words``, a word starting with it.
+
+    Checked ``limit`` questions at a time: the texts first, then in one query
+    the choices of the questions whose text doesn't have every word.
+    """
+    found = []
+    for start in range(0, len(questions), limit):
+        page = questions[start:start + limit]
+        tokens = {question.pk: set(tokenize(question.question_text)) for question in page}
+        unmatched = [question_id for question_id, seen in tokens.items() if not starts_words(words, seen)]
+        if unmatched:
+            choices = Choice.objects.filter(question_id__in=unmatched).values_list('question_id', 'choice_text')
+            for question_id, choice_text in choices:
+                tokens[question_id].update(tokenize(choice_text))
+        found += [question for question in page if starts_words(words, tokens[question.pk])]
+        if len(found) >= limit:
+            break
+    return found[:limit]
+
+
+def search_questions(query, limit=20):
+    """Return up to ``limit`` published questions matching every word of the query, best first.
+
+    Each word of the query matches whole words and word prefixes. A single
+    word reads the top ``limit`` postings of its term, which are indexed in
+    rank order. With several words, the term with the fewest postings among
+    recent questions (see ``rarity()``) drives: its postings are read in index
+    order (highest weight, then newest) until ``CANDIDATES_PER_RESULT *
+    limit`` questions that also contain the other words are found, and
+    those are ranked by their total weight. A word no question has ends the
+    search before any join. The questions come back in the same query. A
+    word longer than ``MAX_PREFIX_LENGTH`` is looked up by its first
+    characters, and the candidates are then checked for the whole word (one
+    more query, for the choices of those whose text doesn't have it). The
+    cost depends on ``limit`` and the rarest word, not on the number of
+    questions.
+    """
+    words = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_WORDS]
+    if not words:
+        return []
+    truncated = [word for word in words if len(word) > MAX_PREFIX_LENGTH]
+    words = list(dict.fromkeys(word[:MAX_PREFIX_LENGTH] for word in words))
+    if len(words) > 1:
+        counts = rarity(words)
+        if counts is None:
+            return []
+        words.sort(key=counts.get)
+    driver, others = words[0], words[1:]
+    # The published() condition as a join: with "question_id IN (subquery)"
+    # SQLite scans every published question instead of the term's postings.
+    candidates = SearchTerm.objects.filter(term=driver, question__is_published=True).select_related('question')
+    score = F('weight')
+    for number, word in enumerate(others):
+        name = f'word{number}'
+        candidates = candidates.annotate(**{
+            name: FilteredRelation('question__search_terms', condition=Q(question__search_terms__term=word)),
+        }).filter(**{f'{name}__isnull': False})
+        score += F(f'{name}__weight')
+    candidates = candidates.annotate(score=score).order_by('-weight', '-question_id')
+    # A single word's postings are already in rank order.
+    candidates = candidates[:CANDIDATES_PER_RESULT * limit if others or truncated else limit]
+    ranked = sorted(candidates, key=lambda posting: (-posting.score, -posting.question_id))
+    questions = [posting.question for posting in ranked]
+    if truncated:
+        return having_words(questions, truncated, limit)
+    return questions[:limit]
+
+
+def _post_migrate(sender, using='default', **kwargs):
+    install(using)
@@ -0,0 +1,101 @@
+from django.core.signals import request_started
+from django.db.models import BooleanField, Exists, ExpressionWrapper, OuterRef, Q, QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import live, page_cache, results_cache, scheduler, search  # noqa: F401 (live connects its receivers)
+from .models import Choice, Question
+
+
+@receiver(post_save, sender=Choice)
+def choice_saved(sender, instance, created, using='default', **kwargs):
+    """Flag the question as having choices and invalidate its results."""
+    if created:
+        mark_has_choices([instance.question_id])
+    results_cache.bump(instance.question_id)
+    search.reindex_on_commit([instance.question_id], using)
+
+
+def deleting_questions(origin):
+    """Whether a delete started from questions (one, or a queryset as archiving does)."""
+    return isinstance(origin, Question) or (isinstance(origin, QuerySet) and origin.model is Question)
+
+
+@receiver(post_delete, sender=Choice)
+def choice_deleted(sender, instance, origin=None, using='default', **kwargs):
+    """Clear the flag if the question's last choice was deleted."""
+    # When the question itself is being deleted, its flag, results and index entries go with it.
+    if deleting_questions(origin):
+        return
+    refresh_has_choices([instance.question_id])
+    results_cache.bump(instance.question_id)
+    search.reindex_on_commit([instance.question_id], using)
+
+
+@receiver(pre_save, sender=Question)
+def question_saving(sender, instance, using=None, **kwargs):
+    """Put the question in or out of the published set, or schedule it.
+
+    is_published is derived from the database's has_choices, never the
+    instance's: a stale save must not pull a question that went live.
+    """
+    if not instance._state.adding:
+        # The instance may predate its choices (an admin form opened earlier,
+        # a question loaded before a choice was added): ask the database.
+        instance.has_choices = Choice.objects.using(using).filter(question_id=instance.pk).exists()
+    instance.is_published = scheduler.is_live(instance.has_choices, instance.pub_date)
+    # Scheduled even without choices: a choice added later makes it due.
+    scheduler.schedule(instance.pub_date)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, **kwargs):
+    """Cached listings may show the question."""
+    page_cache.invalidate()
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, created, update_fields=None, using='default', **kwargs):
+    """Reindex the question when its text may have changed.
+
+    A new question has no choices, so it can't be found until one is added,
+    which indexes it.
+    """
+    if not created and (update_fields is None or 'question_text' in update_fields):
+        search.reindex_on_commit([instance.pk], using)
+
+
+@receiver(scheduler.questions_published)
+def questions_published(sender, question_ids, **kwargs):
+    """Cached listings don't show the questions that just went live."""
+    page_cache.invalidate()
+
+
+@receiver(request_started)
+def publish_scheduled(sender, **kwargs):
+    scheduler.tick()
+
+
+def published_if(*conditions):
+    """is_published for an UPDATE: the conditions hold and pub_date has passed."""
+    return ExpressionWrapper(Q(*conditions, pub_date__lte=timezone.now()), output_field=BooleanField())
+
+
+def mark_has_choices(question_ids):
+    """Set has_choices on questions that just got a choice (used after bulk_create too)."""
+    updated = Question.objects.filter(pk__in=question_ids, has_choices=False).update(
+        has_choices=True, is_published=published_if(),
+    )
+    if updated:
+        page_cache.invalidate()
+
+
+def refresh_has_choices(question_ids):
+    """Recompute has_choices, and with it is_published, from the Choice table."""
+    has_choices = Exists(Choice.objects.filter(question=OuterRef('pk')))
+    Question.objects.filter(pk__in=question_ids).update(
+        has_choices=has_choices, is_published=published_if(has_choices),
+    )
+    page_cache.invalidate()
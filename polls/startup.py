@@ -0,0 +1,135 @@
+"""Boot the project one phase at a time and time each phase.
+
+Run in a fresh interpreter, usually through ``manage.py profile_startup``::
+
+    python -X importtime -m polls.startup [--no-warm-up] [--path /polls/]
+
+Prints one JSON object: the seconds spent in each phase, the modules first
+imported during each phase, and the status of the first response. The
+phases follow a worker's cold start: importing Django, loading settings,
+populating the app registry (admin autodiscovery on its own), building the
+WSGI handler, the optional warm-up (``polls.warmup``) and the first request,
+which resolves the URL and renders the page with whatever is still cold.
+
+Nothing from Django is imported at module level so that the first phase
+measures it.
+"""
+import argparse
+import io
+import json
+import sys
+import time
+
+# (phase, description) in boot order.
+PHASES = [
+    ('django', 'import django'),
+    ('settings', 'load the settings module'),
+    ('apps', 'populate the app registry: app configs, models, ready()'),
+    ('admin', 'admin autodiscover (part of the app registry)'),
+    ('handler', 'build the WSGI handler and middleware'),
+    ('warm_up', 'polls.warmup: URL resolver, templates, ORM, gc.freeze()'),
+    ('first_request', 'first request, until the response is ready'),
+]
+
+
+class PhaseTimer:
+    """Time consecutive phases and the modules each one imports."""
+
+    def __init__(self):
+        self.timings = {}
+        self.modules = {}
+
+    def run(self, phase, func, *args, **kwargs):
+        before = set(sys.modules)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.timings[phase] = self.timings.get(phase, 0) + time.perf_counter() - start
+            self.modules[phase] = sorted(set(sys.modules) - before)
+
+
+def request_environ(path):
+    from django.conf import settings
+
+    hosts = [host for host in settings.ALLOWED_HOSTS if host not in ('*', '.localhost')] or ['localhost']
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': hosts[0].lstrip('.'),
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+    }
+
+
+def profile_boot(warm_up=True, path='/polls/', configure=None):
+    """Boot in phases; return {'timings': {phase: seconds}, 'modules': {...}, 'status': int}.
+
+    ``configure`` sets up settings instead of ``DJANGO_SETTINGS_MODULE``
+    (the benchmarks call ``settings.configure()``).
+    """
+    timer = PhaseTimer()
+    django = timer.run('django', __import__, 'django')
+
+    def load_settings():
+        from django.conf import settings
+        if configure is not None:
+            configure()
+        settings.INSTALLED_APPS
+
+    timer.run('settings', load_settings)
+
+    # django.contrib.admin binds autodiscover_modules when the app registry
+    # imports it; a wrapper bound in its place times admin autodiscovery.
+    from django.utils import module_loading
+    autodiscover_modules = module_loading.autodiscover_modules
+
+    def timed_autodiscover_modules(*args, **kwargs):
+        if 'admin' not in args:
+            return autodiscover_modules(*args, **kwargs)
+        return timer.run('admin', autodiscover_modules, *args, **kwargs)
+
+    module_loading.autodiscover_modules = timed_autodiscover_modules
+    try:
+        timer.run('apps', django.setup, set_prefix=False)
+    finally:
+        module_loading.autodiscover_modules = autodiscover_modules
+        admin = sys.modules.get('django.contrib.admin')
+        if admin is not None:
+            admin.autodiscover_modules = autodiscover_modules
+    # Admin autodiscovery ran inside the app registry phase; count it once.
+    timer.timings['apps'] -= timer.timings.get('admin', 0)
+    timer.modules['apps'] = sorted(set(timer.modules['apps']) - set(timer.modules.get('admin', ())))
+
+    from django.core.handlers.wsgi import WSGIHandler
+    application = timer.run('handler', WSGIHandler)
+    if warm_up:
+        from polls import warmup
+        timer.run('warm_up', warmup.warm_up)
+
+    statuses = []
+
+    def first_request():
+        response = application(request_environ(path), lambda status, headers: statuses.append(int(status[:3])))
+        for _ in response:
+            pass
+        response.close()
+
+    timer.run('first_request', first_request)
+    return {'timings': timer.timings, 'modules': timer.modules, 'status': statuses[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--no-warm-up', dest='warm_up', action='store_false')
+    parser.add_argument('--path', default='/polls/')
+    args = parser.parse_args()
+    print(json.dumps(profile_boot(args.warm_up, args.path)))
+
+
+if __name__ == '__main__':
+    main()
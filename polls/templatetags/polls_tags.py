@@ -0,0 +1,17 @@
+from django import template
+
+from polls import rendering
+
+register = template.Library()
+
+
+@register.simple_tag
+def question_url(name, pk):
+    """``{% url name pk %}`` for the polls URLs taking a question id, from a precomputed prefix."""
+    return rendering.question_url(name, pk)
+
+
+@register.simple_tag
+def choice_fragment(template_name, question, choices=None):
+    """Render ``template_name`` with the question's choices, cached under its results version."""
+    return rendering.render_choices(template_name, question, choices)
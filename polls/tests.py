@@ -1,12 +1,25 @@
+from asgiref.sync import async_to_sync, sync_to_async
+from contextlib import contextmanager
 from random import choice
-from django.test import TestCase
+from io import StringIO
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.db.models import Sum
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.urls import reverse
+from django.http import Http404
 
-import datetime, threading
+import asyncio, datetime, gc, gzip, json, os, tempfile, threading, time
 
-from .models import Question, Choice
+from .models import ArchivedQuestion, MaterializerState, Question, Choice, SearchTerm, VoteBucket, VoteEvent, VoteShard
 from .forms import QuestionForm
+from . import asgi as polls_asgi, async_views, counters, dedup, events, export, live, metrics, middleware, page_cache, pool, ratelimit, rendering, results_cache, routers, scheduler, search, vote_buffer, warmup
+from .management.commands import import_polls
+from .pagination import EstimatedCountPaginator
 from django.forms import modelformset_factory
 
 class QuestionModelTests(TestCase):
@@ -43,6 +56,111 @@ def create_choice(question, choice_text):
     """Create a choice for the given question with the given choice_text."""
     return Choice.objects.create(question=question, choice_text=choice_text)
 
+def asgi_get(path, query_string='', headers=()):
+    """GET ``path`` through the project's ASGI handler; return (status, headers, body)."""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query_string.encode(),
+             'headers': [(name.encode(), value.encode()) for name, value in headers]}
+    async_to_sync(polls_asgi.get_asgi_application())(scope, receive, send)
+    start = messages[0]
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return start['status'], {name.decode(): value.decode() for name, value in start['headers']}, body
+
+class HasChoicesFlagTests(TestCase):
+    """Test that Question.has_choices follows the question's choices."""
+
+    def test_flag_set_when_choice_added(self):
+        """Adding a choice flags the question."""
+        question = create_question("Flag?", -1)
+        self.assertFalse(question.has_choices)
+        create_choice(question, "Choice 1")
+        question.refresh_from_db()
+        self.assertTrue(question.has_choices)
+
+
+    def test_flag_cleared_when_last_choice_deleted(self):
+        """Deleting the last choice clears the flag, deleting others doesn't."""
+        question = create_question("Flag?", -1)
+        choice1 = create_choice(question, "Choice 1")
+        choice2 = create_choice(question, "Choice 2")
+        choice1.delete()
+        question.refresh_from_db()
+        self.assertTrue(question.has_choices)
+        Choice.objects.filter(pk=choice2.pk).delete()
+        question.refresh_from_db()
+        self.assertFalse(question.has_choices)
+        response = self.client.get(reverse('polls:detail', args=(question.id,)))
+        self.assertEqual(response.status_code, 404)
+
+
+    def test_stale_instance_keeps_flag(self):
+        """Saving an instance loaded before its first choice doesn't clear the flag."""
+        question = create_question("Stale?", -1)
+        stale = Question.objects.get(pk=question.pk)
+        create_choice(question, "Choice 1")
+        stale.question_text = "Still stale?"
+        stale.save()
+        question.refresh_from_db()
+        self.assertTrue(question.has_choices)
+        self.assertTrue(question.is_published)
+        self.assertEqual(Question.objects.published().count(), 1)
+
+
+class QueryBudgetMixin:
+    """Fail a test when a block runs more database queries than its budget."""
+
+    @contextmanager
+    def assertMaxQueries(self, budget, using='default'):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        executed = len(context)
+        queries = '\n'.join(query['sql'] for query in context.captured_queries)
+        self.assertLessEqual(executed, budget, f"{executed} queries run, budget is {budget}:\n{queries}")
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Each view runs a fixed number of queries however many choices a question has."""
+    def setUp(self):
+        self.question = create_question("Budget?", -1)
+        self.choices = [create_choice(self.question, f"Choice {n}") for n in range(20)]
+        for n in range(10):
+            create_choice(create_question(f"Other {n}?", -2), "Choice")
+
+
+    def test_index(self):
+        with self.assertMaxQueries(1):
+            self.client.get(reverse('polls:index'))
+
+
+    def test_published_questions(self):
+        with self.assertMaxQueries(1):
+            self.client.get(reverse('polls:published_questions'))
+
+
+    def test_detail(self):
+        with self.assertMaxQueries(2):
+            response = self.client.get(reverse('polls:detail', args=(self.question.id,)))
+        self.assertContains(response, "Choice 19")
+
+
+    def test_results(self):
+        with self.assertMaxQueries(2):
+            response = self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertContains(response, "Choice 19 - 0votes")
+
+
+    def test_vote(self):
+        with self.assertMaxQueries(2):
+            self.client.post(reverse('polls:vote', args=(self.question.id,)), {"choice": self.choices[5].id})
+
+
 class QuestionIndexViewTests(TestCase):
     """Test Question index view"""
 
@@ -101,6 +219,56 @@ class QuestionIndexViewTests(TestCase):
         self.assertQuerysetEqual(response.context['latest_question_list'], [question2, question1])
 
 
+@override_settings(POLLS_PUBLISHED_PAGE_SIZE=2)
+class PublishedQuestionsViewTests(TestCase):
+    """Test the cursor-paginated published questions list."""
+
+    def setUp(self):
+        self.questions = []
+        for days in (-1, -2, -3):
+            question = create_question(f"Question {days}?", days)
+            create_choice(question, "Test choice")
+            self.questions.append(question)
+
+
+    def test_pages_follow_cursor(self):
+        """Following the next cursor walks all questions newest first."""
+        url = reverse('polls:published_questions')
+        response = self.client.get(url)
+        self.assertEqual(list(response.context['published_questions_list']), self.questions[:2])
+        cursor = response.context['page_obj'].next_cursor
+        self.assertContains(response, f'?cursor={cursor}')
+        response = self.client.get(url, {'cursor': cursor})
+        self.assertEqual(list(response.context['published_questions_list']), self.questions[2:])
+        self.assertFalse(response.context['page_obj'].has_next())
+
+
+    def test_invalid_cursor(self):
+        """A mangled cursor is a 404."""
+        response = self.client.get(reverse('polls:published_questions'), {'cursor': 'nonsense'})
+        self.assertEqual(response.status_code, 404)
+
+
+    @override_settings(POLLS_STREAM_PUBLISHED_QUESTIONS=True)
+    def test_streaming(self):
+        """Streaming mode renders every question in one streamed response."""
+        response = self.client.get(reverse('polls:published_questions'))
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        for question in self.questions:
+            self.assertIn(question.question_text, content)
+        self.assertLess(content.index("Question -1?"), content.index("Question -3?"))
+
+
+    @override_settings(POLLS_STREAM_PUBLISHED_QUESTIONS=True)
+    def test_streaming_under_asgi(self):
+        """Under ASGI the streamed chunks are produced off the event loop, where queries are allowed."""
+        status, _, body = asgi_get(reverse('polls:published_questions'))
+        self.assertEqual(status, 200)
+        for question in self.questions:
+            self.assertIn(question.question_text, body.decode())
+
+
 class QuestionDetailViewTests(TestCase):
     """Test question detail view."""
     def test_future_question(self):
@@ -184,7 +352,546 @@ class VoteViewTests(TestCase):
         self.assertEqual(response.status_code, 404)
         choice = Choice.objects.get(pk=1)
         self.assertEqual(choice.vote, 0)
+
+
+    def test_vote_with_invalid_choice(self):
+        """A choice that isn't a number redisplays the form with an error."""
+        question = create_question("Vote", -3)
+        create_choice(question, "Choice 1")
+        response = self.client.post(reverse('polls:vote', args=(question.id,)), {"choice": "abc"})
+        self.assertContains(response, "You didn&#x27;t select a choice.")
             
+
+@override_settings(POLLS_VOTE_SHARDS=4)
+class ShardedVoteTests(TestCase):
+    """Tests for votes spread over sharded counters."""
+    def test_vote_goes_to_a_shard(self):
+        """With sharding on, a vote increments a shard instead of Choice.vote."""
+        question = create_question("Sharded?", -1)
+        choice = create_choice(question, "Choice 1")
+        self.client.post(reverse('polls:vote', args=(question.id,)), {"choice": choice.id})
+        choice.refresh_from_db()
+        self.assertEqual(choice.vote, 0)
+        self.assertEqual(counters.total_votes(choice), 1)
+
+
+    def test_results_show_pending_shard_votes(self):
+        """The results page counts votes that haven't been rolled up yet."""
+        question = create_question("Sharded?", -1)
+        choice = create_choice(question, "Choice 1")
+        for _ in range(3):
+            counters.increment(choice.pk)
+        response = self.client.get(reverse('polls:results', args=(question.id,)))
+        self.assertContains(response, "Choice 1 - 3votes")
+
+
+    def test_rollup(self):
+        """Rollup moves shard counts into Choice.vote without losing votes."""
+        question = create_question("Sharded?", -1)
+        choice = create_choice(question, "Choice 1")
+        for _ in range(10):
+            counters.increment(choice.pk)
+        self.assertLessEqual(VoteShard.objects.filter(choice=choice).count(), 4)
+        self.assertEqual(counters.rollup(), 10)
+        choice.refresh_from_db()
+        self.assertEqual(choice.vote, 10)
+        self.assertEqual(counters.total_votes(choice), 10)
+        self.assertEqual(counters.rollup(), 0)
+
+
+@override_settings(POLLS_VOTE_BUFFER={'INTERVAL': 0, 'MAX_VOTES': 100})
+class BufferedVoteTests(TestCase):
+    """Tests for write-behind vote buffering."""
+    def test_vote_is_buffered_until_flush(self):
+        """Buffered votes reach Choice.vote on flush, grouped per choice."""
+        question = create_question("Buffered?", -1)
+        choice1 = create_choice(question, "Choice 1")
+        choice2 = create_choice(question, "Choice 2")
+        url = reverse('polls:vote', args=(question.id,))
+        for choice_id in (choice1.id, choice1.id, choice2.id):
+            self.client.post(url, {"choice": choice_id})
+        choice1.refresh_from_db()
+        self.assertEqual(choice1.vote, 0)
+        self.assertEqual(vote_buffer.flush(), 3)
+        self.assertEqual(list(Choice.objects.order_by('pk').values_list('vote', flat=True)), [2, 1])
+        self.assertEqual(vote_buffer.flush(), 0)
+
+
+    @override_settings(POLLS_VOTE_BUFFER={'INTERVAL': 0, 'MAX_VOTES': 2})
+    def test_flush_after_max_votes(self):
+        """The buffer flushes inline once MAX_VOTES votes are pending."""
+        question = create_question("Buffered?", -1)
+        choice = create_choice(question, "Choice 1")
+        vote_buffer.add(choice.pk)
+        vote_buffer.add(choice.pk)
+        choice.refresh_from_db()
+        self.assertEqual(choice.vote, 2)
+
+
+    @override_settings(POLLS_VOTE_BUFFER={'INTERVAL': 0, 'READ_YOUR_VOTES': True})
+    def test_results_read_your_votes(self):
+        """With READ_YOUR_VOTES the results page includes buffered votes."""
+        question = create_question("Buffered?", -1)
+        choice = create_choice(question, "Choice 1")
+        response = self.client.post(reverse('polls:vote', args=(question.id,)), {"choice": choice.id}, follow=True)
+        self.assertContains(response, "Choice 1 - 1vote")
+
+
+    def test_log_replay(self):
+        """Votes logged by a crashed buffer are replayed by the next one."""
+        with tempfile.TemporaryDirectory() as tmp:
+            log = os.path.join(tmp, 'votes.log')
+            crashed = vote_buffer.LocalVoteBuffer(log=log)
+            crashed.add(7)
+            crashed.add(7)
+            crashed.add(8)
+            crashed.drain()  # crash while flushing
+            crashed.add(8)
+            replayed = vote_buffer.LocalVoteBuffer(log=log)
+            self.assertEqual(replayed.drain(), {7: 2, 8: 2})
+            replayed.commit()
+            self.assertEqual(vote_buffer.LocalVoteBuffer(log=log).drain(), {})
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'results-tests'}},
+    POLLS_RESULTS_CACHE='default',
+)
+class ResultsCacheTests(TestCase):
+    """Tests for the versioned results cache."""
+    def setUp(self):
+        results_cache.get_cache().clear()
+        results_cache.stats.reset()
+        self.question = create_question("Cached?", -1)
+        self.choice = create_choice(self.question, "Choice 1")
+        self.url = reverse('polls:results', args=(self.question.id,))
+
+
+    def test_second_hit_is_cached(self):
+        """The second request is served from the cache."""
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.assertEqual(results_cache.stats.as_dict(), {'hits': 1, 'misses': 1})
+
+
+    def test_vote_invalidates(self):
+        """Voting bumps the version so the next request sees the vote."""
+        self.client.get(self.url)
+        response = self.client.post(reverse('polls:vote', args=(self.question.id,)), {"choice": self.choice.id}, follow=True)
+        self.assertContains(response, "Choice 1 - 1vote")
+        self.assertEqual(results_cache.stats.as_dict(), {'hits': 0, 'misses': 2})
+
+
+    def test_choice_edit_invalidates(self):
+        """Editing or adding a choice shows up on the next request."""
+        self.client.get(self.url)
+        self.choice.choice_text = "Renamed"
+        self.choice.save()
+        create_choice(self.question, "Choice 2")
+        response = self.client.get(self.url)
+        self.assertContains(response, "Renamed - 0votes")
+        self.assertContains(response, "Choice 2 - 0votes")
+
+
+class AsyncViewTests(TestCase):
+    """Tests for the native async views."""
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        self.question = create_question("Async?", -1)
+        self.choice = create_choice(self.question, "Choice 1")
+
+
+    async def test_detail(self):
+        """The async detail view lists the choices."""
+        response = await async_views.DetailView.as_view()(self.factory.get('/'), pk=self.question.pk)
+        self.assertContains(response, "Choice 1")
+
+
+    async def test_future_question_is_404(self):
+        """Unpublished questions are a 404 as with the sync views."""
+        future_question = await Question.objects.acreate(question_text="Later?", pub_date=timezone.now() + datetime.timedelta(days=1))
+        with self.assertRaises(Http404):
+            await async_views.ResultsView.as_view()(self.factory.get('/'), pk=future_question.pk)
+
+
+    async def test_vote_and_results(self):
+        """An async vote is counted and shown by the async results view."""
+        request = self.factory.post('/', f"choice={self.choice.pk}", content_type='application/x-www-form-urlencoded')
+        response = await async_views.vote(request, self.question.pk)
+        self.assertEqual(response.status_code, 302)
+        response = await async_views.ResultsView.as_view()(self.factory.get('/'), pk=self.question.pk)
+        self.assertContains(response, "Choice 1 - 1vote")
+
+
+    async def test_vote_without_choice(self):
+        """Voting without a choice redisplays the form."""
+        request = self.factory.post('/', '', content_type='application/x-www-form-urlencoded')
+        response = await async_views.vote(request, self.question.pk)
+        self.assertContains(response, "Choice 1")
+        self.assertContains(response, "You didn&#x27;t select a choice.")
+
+
+@override_settings(POLLS_LIVE_INTERVAL=60)
+class LiveResultsTests(TestCase):
+    """Tests for the live results stream."""
+    def setUp(self):
+        self.question = create_question("Live?", -1)
+        self.choice = create_choice(self.question, "Choice 1")
+
+
+    async def test_changes_are_coalesced(self):
+        """Many notifications between two publishes produce one message."""
+        broadcaster = live.Broadcaster()
+        subscriber = broadcaster.subscribe(self.question.pk)
+        self.addCleanup(broadcaster._task.cancel)
+        for _ in range(3):
+            broadcaster.notify(self.question.pk)
+        await broadcaster.publish()
+        self.assertEqual(subscriber.queue.qsize(), 1)
+        await broadcaster.publish()
+        self.assertEqual(subscriber.queue.qsize(), 1)
+
+
+    async def test_slow_consumer_keeps_newest_snapshot(self):
+        """A full queue drops its stale snapshot for the new one."""
+        broadcaster = live.Broadcaster()
+        subscriber = broadcaster.subscribe(self.question.pk)
+        self.addCleanup(broadcaster._task.cancel)
+        broadcaster.notify(self.question.pk)
+        await broadcaster.publish()
+        await Choice.objects.filter(pk=self.choice.pk).aupdate(vote=5)
+        broadcaster.notify(self.question.pk)
+        await broadcaster.publish()
+        self.assertEqual(subscriber.dropped, 1)
+        self.assertIn(b'"total_votes": 5', subscriber.queue.get_nowait())
+
+
+    def test_wsgi_fallback(self):
+        """Without ASGI the stream URL returns one snapshot."""
+        response = self.client.get(reverse('polls:results_stream', args=(self.question.id,)))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        data = response.content.decode().split('data: ')[1]
+        self.assertEqual(json.loads(data)['choices'][0]['choice_text'], "Choice 1")
+
+
+    async def test_asgi_stream(self):
+        """The ASGI endpoint sends a snapshot, then pushes the vote."""
+        bodies = []
+        sent = asyncio.Event()
+        disconnect = asyncio.Event()
+
+        async def receive():
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.body':
+                bodies.append(message['body'])
+                sent.set()
+
+        async def not_found(scope, receive, send):
+            raise AssertionError("request should not reach Django")
+
+        scope = {'type': 'http', 'method': 'GET', 'path': reverse('polls:results_stream', args=(self.question.id,))}
+        stream = asyncio.ensure_future(live.LiveResultsRouter(not_found)(scope, receive, send))
+        await asyncio.wait_for(sent.wait(), 5)
+        sent.clear()
+        await async_views.vote(
+            AsyncRequestFactory().post('/', f"choice={self.choice.pk}", content_type='application/x-www-form-urlencoded'),
+            self.question.pk,
+        )
+        await live.broadcaster.publish()
+        await asyncio.wait_for(sent.wait(), 5)
+        disconnect.set()
+        await asyncio.wait_for(stream, 5)
+        self.assertIn(b'"total_votes": 0', bodies[0])
+        self.assertIn(b'"total_votes": 1', bodies[1])
+        self.assertEqual(live.broadcaster.subscribers, {})
+        live.broadcaster._task.cancel()
+
+
+@modify_settings(MIDDLEWARE={'prepend': 'polls.middleware.PerformanceMiddleware'})
+class PerformanceMiddlewareTests(TestCase):
+    """Tests for the request metrics middleware and endpoint."""
+    def setUp(self):
+        metrics.registry.reset()
+        self.question = create_question("Measured?", -1)
+        create_choice(self.question, "Choice 1")
+
+
+    def test_metrics_per_url_name(self):
+        """Requests are recorded under their URL name with their query count."""
+        self.client.get(reverse('polls:index'))
+        self.client.get(reverse('polls:detail', args=(self.question.id,)))
+        self.client.get(reverse('polls:detail', args=(self.question.id,)))
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        response = self.client.get(reverse('polls:metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4')
+        self.assertContains(response, '# TYPE polls_request_duration_seconds histogram')
+        self.assertContains(response, 'polls_request_duration_seconds_count{view="polls:index"} 1')
+        self.assertContains(response, 'polls_request_duration_seconds_count{view="polls:detail"} 2')
+        self.assertContains(response, 'polls_db_queries_sum{view="polls:detail"} 4')
+        self.assertContains(response, 'polls_response_size_bytes_bucket{view="polls:index",le="+Inf"} 1')
+
+
+    @override_settings(POLLS_METRICS_TOKEN='s3cret')
+    def test_metrics_need_staff_or_token(self):
+        """Anonymous clients and non-staff users get a 403; a scraper with the token gets the metrics."""
+        url = reverse('polls:metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+        self.client.force_login(User.objects.create_user("voter"))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        with self.settings(POLLS_METRICS_TOKEN=None):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer None').status_code, 403)
+
+
+    def test_template_render_time(self):
+        """Template responses record a render time."""
+        self.client.get(reverse('polls:index'))
+        histogram = metrics.registry.histograms[('polls_template_render_seconds', 'polls:index')]
+        self.assertGreater(histogram.sum, 0)
+
+
+    @override_settings(POLLS_METRICS_SAMPLE_RATE=0)
+    def test_sampling(self):
+        """With a sample rate of 0 nothing is recorded."""
+        self.client.get(reverse('polls:index'))
+        self.assertEqual(metrics.registry.histograms, {})
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'page-tests'}},
+    POLLS_PAGE_CACHE='default',
+)
+class PageCacheTests(TestCase):
+    """Tests for the cached listing pages."""
+    def setUp(self):
+        page_cache.get_cache().clear()
+        self.question = create_question("Cached page?", -1)
+        create_choice(self.question, "Choice 1")
+
+
+    def test_second_hit_runs_no_queries(self):
+        """A cached index page is served without touching the database."""
+        self.client.get(reverse('polls:index'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "Cached page?")
+
+
+    def test_new_question_invalidates(self):
+        """Adding a question with a choice shows up on the next request."""
+        self.client.get(reverse('polls:index'))
+        create_choice(create_question("Brand new?", -1), "Choice")
+        self.assertContains(self.client.get(reverse('polls:index')), "Brand new?")
+
+
+    def test_publication_invalidates(self):
+        """A scheduled question going live drops the cached pages."""
+        future_question = create_question("Soon?", 1)
+        create_choice(future_question, "Choice")
+        self.assertNotContains(self.client.get(reverse('polls:index')), "Soon?")
+        scheduler.publish_due(timezone.now() + datetime.timedelta(days=2))
+        self.assertContains(self.client.get(reverse('polls:index')), "Soon?")
+
+
+    def test_conditional_get(self):
+        """A matching If-None-Match gets a 304, with or without the cache."""
+        response = self.client.get(reverse('polls:index'))
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        response = self.client.get(reverse('polls:index'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.settings(POLLS_PAGE_CACHE=None):
+            response = self.client.get(reverse('polls:index'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class VoteGuardTests(TestCase):
+    """Tests for vote deduplication and rate limiting."""
+    def setUp(self):
+        self.question = create_question("Guarded?", -1)
+        self.choice = create_choice(self.question, "Choice 1")
+        self.url = reverse('polls:vote', args=(self.question.id,))
+
+
+    def test_bloom_filter(self):
+        """Added items are always found; unseen ones rarely are."""
+        bloom = dedup.BloomFilter(1000, 0.01)
+        for n in range(1000):
+            bloom.add(f"voter{n}")
+        self.assertTrue(all(f"voter{n}" in bloom for n in range(1000)))
+        false_positives = sum(f"other{n}" in bloom for n in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+    def test_rotation_forgets_old_generation(self):
+        """Items survive one rotation and are dropped by the next."""
+        bloom = dedup.RotatingBloomFilter(2, 0.01)
+        bloom.add("a")
+        bloom.add("b")
+        bloom.add("c")
+        self.assertIn("a", bloom)
+        bloom.add("d")
+        bloom.add("e")
+        self.assertNotIn("a", bloom)
+
+
+    @override_settings(POLLS_VOTE_DEDUP={'KEY': 'cookie'})
+    def test_one_vote_per_voter(self):
+        """A second vote from the same cookie isn't counted."""
+        response = self.client.post(self.url, {"choice": self.choice.id})
+        self.assertIn(dedup.VOTER_COOKIE, response.cookies)
+        with self.assertNumQueries(0):
+            response = self.client.post(self.url, {"choice": self.choice.id})
+        self.assertRedirects(response, reverse('polls:results', args=(self.question.id,)))
+        self.client.cookies.clear()
+        self.client.post(self.url, {"choice": self.choice.id})
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.vote, 2)
+
+
+    @override_settings(POLLS_VOTE_RATE_LIMIT={'RATE': 1, 'BURST': 2})
+    def test_rate_limit(self):
+        """Votes beyond the burst get a 429 without touching the database."""
+        for _ in range(2):
+            self.client.post(self.url, {"choice": self.choice.id})
+        with self.assertNumQueries(0):
+            response = self.client.post(self.url, {"choice": self.choice.id})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+
+
+    def test_token_bucket_refills(self):
+        """Tokens come back at RATE per second and the client map stays bounded."""
+        limiter = ratelimit.TokenBucketLimiter(rate=2, burst=1, max_clients=2)
+        self.assertEqual(limiter.allow("a", now=0), 0)
+        self.assertEqual(limiter.allow("a", now=0.1), 0.4)
+        self.assertEqual(limiter.allow("a", now=0.5), 0)
+        limiter.allow("b", now=1)
+        limiter.allow("c", now=1)
+        self.assertEqual(list(limiter.buckets), ["b", "c"])
+
+
+@override_settings(POLLS_VOTE_EVENTS={'BATCH_SIZE': 2, 'INTERVAL': 0, 'LAG': 0})
+class VoteEventTests(TestCase):
+    """Tests for the vote event log and its materialized buckets."""
+    def setUp(self):
+        self.question = create_question("Logged?", -1)
+        self.choice1 = create_choice(self.question, "Choice 1")
+        self.choice2 = create_choice(self.question, "Choice 2")
+        self.url = reverse('polls:vote', args=(self.question.id,))
+
+
+    def vote(self, *choices):
+        for choice in choices:
+            self.client.post(self.url, {"choice": choice.id})
+        events.flush()
+
+
+    def tallies(self):
+        return dict(
+            VoteBucket.objects.filter(question=self.question).values('choice_id')
+            .annotate(votes=Sum('votes')).values_list('choice_id', 'votes')
+        )
+
+
+    def test_events_written_in_batches(self):
+        """Events are queued and written once BATCH_SIZE is reached."""
+        self.client.post(self.url, {"choice": self.choice1.id})
+        self.assertEqual(VoteEvent.objects.count(), 0)
+        self.client.post(self.url, {"choice": self.choice2.id})
+        self.assertEqual(VoteEvent.objects.count(), 2)
+        self.assertEqual(len(VoteEvent.objects.first().voter_hash), 16)
+
+
+    def test_failed_write_keeps_events(self):
+        """Events of a failed bulk INSERT go back to the front of the queue, until ATTEMPTS writes failed."""
+        self.client.post(self.url, {"choice": self.choice1.id})
+        # Too large for an SQLite integer: the write fails however often it is tried.
+        broken = VoteEvent(question_id=2 ** 64, choice_id=self.choice2.pk, created=timezone.now())
+        events._queue.add(broken)
+        with self.assertRaises(OverflowError):
+            events.flush()
+        self.assertEqual(len(events._queue.events), 2)
+        self.assertIs(events._queue.events[1], broken)
+        with self.settings(POLLS_VOTE_EVENTS={'INTERVAL': 0, 'ATTEMPTS': 2}), \
+                self.assertLogs('polls.events', 'ERROR'), self.assertRaises(OverflowError):
+            events.flush()
+        self.assertEqual(events._queue.drain(), [])
+        self.vote(self.choice1, self.choice2)
+        self.assertEqual(VoteEvent.objects.count(), 2)
+
+
+    def test_rejected_events_are_dropped(self):
+        """An event the database rejects is dropped without holding back the rest of its batch."""
+        self.client.post(self.url, {"choice": self.choice1.id})
+        events._queue.add(VoteEvent(question_id=self.question.pk, choice_id=self.choice2.pk,
+                                    created=timezone.now(), voter_hash=None))
+        with self.assertLogs('polls.events', 'ERROR') as logs:
+            self.assertEqual(events.flush(), 1)
+        self.assertIn(f'choice {self.choice2.pk}', logs.output[0])
+        self.assertEqual(list(VoteEvent.objects.values_list('choice_id', flat=True)), [self.choice1.pk])
+        self.assertEqual(events._queue.drain(), [])
+
+
+    def test_materialize_is_incremental(self):
+        """Each run only folds events past the high-water mark."""
+        self.vote(self.choice1, self.choice1, self.choice2)
+        self.assertEqual(events.materialize(batch_size=2), 3)
+        self.vote(self.choice2)
+        self.assertEqual(events.materialize(), 1)
+        self.assertEqual(events.materialize(), 0)
+        self.assertEqual(self.tallies(), {self.choice1.pk: 2, self.choice2.pk: 2})
+
+
+    def test_materialize_waits_for_missing_ids(self):
+        """Events after a missing id wait for it for LAG seconds, however old they are."""
+        self.vote(self.choice1)
+        events.materialize()
+        # Write a batch with an old timestamp and the id of an event still being written left out.
+        created = timezone.now() - datetime.timedelta(minutes=5)
+        late = VoteEvent.objects.create(question=self.question, choice=self.choice1, created=created)
+        VoteEvent.objects.create(question=self.question, choice=self.choice2, created=created)
+        late_values = {field.attname: getattr(late, field.attname) for field in VoteEvent._meta.fields}
+        late.delete()
+        self.assertEqual(events.materialize(lag=60), 0)
+        VoteEvent.objects.create(**late_values)
+        self.assertEqual(events.materialize(lag=60), 2)
+        self.assertEqual(self.tallies(), {self.choice1.pk: 2, self.choice2.pk: 1})
+        self.assertIsNone(MaterializerState.objects.get().gap_seen_at)
+
+
+    def test_materialize_skips_gaps_after_lag(self):
+        """An id that stays missing for LAG seconds is skipped."""
+        self.vote(self.choice1, self.choice2)
+        VoteEvent.objects.order_by('pk').first().delete()
+        self.assertEqual(events.materialize(lag=60), 0)
+        MaterializerState.objects.update(gap_seen_at=timezone.now() - datetime.timedelta(seconds=61))
+        with self.assertLogs('polls.events', 'WARNING'):
+            self.assertEqual(events.materialize(lag=60), 1)
+        self.assertEqual(self.tallies(), {self.choice2.pk: 1})
+
+
+    def test_rebuild(self):
+        """Rebuilding from the log gives the same buckets."""
+        self.vote(self.choice1, self.choice2, self.choice2)
+        events.materialize()
+        VoteBucket.objects.update(votes=0)
+        self.assertEqual(events.rebuild(batch_size=1), 3)
+        self.assertEqual(self.tallies(), {self.choice1.pk: 1, self.choice2.pk: 2})
+
+
+    def test_results_timeline(self):
+        """The results page shows votes per minute from the buckets."""
+        self.vote(self.choice1, self.choice2)
+        events.materialize()
+        response = self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertEqual([votes for _, votes in response.context['timeline']], [2])
+        self.assertContains(response, "Votes over time")
+
     
 def create_choice_formset(question=None, data = {
     'form-TOTAL_FORMS': '1',
@@ -258,4 +965,846 @@ class AddQuestionViewTests(TestCase):
         choice[0].save() 
 
         response = self.client.get(reverse('polls:index'))
-        self.assertQuerysetEqual(response.context['latest_question_list'], [question])
\ No newline at end of file
+        self.assertQuerysetEqual(response.context['latest_question_list'], [question])
+
+
+    def test_add_question_view(self):
+        """Posting the form creates the question and its choices in a few queries."""
+        data = {
+            'question_text': "Who owns Tesla?",
+            'pub_date': timezone.now() - datetime.timedelta(days=1),
+            'form-TOTAL_FORMS': '3',
+            'form-INITIAL_FORMS': '0',
+            'form-0-choice_text': 'A random dude',
+            'form-1-choice_text': 'Nobody',
+            'form-2-choice_text': '',
+        }
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.post(reverse('polls:add_question'), data)
+        self.assertEqual(response.status_code, 302)
+        question = Question.objects.get(question_text="Who owns Tesla?")
+        self.assertTrue(question.has_choices)
+        self.assertEqual(sorted(question.choice_set.values_list('choice_text', flat=True)), ['A random dude', 'Nobody'])
+        # Unique check, savepoint, question insert, choices insert, search terms insert, release.
+        self.assertLessEqual(len(queries), 6)
+
+
+class ImportPollsCommandTests(TestCase):
+    """Tests for manage.py import_polls."""
+    def import_file(self, suffix, content, *args):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as source:
+            source.write(content)
+        self.addCleanup(os.remove, source.name)
+        out = StringIO()
+        call_command('import_polls', source.name, *args, stdout=out)
+        return out.getvalue()
+
+
+    def test_import_csv(self):
+        """Consecutive CSV rows with the same question become one question."""
+        output = self.import_file('.csv', (
+            "question_text,pub_date,choice_text\n"
+            "Best colour?,2022-10-01 10:00,Red\n"
+            "Best colour?,2022-10-01 10:00,Blue\n"
+            "Best pet?,,Cat\n"
+        ))
+        self.assertIn("Imported 2 question(s) with 3 choice(s)", output)
+        question = Question.objects.get(question_text="Best colour?")
+        self.assertTrue(question.has_choices)
+        self.assertEqual(question.choice_set.count(), 2)
+
+
+    def test_import_jsonl_skips_duplicates(self):
+        """Existing questions are skipped without aborting the rest of the batch."""
+        create_question("Old?", -1)
+        output = self.import_file('.jsonl', (
+            '{"question_text": "Old?", "choices": ["A"]}\n'
+            '{"question_text": "New?", "choices": ["A", "B"]}\n'
+            '{"question_text": "Newer?", "choices": []}\n'
+        ), '--batch-size', '2')
+        self.assertIn("Imported 2 question(s) with 2 choice(s), skipped 1 duplicate(s)", output)
+        self.assertEqual(Question.objects.get(question_text="Old?").choice_set.count(), 0)
+        self.assertFalse(Question.objects.get(question_text="Newer?").has_choices)
+
+
+    def test_import_races_other_import(self):
+        """A question another import adds after the check is skipped, not given this file's choices."""
+        create_question("Old?", -1)
+
+        class RacingCommand(import_polls.Command):
+            raced = False
+
+            def existing_texts(self, texts):
+                # The first check runs before the other import commits "Old?".
+                if not self.raced:
+                    self.raced = True
+                    return set()
+                return super().existing_texts(texts)
+
+        command = RacingCommand(stdout=StringIO())
+        self.assertEqual(command.import_batch([("Old?", None, ["A"]), ("New?", None, ["B", "C"])]), (1, 2))
+        self.assertTrue(command.raced)
+        self.assertEqual(Question.objects.get(question_text="Old?").choice_set.count(), 0)
+        self.assertEqual(sorted(Question.objects.get(question_text="New?").choice_set.values_list('choice_text', flat=True)),
+                         ["B", "C"])
+
+
+class ExportResultsTests(TestCase):
+    """Tests for manage.py export_results and the export endpoint."""
+    def setUp(self):
+        old = create_question("Old?", -30)
+        create_choice(old, "A")
+        self.new = create_question("New?", -1)
+        self.yes = create_choice(self.new, "Yes")
+        create_choice(self.new, "No")
+        Choice.objects.filter(pk=self.yes.pk).update(vote=3)
+
+
+    def test_export_csv(self):
+        """One CSV row per choice, ordered by question, with its vote count."""
+        out = StringIO()
+        call_command('export_results', stdout=out)
+        rows = out.getvalue().splitlines()
+        self.assertEqual(rows[0], "question_id,question_text,pub_date,choice_id,choice_text,votes")
+        self.assertEqual(len(rows), 4)
+        self.assertTrue(rows[2].endswith(f"{self.yes.pk},Yes,3"))
+
+
+    @override_settings(POLLS_VOTE_SHARDS=4)
+    def test_export_jsonl_since(self):
+        """--since skips older questions, and pending shards are counted."""
+        counters.increment(self.yes.pk)
+        out = StringIO()
+        since = (timezone.now() - datetime.timedelta(days=7)).date().isoformat()
+        call_command('export_results', '--format', 'jsonl', '--since', since, stdout=out)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([line['question_text'] for line in lines], ["New?"])
+        self.assertEqual([(c['choice_text'], c['votes']) for c in lines[0]['choices']], [("Yes", 4), ("No", 0)])
+
+
+    def test_export_counts_leftover_shards(self):
+        """Shards not yet rolled up are counted after POLLS_VOTE_SHARDS is turned off."""
+        counters.increment(self.yes.pk, shards=4)
+        rows = list(export.export_rows())
+        self.assertEqual([row[-1] for row in rows if row[3] == self.yes.pk], [4])
+
+
+    def test_export_gzip_file(self):
+        """--gzip writes a gzip file that decompresses to the plain export."""
+        with tempfile.NamedTemporaryFile(suffix='.csv.gz', delete=False) as target:
+            pass
+        self.addCleanup(os.remove, target.name)
+        call_command('export_results', '--gzip', '--output', target.name, stdout=StringIO())
+        plain = StringIO()
+        call_command('export_results', stdout=plain)
+        with gzip.open(target.name, 'rt', newline='') as exported:
+            self.assertEqual(exported.read(), plain.getvalue())
+
+
+    def test_export_endpoint_requires_permission(self):
+        """Anonymous users and users without view permission are refused."""
+        self.assertEqual(self.client.get(reverse('polls:export')).status_code, 403)
+        self.client.force_login(User.objects.create_user('analyst'))
+        self.assertEqual(self.client.get(reverse('polls:export')).status_code, 403)
+
+
+    def test_export_endpoint_streams(self):
+        """The endpoint streams the export, gzipped when the client accepts it."""
+        self.client.force_login(User.objects.create_superuser('admin'))
+        response = self.client.get(reverse('polls:export'), {'format': 'jsonl'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 2)
+        response = self.client.get(reverse('polls:export'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b"Yes,3", gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual(self.client.get(reverse('polls:export'), {'since': 'yesterday'}).status_code, 400)
+
+
+    def test_export_endpoint_under_asgi(self):
+        """Under ASGI the export is read from the database off the event loop."""
+        self.client.force_login(User.objects.create_superuser('admin'))
+        cookie = f"{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        status, headers, body = asgi_get(reverse('polls:export'), headers=[('cookie', cookie), ('accept-encoding', 'gzip')])
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(len(gzip.decompress(body).splitlines()), 4)
+
+
+class QuestionAdminTests(TestCase):
+    """Tests for the indexed search, estimated count and inline of the Question admin."""
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+
+
+    def test_search_uses_index(self):
+        """Substring search finds questions through the FTS table, which follows updates and deletes."""
+        question = create_question("What's your favourite Colour?", -1)
+        create_question("Best pet?", -1)
+        self.assertTrue(search.has_fts())
+        found = search.filter_question_text(Question.objects.all(), "colour")
+        self.assertIn(search.FTS_TABLE, str(found.query))
+        self.assertQuerysetEqual(found, [question])
+        Question.objects.filter(pk=question.pk).update(question_text="Favourite shape?")
+        self.assertFalse(search.filter_question_text(Question.objects.all(), "colour").exists())
+        question.delete()
+        self.assertFalse(search.filter_question_text(Question.objects.all(), "shape").exists())
+        self.assertEqual(search.filter_question_text(Question.objects.all(), "pe").count(), 1)
+
+
+    def test_install_repairs_missing_triggers(self):
+        """install() recreates dropped triggers and rebuilds the index."""
+        with connections['default'].cursor() as cursor:
+            cursor.execute(f"DROP TRIGGER {search.FTS_TABLE}_ai")
+        question = create_question("Missed by the index?", -1)
+        search.install()
+        self.assertQuerysetEqual(search.filter_question_text(Question.objects.all(), "missed"), [question])
+
+
+    def test_changelist(self):
+        """The changelist searches word by word and sorts on the recently published annotation."""
+        create_question("Old colour question?", -5)
+        create_question("New colour question?", 0)
+        url = reverse('admin:polls_question_changelist')
+        response = self.client.get(url, {'q': 'colour new'})
+        self.assertEqual([q.question_text for q in response.context['cl'].result_list], ["New colour question?"])
+        response = self.client.get(url, {'o': '-3'})
+        self.assertEqual([q.published_recently for q in response.context['cl'].result_list], [True, False])
+
+
+    def test_estimated_count(self):
+        """Unfiltered querysets use the table statistics once they are large enough."""
+        for day in range(3):
+            create_question(f"Question {day}?", -day)
+        with connections['default'].cursor() as cursor:
+            cursor.execute("ANALYZE")
+            cursor.execute("UPDATE sqlite_stat1 SET stat = '50000 1' WHERE tbl = 'polls_question'")
+        self.assertEqual(EstimatedCountPaginator(Question.objects.order_by('pk'), 10).count, 50000)
+        self.assertEqual(EstimatedCountPaginator(Question.objects.filter(pub_date__lte=timezone.now()).order_by('pk'), 10).count, 3)
+
+
+    def test_inline_query_count(self):
+        """Opening a question does not cost a query per choice."""
+        question = create_question("Many choices?", -1)
+        create_choice(question, "First")
+        url = reverse('admin:polls_question_change', args=(question.pk,))
+        self.client.get(url)  # Warm the content type cache.
+        with CaptureQueriesContext(connections['default']) as few:
+            self.client.get(url)
+        for number in range(20):
+            create_choice(question, f"Choice {number}")
+        with CaptureQueriesContext(connections['default']) as many:
+            response = self.client.get(url)
+        self.assertContains(response, "Choice 19")
+        self.assertEqual(len(many), len(few))
+
+
+class SearchTests(TestCase):
+    """Tests for the inverted index behind /polls/search/."""
+    def setUp(self):
+        # The index is updated when the transaction commits.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.colour = create_question("What is your favourite colour?", -1)
+            create_choice(self.colour, "Red")
+            create_choice(self.colour, "Blue")
+            self.paint = create_question("Which paint should we buy?", -1)
+            create_choice(self.paint, "Colourful")
+
+
+    def test_tokenize(self):
+        """Words are lowercased and stripped of accents; stop words are dropped."""
+        self.assertEqual(search.tokenize("What is the Café's name?"), ['cafe', 's', 'name'])
+
+
+    def test_ranking_and_prefixes(self):
+        """Question text outranks choices, and query words match word prefixes."""
+        self.assertEqual(search.search_questions("colour"), [self.colour, self.paint])
+        self.assertEqual(search.search_questions("favou"), [self.colour])
+        self.assertEqual(search.search_questions("favourit"), [self.colour])
+        self.assertEqual(search.search_questions("colourf"), [self.paint])
+        self.assertEqual(search.search_questions("favourable"), [])
+        self.assertEqual(search.search_questions("colour paint"), [self.paint])
+        self.assertEqual(search.search_questions("what is"), [])
+
+
+    def test_rarest_word_drives(self):
+        """Several words are looked up rarest first, and a word nothing has stops the search."""
+        self.assertEqual(search.postings_count("colour"), 2)
+        self.assertEqual(search.postings_count("colour", after=self.colour.pk), 1)
+        self.assertEqual(search.rarity(["colour", "blue"]), {"colour": (2, 0), "blue": (1, 0)})
+        self.assertEqual(search.search_questions("colour blue"), [self.colour])
+        with self.assertNumQueries(3):
+            self.assertEqual(search.search_questions("colour zeppelin"), [])
+
+
+    def test_unpublished_questions_are_hidden(self):
+        future = create_question("Future colour?", 5)
+        create_choice(future, "Green")
+        self.assertNotIn(future, search.search_questions("colour"))
+
+
+    def test_incremental_updates(self):
+        """Edits to questions and choices are reflected; deleting a question drops its entries."""
+        self.colour.refresh_from_db()
+        self.colour.question_text = "What is your favourite shape?"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.colour.save()
+        self.assertEqual(search.search_questions("colour"), [self.paint])
+        self.assertEqual(search.search_questions("shape"), [self.colour])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.paint.choice_set.get().delete()
+            create_choice(self.paint, "Matte")
+        self.assertEqual(search.search_questions("matte"), [self.paint])
+        self.paint.delete()
+        self.assertFalse(SearchTerm.objects.filter(question_id=self.paint.pk).exists())
+
+
+    def test_reindexed_once_per_transaction(self):
+        """Adding many choices in one transaction reindexes their question once, on commit."""
+        with self.captureOnCommitCallbacks() as callbacks:
+            for n in range(20):
+                create_choice(self.paint, f"Shade {n}")
+        self.assertEqual(search.search_questions("shade"), [])
+        with CaptureQueriesContext(connections['default']) as queries:
+            for callback in callbacks:
+                callback()
+        self.assertEqual(sum('DELETE FROM "polls_searchterm"' in query['sql'] for query in queries), 1)
+        self.assertEqual(search.search_questions("shade"), [self.paint])
+
+
+    def test_prefixes_are_capped(self):
+        """Terms stop at MAX_PREFIX_LENGTH characters."""
+        terms = search.question_terms("Favourite?", [])
+        self.assertEqual(sorted(terms), ['fa', 'fav', 'favo', 'favou', 'favour'])
+
+
+    def test_rebuild_command(self):
+        SearchTerm.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn("Indexed 2 question(s)", out.getvalue())
+        self.assertEqual(search.search_questions("blue"), [self.colour])
+
+
+    def test_search_view(self):
+        """The view answers in a fixed number of queries."""
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('polls:search'), {'q': 'Colour'})
+        self.assertEqual(list(response.context['questions']), [self.colour, self.paint])
+        self.assertContains(response, reverse('polls:detail', args=(self.paint.pk,)))
+        response = self.client.get(reverse('polls:search'), {'q': 'nothing'})
+        self.assertContains(response, "No polls match")
+
+
+@override_settings(DATABASE_ROUTERS=['polls.routers.ReplicaRouter'], POLLS_READ_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    """Read views use the replica, writes and recent writers the primary.
+
+    A second SQLite file stands in for the replica; it only gets the rows a
+    test copies into it, which makes replication lag easy to fake.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added after TestCase set up its databases, so the replica is neither
+        # wrapped in the test transaction nor blocked for this test class.
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = {
+            **connections['default'].settings_dict,
+            'NAME': os.path.join(cls.replica_dir.name, 'replica.sqlite3'),
+        }
+        call_command('migrate', database='replica', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.replica_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        Question.objects.using('replica').all().delete()
+        self.question = create_question("Replicated?", -1)
+        self.choice = create_choice(self.question, "Yes")
+        # The replica has caught up with the question but not with any votes.
+        Question.objects.using('replica').bulk_create([Question.objects.get(pk=self.question.pk)])
+        Choice.objects.using('replica').bulk_create([Choice.objects.get(pk=self.choice.pk)])
+
+
+    def test_router(self):
+        """Only polls reads inside a replica view are routed to the replica."""
+        self.assertEqual(Question.objects.all().db, 'default')
+        token = routers.current_replica.set('replica')
+        try:
+            self.assertEqual(Question.objects.all().db, 'replica')
+            self.assertEqual(User.objects.all().db, 'default')
+            self.assertEqual(routers.ReplicaRouter().db_for_write(Question), 'default')
+        finally:
+            routers.current_replica.reset(token)
+
+
+    def test_read_views_use_replica(self):
+        """Pages render from the replica, which doesn't know about the latest vote yet."""
+        Choice.objects.filter(pk=self.choice.pk).update(vote=5)
+        response = self.client.get(reverse('polls:results', args=(self.question.pk,)))
+        self.assertEqual(response.context['choices'][0]['total_votes'], 0)
+        for name in ('polls:index', 'polls:published_questions'):
+            self.assertContains(self.client.get(reverse(name)), "Replicated?")
+        Question.objects.using('replica').all().delete()
+        self.assertEqual(self.client.get(reverse('polls:detail', args=(self.question.pk,))).status_code, 404)
+
+
+    @override_settings(POLLS_STREAM_PUBLISHED_QUESTIONS=True)
+    def test_streamed_list_uses_replica(self):
+        """The streamed list is read from the replica, though it is rendered after the view returned."""
+        create_choice(create_question("Primary only?", -1), "No")
+        response = self.client.get(reverse('polls:published_questions'))
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn("Replicated?", content)
+        self.assertNotIn("Primary only?", content)
+        self.assertIsNone(routers.current_replica.get())
+
+
+    def test_vote_sticks_to_primary(self):
+        """After voting, the client reads its own vote from the primary until the window ends."""
+        response = self.client.post(reverse('polls:vote', args=(self.question.pk,)), {'choice': self.choice.pk})
+        self.assertIn(routers.STICKY_COOKIE, response.cookies)
+        self.assertEqual(Choice.objects.using('replica').get(pk=self.choice.pk).vote, 0)
+        response = self.client.get(reverse('polls:results', args=(self.question.pk,)))
+        self.assertEqual(response.context['choices'][0]['total_votes'], 1)
+        self.client.cookies[routers.STICKY_COOKIE] = '0'
+        response = self.client.get(reverse('polls:results', args=(self.question.pk,)))
+        self.assertEqual(response.context['choices'][0]['total_votes'], 0)
+
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'replica-tests'}},
+        POLLS_RESULTS_CACHE='default',
+        POLLS_PAGE_CACHE='default',
+    )
+    def test_cache_misses_read_the_primary(self):
+        """Another client reading the lagging replica first caches the voter's vote, not stale results."""
+        results_cache.get_cache().clear()
+        url = reverse('polls:results', args=(self.question.pk,))
+        response = self.client.post(reverse('polls:vote', args=(self.question.pk,)), {'choice': self.choice.pk})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        other = self.client_class()
+        self.assertContains(other.get(url), "Yes - 1vote")
+        self.assertContains(self.client.get(url), "Yes - 1vote")
+        create_choice(create_question("Primary only?", -1), "No")
+        detail_url = reverse('polls:detail', args=(self.question.pk,))
+        self.assertContains(other.get(reverse('polls:index')), "Primary only?")
+        self.assertContains(other.get(detail_url), 'value="%d"' % self.choice.pk)
+        # Cached now: only the question is read, from the replica.
+        with CaptureQueriesContext(connections['default']) as queries:
+            for page in (url, detail_url, reverse('polls:index')):
+                self.assertEqual(other.get(page).status_code, 200)
+        self.assertEqual(len(queries), 0)
+
+
+class JsonApiTests(TestCase):
+    """Tests for the JSON results, vote and batch endpoints."""
+    def setUp(self):
+        self.question = create_question("API?", -1)
+        self.choice = create_choice(self.question, "Yes")
+        create_choice(self.question, "No")
+        self.results_url = reverse('polls:api_results', args=(self.question.pk,))
+        self.vote_url = reverse('polls:api_vote', args=(self.question.pk,))
+
+
+    def test_results(self):
+        """Results come as JSON with an ETag the client can revalidate with."""
+        response = self.client.get(self.results_url)
+        self.assertEqual(response.json(), {
+            'question': self.question.pk,
+            'question_text': "API?",
+            'choices': [
+                {'id': self.choice.pk, 'choice_text': "Yes", 'total_votes': 0},
+                {'id': self.choice.pk + 1, 'choice_text': "No", 'total_votes': 0},
+            ],
+        })
+        response = self.client.get(self.results_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        Choice.objects.filter(pk=self.choice.pk).update(vote=1)
+        self.assertEqual(self.client.get(self.results_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        unpublished = create_question("Later?", 5)
+        create_choice(unpublished, "Maybe")
+        self.assertEqual(self.client.get(reverse('polls:api_results', args=(unpublished.pk,))).status_code, 404)
+
+
+    @override_settings(POLLS_RESULTS_CACHE='default')
+    def test_versioned_etag(self):
+        """With the results cache on, a current ETag costs only the published check."""
+        results_cache.get_cache().clear()
+        etag = self.client.get(self.results_url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.results_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.client.post(self.vote_url, {'choice': self.choice.pk}, content_type='application/json')
+        response = self.client.get(self.results_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+    def test_vote_returns_counts(self):
+        """Voting answers with the updated counts instead of a redirect."""
+        with self.assertNumQueries(3):
+            response = self.client.post(self.vote_url, {'choice': self.choice.pk}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['choices'][0]['total_votes'], 1)
+        response = self.client.post(self.vote_url, {'choice': 0}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'invalid_choice'})
+        self.assertEqual(self.client.get(self.vote_url).status_code, 405)
+
+
+    def test_vote_takes_only_json(self):
+        """A form post, as another site could make on the visitor's behalf, counts no vote."""
+        response = self.client.post(self.vote_url, {'choice': self.choice.pk})
+        self.assertEqual(response.status_code, 415)
+        response = self.client.post(self.vote_url, 'choice=1', content_type='text/plain')
+        self.assertEqual(response.status_code, 415)
+        for body in ('{', '[]', '{"choice": {}}'):
+            response = self.client.post(self.vote_url, body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+        self.assertEqual(Choice.objects.get(pk=self.choice.pk).vote, 0)
+
+
+    @override_settings(POLLS_VOTE_DEDUP={'KEY': 'cookie'}, POLLS_VOTE_RATE_LIMIT={'RATE': 1, 'BURST': 2})
+    def test_vote_guards(self):
+        """Repeat voters get a 409 and clients over the rate limit a 429."""
+        self.client.post(self.vote_url, {'choice': self.choice.pk}, content_type='application/json')
+        with self.assertNumQueries(0):
+            response = self.client.post(self.vote_url, {'choice': self.choice.pk}, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        response = self.client.post(self.vote_url, {'choice': self.choice.pk}, content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+
+
+    def test_batch(self):
+        """Results of many questions come back in one query, with unknown ids listed."""
+        other = create_question("Other?", -2)
+        create_choice(other, "Maybe")
+        future = create_question("Future?", 5)
+        create_choice(future, "Later")
+        url = reverse('polls:api_batch_results')
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'ids': f'{other.pk},{self.question.pk},{future.pk},999'})
+        data = response.json()
+        self.assertEqual([result['question'] for result in data['results']], [other.pk, self.question.pk])
+        self.assertEqual(len(data['results'][1]['choices']), 2)
+        self.assertEqual(data['missing'], [future.pk, 999])
+        self.assertEqual(self.client.get(url, {'ids': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ids': ','.join(map(str, range(101)))}).status_code, 400)
+
+
+class FakeConnection:
+    """Stand-in DB-API connection for the pool tests."""
+    def __init__(self):
+        self.closed = False
+        self.healthy = True
+
+    def rollback(self):
+        pass
+
+    def cursor(self):
+        if not self.healthy:
+            raise OSError("connection lost")
+        return self
+
+    def execute(self, sql):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(TestCase):
+    """Tests for the pooled database engine and the pool itself."""
+    def test_engine_reuses_connections(self):
+        """Closing a pooled connection hands it back, so requests don't open new ones."""
+        pool_dir = tempfile.TemporaryDirectory()
+        connections.settings['pooled'] = {
+            **connections['default'].settings_dict,
+            'ENGINE': 'polls.backends.pooled',
+            'NAME': os.path.join(pool_dir.name, 'pooled.sqlite3'),
+            'POOL': {'ENGINE': 'django.db.backends.sqlite3', 'MIN_SIZE': 1, 'MAX_SIZE': 2},
+        }
+        self.addCleanup(pool_dir.cleanup)
+        self.addCleanup(connections.settings.pop, 'pooled')
+        self.addCleanup(pool.close_all)
+        self.addCleanup(connections.__delitem__, 'pooled')
+        self.addCleanup(lambda: connections['pooled'].close())
+        for _ in range(20):
+            with connections['pooled'].cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connections['pooled'].close()
+        self.assertEqual(pool.stats()['pooled'], {
+            'size': 1, 'idle': 1, 'in_use': 0, 'waiting': 0, 'created': 1, 'timeouts': 0,
+        })
+        self.assertIn('polls_db_pool_created_total{alias="pooled"} 1', metrics.registry.export())
+
+
+    def test_overload(self):
+        """Waiting longer than the timeout raises PoolOverloaded, served as a 503."""
+        connection_pool = pool.ConnectionPool(FakeConnection, max_size=1, timeout=0.01)
+        connection = connection_pool.acquire()
+        with self.assertRaises(pool.PoolOverloaded):
+            connection_pool.acquire()
+        self.assertEqual(connection_pool.stats()['timeouts'], 1)
+        connection_pool.release(connection)
+        self.assertIs(connection_pool.acquire(), connection)
+        response = middleware.PoolOverloadMiddleware(lambda request: None).process_exception(
+            RequestFactory().get('/'), pool.PoolOverloaded())
+        self.assertEqual(response.status_code, 503)
+
+
+    def test_waiter_gets_released_connection(self):
+        """A request waiting for a connection gets the next one released."""
+        connection_pool = pool.ConnectionPool(FakeConnection, max_size=1, timeout=5)
+        connection = connection_pool.acquire()
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(connection_pool.acquire()))
+        waiter.start()
+        while not connection_pool.stats()['waiting']:
+            pass
+        connection_pool.release(connection)
+        waiter.join()
+        self.assertEqual(acquired, [connection])
+
+
+    def test_lifetime_and_health_check(self):
+        """Expired and broken connections are closed and replaced."""
+        connection_pool = pool.ConnectionPool(FakeConnection, max_lifetime=0)
+        connection = connection_pool.acquire()
+        connection_pool.release(connection)
+        self.assertTrue(connection.closed)
+        connection_pool = pool.ConnectionPool(FakeConnection, check_after=0)
+        connection = connection_pool.acquire()
+        connection_pool.release(connection)
+        connection.healthy = False
+        replacement = connection_pool.acquire()
+        self.assertIsNot(replacement, connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(connection_pool.stats()['created'], 2)
+        connection_pool.release(replacement, broken=True)
+        self.assertEqual(connection_pool.stats()['size'], 0)
+
+
+class SchedulerTests(TestCase):
+    """Tests for the materialized published set."""
+    def test_published_set_follows_choices_and_dates(self):
+        """Questions join the set once they have a choice and their date has passed."""
+        question = create_question("Now?", -1)
+        self.assertFalse(Question.objects.published().exists())
+        choice = create_choice(question, "Yes")
+        self.assertQuerysetEqual(Question.objects.published(), [question])
+        choice.delete()
+        self.assertFalse(Question.objects.published().exists())
+        where = str(Question.objects.published().query).split(' WHERE ')[1]
+        self.assertNotIn('pub_date', where)
+
+
+    def test_publish_due(self):
+        """Future questions go live when publish_due() runs after their date, with an event."""
+        future_question = create_question("Later?", 1)
+        create_choice(future_question, "Yes")
+        self.assertFalse(Question.objects.published().exists())
+        self.assertEqual(scheduler.publish_due(), [])
+        self.assertEqual(scheduler.next_due(), future_question.pub_date)
+        published = []
+
+        def receiver(sender, question_ids, **kwargs):
+            published.extend(question_ids)
+
+        scheduler.questions_published.connect(receiver)
+        self.addCleanup(scheduler.questions_published.disconnect, receiver)
+        scheduler.publish_due(timezone.now() + datetime.timedelta(days=2))
+        self.assertEqual(published, [future_question.pk])
+        self.assertQuerysetEqual(Question.objects.published(), [future_question])
+
+
+    def test_publish_due_uses_scheduled_index(self):
+        """publish_due() reads the scheduled questions through their partial index, not the whole table."""
+        create_choice(create_question("Later?", 1), "Yes")
+        with CaptureQueriesContext(connections['default']) as queries:
+            scheduler.publish_due(timezone.now() + datetime.timedelta(days=2))
+        plans = []
+        with connections['default'].cursor() as cursor:
+            for query in queries:
+                cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                plans.append(' '.join(str(row) for row in cursor.fetchall()))
+        self.assertFalse([plan for plan in plans if 'SCAN polls_question' in plan])
+        self.assertIn('question_scheduled_idx', plans[0])
+        self.assertIsNone(scheduler.next_due())
+
+
+    @override_settings(POLLS_PUBLISH_RECHECK_SECONDS=0)
+    def test_request_publishes_due_questions(self):
+        """Requests pick up questions made due behind the scheduler's back."""
+        question = create_question("Imported?", 1)
+        create_choice(question, "Yes")
+        Question.objects.filter(pk=question.pk).update(pub_date=timezone.now() - datetime.timedelta(minutes=1))
+        self.assertContains(self.client.get(reverse('polls:index')), "Imported?")
+
+
+    def test_stale_save_keeps_published_question(self):
+        """A question published on schedule stays live when an instance loaded before its choices is saved."""
+        question = Question.objects.create(question_text="Soon?", pub_date=timezone.now() + datetime.timedelta(milliseconds=50))
+        stale = Question.objects.get(pk=question.pk)
+        create_choice(question, "Yes")
+        self.assertFalse(Question.objects.published().exists())
+        time.sleep(0.1)
+        self.assertEqual(scheduler.publish_due(), [question.pk])
+        stale.save()
+        self.assertQuerysetEqual(Question.objects.published(), [question])
+
+
+class ArchivePollsTests(TestCase):
+    """Tests for archiving old polls and reading their results back."""
+    def setUp(self):
+        self.old = create_question("Old?", -400)
+        create_choice(self.old, "Yes")
+        Choice.objects.filter(question=self.old).update(vote=3)
+        self.recent = create_question("Recent?", -1)
+        create_choice(self.recent, "No")
+
+
+    def archive(self, *args):
+        out = StringIO()
+        call_command('archive_polls', '--older-than', '365', *args, stdout=out)
+        return out.getvalue()
+
+
+    @override_settings(POLLS_VOTE_SHARDS=2)
+    def test_moves_old_polls_with_tallies(self):
+        """Old questions leave the hot tables and keep their final counts, shards included."""
+        counters.increment(self.old.choice_set.get().pk)
+        output = self.archive()
+        self.assertIn("Archived 1 question(s) with 1 choice(s)", output)
+        self.assertIn("polls_question", output)
+        self.assertIn("published list", output)
+        self.assertQuerysetEqual(Question.objects.all(), [self.recent])
+        self.assertFalse(Choice.objects.filter(question_id=self.old.pk).exists())
+        archived = ArchivedQuestion.objects.get(pk=self.old.pk)
+        self.assertEqual(archived.question_text, "Old?")
+        self.assertEqual([(c['choice_text'], c['total_votes']) for c in archived.results], [("Yes", 4)])
+
+
+    def test_batches(self):
+        """Every old question is archived whatever the batch size."""
+        for n in range(3):
+            create_choice(create_question(f"Older {n}?", -500), "Maybe")
+        self.assertIn("Archived 4 question(s)", self.archive('--batch-size', '1'))
+        self.assertEqual(ArchivedQuestion.objects.count(), 4)
+        self.assertEqual(Question.objects.count(), 1)
+
+
+    def test_results_view_falls_back_to_archive(self):
+        """Archived results stay readable; voting on them is a 404."""
+        self.archive()
+        response = self.client.get(reverse('polls:results', args=(self.old.pk,)))
+        self.assertContains(response, "Yes - 3votes")
+        self.assertContains(response, "This poll is closed.")
+        self.assertEqual(self.client.get(reverse('polls:detail', args=(self.old.pk,))).status_code, 404)
+        self.assertEqual(self.client.get(reverse('polls:results', args=(12345,))).status_code, 404)
+
+
+    async def test_async_results_view_falls_back_to_archive(self):
+        """The async results view reads the archive too."""
+        await sync_to_async(self.archive)()
+        response = await async_views.ResultsView.as_view()(AsyncRequestFactory().get('/'), pk=self.old.pk)
+        self.assertContains(response, "Yes - 3votes")
+
+
+class StartupTests(TestCase):
+    """Warm-up at boot and the startup profile."""
+
+    def tearDown(self):
+        gc.unfreeze()
+
+
+    def test_warm_up_compiles_templates_and_urls(self):
+        """After warm-up, the polls templates are in the cached loader and the URLconf is loaded."""
+        from django.template import engines
+        from django.urls import clear_url_caches, get_resolver
+
+        loader = engines['django'].engine.template_loaders[0]
+        loader.reset()
+        clear_url_caches()
+        timings = warmup.on_boot()
+        self.assertEqual(set(timings), {'urls', 'templates', 'orm', 'gc'})
+        self.assertIn('polls/detail.html', loader.get_template_cache)
+        self.assertIn('polls/results.html', loader.get_template_cache)
+        self.assertTrue(get_resolver()._populated)
+        self.assertGreater(gc.get_freeze_count(), 0)
+
+
+    @override_settings(POLLS_WARM_UP=False)
+    def test_warm_up_can_be_turned_off(self):
+        self.assertIsNone(warmup.on_boot())
+
+
+    def test_profile_startup(self):
+        """The command boots a fresh interpreter and reports every phase."""
+        out, err = StringIO(), StringIO()
+        call_command('profile_startup', '--repeat', '1', '--top', '3', '--path', '/polls/no-such-page/',
+                     stdout=out, stderr=err)
+        output = out.getvalue()
+        for phase in ('django', 'settings', 'apps', 'admin', 'handler', 'warm_up', 'first_request', 'total'):
+            self.assertIn(phase, output)
+        self.assertIn("Slowest imports by cumulative time", output)
+        self.assertIn("got a 404", err.getvalue())
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'rendering-tests'}},
+    POLLS_RESULTS_CACHE='default',
+)
+class RenderingTests(TestCase):
+    """Precomputed question URLs and cached choice fragments."""
+    def setUp(self):
+        results_cache.get_cache().clear()
+        self.question = create_question("Rendered?", -1)
+        self.choice = create_choice(self.question, "Choice 1")
+        self.detail_url = reverse('polls:detail', args=(self.question.id,))
+
+
+    def test_question_url_matches_reverse(self):
+        """The precomputed URL is what reverse() gives, script prefix included."""
+        from django.urls import get_script_prefix, set_script_prefix
+
+        for name in ('polls:detail', 'polls:results', 'polls:vote'):
+            self.assertEqual(rendering.question_url(name, 42), reverse(name, args=(42,)))
+        prefix = get_script_prefix()
+        set_script_prefix('/mounted/')
+        try:
+            self.assertEqual(rendering.question_url('polls:detail', 7), '/mounted/polls/7/')
+        finally:
+            set_script_prefix(prefix)
+
+
+    def test_detail_fragment_is_cached(self):
+        """A cached choice list saves the choices query until the choices change."""
+        self.client.get(self.detail_url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.detail_url)
+        self.assertContains(response, 'value="%d"' % self.choice.id)
+        create_choice(self.question, "Choice 2")
+        self.assertContains(self.client.get(self.detail_url), "Choice 2")
+
+
+    def test_results_fragment_follows_votes(self):
+        """A vote bumps the results version, so the results list is rendered again."""
+        results_url = reverse('polls:results', args=(self.question.id,))
+        self.assertContains(self.client.get(results_url), "Choice 1 - 0votes")
+        self.client.post(reverse('polls:vote', args=(self.question.id,)), {"choice": self.choice.id})
+        self.assertContains(self.client.get(results_url), "Choice 1 - 1vote")
+
+
+    @override_settings(POLLS_CACHE_FRAGMENTS=False)
+    def test_fragments_can_be_turned_off(self):
+        self.client.get(self.detail_url)
+        with self.assertNumQueries(2):
+            self.client.get(self.detail_url)
@@ -1,13 +1,26 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views
+
+if getattr(settings, 'POLLS_ASYNC_VIEWS', False):
+    from . import async_views as vote_views
+else:
+    vote_views = views
 
 app_name = 'polls'
 urlpatterns = [
     path('', views.IndexView.as_view(), name='index'),
-    path('<int:pk>/', views.DetailView.as_view(), name="detail"),
-    path('<int:pk>/results/', views.ResultsView.as_view(), name="results"),
-    path('<int:question_id>/vote/', views.vote, name="vote"),
+    path('<int:pk>/', vote_views.DetailView.as_view(), name="detail"),
+    path('<int:pk>/results/', vote_views.ResultsView.as_view(), name="results"),
+    path('<int:pk>/results/stream/', views.results_stream, name="results_stream"),
+    path('<int:question_id>/vote/', vote_views.vote, name="vote"),
     path('add_question/', views.add_question, name="add_question"),
     path('published_questions/', views.PublishedQuestionsView.as_view(), name="published_questions"),
+    path('search/', views.SearchView.as_view(), name="search"),
+    path('export/', views.export_results, name="export"),
+    path('api/<int:pk>/results/', api.results, name="api_results"),
+    path('api/<int:pk>/vote/', api.vote, name="api_vote"),
+    path('api/results/', api.batch_results, name="api_batch_results"),
+    path('_metrics', views.metrics_view, name="metrics"),
 
-]
\ No newline at end of file
+]
@@ -1,66 +1,181 @@
+import hmac
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.decorators import permission_required
 from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseRedirect, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.urls import reverse
-from django.db.models import F
+from django.db import transaction
+from django.utils.decorators import method_decorator
 from django.views import generic
-from django.utils import timezone
 from django.forms import modelformset_factory
 
 from .models import Question, Choice
 from .forms import QuestionForm
+from . import archive, counters, events, export, live, metrics, page_cache, pagination, ratelimit, results_cache, routers, search, vote_buffer
 
+@method_decorator(routers.read_from_replica, name='dispatch')
+@method_decorator(page_cache.cached_page, name='dispatch')
 class IndexView(generic.ListView):
     template_name = 'polls/index.html'
     context_object_name = 'latest_question_list'
 
     def get_queryset(self):
         """Return the last 5 published questions up until now(not including future questions)."""
-        return Question.objects.filter(pub_date__lte=timezone.now()).order_by('-pub_date').exclude(choice__isnull=True)[:5]
+        return Question.objects.published().order_by('-pub_date')[:5]
 
 
+@method_decorator(routers.read_from_replica, name='dispatch')
+@method_decorator(page_cache.cached_page, name='dispatch')
 class PublishedQuestionsView(generic.ListView):
     template_name = 'polls/published_questions.html'
+    items_template_name = 'polls/question_items.html'
     context_object_name = 'published_questions_list'
+    paginate_by = 50
     
     def get_queryset(self):
         """Return all published questions"""
-        return Question.objects.filter(pub_date__lte=timezone.now()).order_by('-pub_date').exclude(choice__isnull=True)
+        return Question.objects.published().order_by('-pub_date')
+
+    def get_paginate_by(self, queryset):
+        return getattr(settings, 'POLLS_PUBLISHED_PAGE_SIZE', self.paginate_by)
+
+    def paginate_queryset(self, queryset, page_size):
+        """Paginate with a keyset cursor from ?cursor= instead of page numbers."""
+        page = pagination.keyset_page(queryset, self.request.GET.get('cursor'), page_size)
+        return (None, page, page.object_list, page.has_next())
+
+    def get(self, request, *args, **kwargs):
+        if getattr(settings, 'POLLS_STREAM_PUBLISHED_QUESTIONS', False):
+            # The response is iterated after read_from_replica has reset the routing.
+            chunks = routers.iterate_on(routers.current_replica.get(), self.stream_questions())
+            return StreamingHttpResponse(chunks)
+        return super().get(request, *args, **kwargs)
+
+    def stream_questions(self):
+        """Render the whole list in chunks straight from the database cursor."""
+        chunk_size = self.get_paginate_by(None)
+        questions = pagination.keyset_order(self.get_queryset()).iterator(chunk_size=chunk_size)
+        yield render_to_string('polls/published_questions_header.html', request=self.request)
+        chunk = list(islice(questions, chunk_size))
+        if not chunk:
+            yield '<p>No polls are available.</p>'
+            return
+        yield '<ul>'
+        while chunk:
+            yield render_to_string(self.items_template_name, {'questions': chunk}, request=self.request)
+            chunk = list(islice(questions, chunk_size))
+        yield '</ul>'
+
+
+@method_decorator(routers.read_from_replica, name='dispatch')
+class SearchView(generic.ListView):
+    template_name = 'polls/search.html'
+    context_object_name = 'questions'
+    limit = 20
+
+    def get_queryset(self):
+        """Return the best matches for ?q= among published questions."""
+        return search.search_questions(self.request.GET.get('q', ''), self.limit)
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.request.GET.get('q', '')
+        return context
 
+
+@method_decorator(routers.read_from_replica, name='dispatch')
 class DetailView(generic.DetailView):
     model = Question
     template_name = 'polls/detail.html'
 
     def get_queryset(self):
-        """Excludes questions that aren't published yet."""
-        return Question.objects.filter(pub_date__lte=timezone.now()).exclude(choice__isnull=True)
+        """Excludes questions that aren't published yet.
 
+        The choices are read by the template's choice fragment, and only when
+        it isn't cached (see ``polls.rendering``).
+        """
+        return Question.objects.published()
 
 
+@method_decorator(routers.read_from_replica, name='dispatch')
 class ResultsView(generic.DetailView):
     model = Question
     template_name = 'polls/results.html'
 
     def get_queryset(self):
         """Exclude all questions that aren't published yet."""
-        return Question.objects.filter(pub_date__lte=timezone.now()).exclude(choice__isnull=True)
+        return Question.objects.published()
+
+    def get(self, request, *args, **kwargs):
+        """Fall back to the final results of archived questions."""
+        try:
+            return super().get(request, *args, **kwargs)
+        except Http404:
+            archived = archive.get_archived(kwargs['pk'])
+            if archived is None:
+                raise
+            return render(request, self.template_name, {
+                'question': archived, 'choices': archived.results, 'archived': True,
+            })
+
+    def get_context_data(self, **kwargs):
+        """Add the choices with their vote totals, including votes still held in shards."""
+        context = super().get_context_data(**kwargs)
+        context['choices'] = vote_buffer.with_pending(results_cache.get_results(self.object.pk))
+        if events.enabled():
+            context['timeline'] = events.timeline(self.object.pk)
+        return context
+
+
+@routers.read_from_replica
+def results_stream(request, pk):
+    """Single-snapshot fallback of the live results stream for WSGI deployments.
+
+    Under ASGI this URL is served by ``polls.live.LiveResultsRouter``.
+    """
+    question = get_object_or_404(Question.objects.published(), pk=pk)
+    results = vote_buffer.with_pending(results_cache.get_results(question.pk))
+    retry = int(getattr(settings, 'POLLS_LIVE_INTERVAL', 1.0) * 1000)
+    response = HttpResponse(f'retry: {retry}\n'.encode() + live.encode_event(question.pk, results),
+                            content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def record_vote(request, question_id, choice_id):
+    """Count one vote for a choice of the question, buffered or straight to its counter."""
+    if vote_buffer.enabled():
+        vote_buffer.add(choice_id)
+    else:
+        counters.increment(choice_id)
+        results_cache.bump(question_id)
+    if events.enabled():
+        events.record(request, question_id, choice_id)
 
 
+@routers.stick_to_primary
+@ratelimit.guard_vote
 def vote(request, question_id):
     """Voting page for question choices."""
-    queryset = Question.objects.filter(pub_date__lte=timezone.now()).exclude(choice__isnull=True)
-    question = get_object_or_404(queryset, pk=question_id)
+    queryset = Question.objects.published()
     try:
-        selected_choice = question.choice_set.get(pk=request.POST["choice"])
-    except (KeyError, Choice.DoesNotExist):
+        # One query for the choice and the published check of its question.
+        selected_choice = Choice.objects.get(
+            pk=request.POST["choice"],
+            question__in=queryset.filter(pk=question_id),
+        )
+    except (KeyError, ValueError, Choice.DoesNotExist):
+        question = get_object_or_404(queryset, pk=question_id)
         return render(request, "polls/detail.html", {'question': question, "error_message": "You didn't select a choice."})
     else:
-        # To avoid race condition
-        selected_choice.vote = F("vote") + 1
-        selected_choice.save()
-    return HttpResponseRedirect(reverse("polls:results", args=(question.id,)))
+        record_vote(request, question_id, selected_choice.pk)
+    return HttpResponseRedirect(reverse("polls:results", args=(question_id,)))
     
 
+@routers.stick_to_primary
 def add_question(request):
     """Add new question with choices"""
     ChoiceFormSet = modelformset_factory(Choice, fields=('choice_text',), extra=3,)
@@ -68,14 +183,59 @@ def add_question(request):
         question_form = QuestionForm(request.POST)
         choice_formset = ChoiceFormSet(request.POST)
         if question_form.is_valid() and choice_formset.is_valid():
-            question = question_form.save()
             choices = choice_formset.save(commit=False)
-            for choice in choices:
-                choice.question = question
-                choice.save()
+            with transaction.atomic():
+                question = question_form.save(commit=False)
+                question.has_choices = bool(choices)
+                question.save()
+                for choice in choices:
+                    choice.question = question
+                Choice.objects.bulk_create(choices)
+                search.add_to_index([(question.pk, question.question_text, [c.choice_text for c in choices])])
             return HttpResponseRedirect(reverse("polls:index"))
     else:
         question_form = QuestionForm()
         choice_formset = ChoiceFormSet(queryset=Choice.objects.none())
     return render(request, 'polls/add_question.html', {'question_form': question_form, 'choice_formset': choice_formset})
 
+
+@permission_required('polls.view_question', raise_exception=True)
+def export_results(request):
+    """Stream all results as CSV or JSONL (``?format=``, ``?since=``), gzipped if the client accepts it."""
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in export.FORMATS:
+        return HttpResponseBadRequest(f'Unknown format {file_format!r}.')
+    since = None
+    if request.GET.get('since'):
+        try:
+            since = export.parse_since(request.GET['since'])
+        except ValueError as exc:
+            return HttpResponseBadRequest(str(exc))
+    chunks = export.export_chunks(file_format, since)
+    content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+    gzipped = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    response = StreamingHttpResponse(export.gzip_chunks(chunks) if gzipped else chunks,
+                                     content_type=f'{content_type}; charset=utf-8')
+    if gzipped:
+        response['Content-Encoding'] = 'gzip'
+    response['Vary'] = 'Accept-Encoding'
+    response['Content-Disposition'] = f'attachment; filename="results.{file_format}"'
+    return response
+
+
+def may_read_metrics(request):
+    """Staff users, and scrapers sending ``Authorization: Bearer <POLLS_METRICS_TOKEN>``."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    token = getattr(settings, 'POLLS_METRICS_TOKEN', None)
+    return bool(token) and hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode(),
+    )
+
+
+def metrics_view(request):
+    """Request metrics in the Prometheus text format, for staff and holders of the metrics token."""
+    if not may_read_metrics(request):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.registry.export(), content_type='text/plain; version=0.0.4')
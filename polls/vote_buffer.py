@@ -0,0 +1,280 @@
+"""Write-behind buffering of votes.
+
+When ``POLLS_VOTE_BUFFER`` is set, ``vote()`` only records the increment in a
+buffer and a flusher applies the accumulated counts with one grouped
+``UPDATE ... SET vote = vote + n`` per distinct ``n``. The setting is a dict in
+the style of ``CACHES``::
+
+    POLLS_VOTE_BUFFER = {
+        'BACKEND': 'polls.vote_buffer.LocalVoteBuffer',
+        'LOG': BASE_DIR / 'votes.log',  # optional append log
+        'INTERVAL': 0.25,               # seconds between background flushes
+        'MAX_VOTES': 500,               # flush inline once this many are pending
+        'READ_YOUR_VOTES': True,        # results include this process's buffered votes
+    }
+
+Durability: with ``LOG`` set every vote is appended to the log before it is
+acknowledged and the log is replayed when the buffer is created again, so a
+crashed process loses no votes. A crash between applying a flush to the
+database and discarding its log can re-apply that one batch on replay. Without
+``LOG``, at most ``MAX_VOTES`` votes, or ``INTERVAL`` seconds worth of votes,
+are lost per process on a crash.
+
+``LocalVoteBuffer`` keeps the counts in process memory; a shared backend
+(e.g. Redis) only has to implement the methods of ``BaseVoteBuffer``. ``LOG``
+must be a distinct path per worker process.
+
+``READ_YOUR_VOTES`` only holds within one process: the results add the
+votes pending in this process's buffer, so with several workers a voter
+whose next request is served by another worker doesn't see their vote until
+it is flushed, up to ``INTERVAL`` seconds later. A shared backend extends the
+guarantee to every process that uses it.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from . import results_cache
+from .models import Choice
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'polls.vote_buffer.LocalVoteBuffer',
+    'LOG': None,
+    'INTERVAL': 0.25,
+    'MAX_VOTES': 500,
+    'READ_YOUR_VOTES': False,
+}
+
+
+class BaseVoteBuffer:
+    """Interface for vote buffers."""
+
+    def __init__(self, log=None):
+        self.log = log
+
+    def add(self, choice_id, n=1):
+        """Record ``n`` votes for a choice and return the number of pending votes."""
+        raise NotImplementedError
+
+    def drain(self):
+        """Remove and return the pending counts as a ``{choice_id: n}`` dict."""
+        raise NotImplementedError
+
+    def commit(self):
+        """Forget the last drained batch once it has been written to the database."""
+
+    def requeue(self, counts):
+        """Put a drained batch back after a failed flush."""
+        for choice_id, n in counts.items():
+            self.add(choice_id, n)
+        self.commit()
+
+    def pending(self, choice_ids):
+        """Return the pending counts for the given choices."""
+        raise NotImplementedError
+
+
+class LocalVoteBuffer(BaseVoteBuffer):
+    """In-process buffer with an optional append-only log."""
+
+    def __init__(self, log=None):
+        super().__init__(log)
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._total = 0
+        self._log_file = None
+        if self.log:
+            self.log = os.fspath(self.log)
+            self._replay()
+
+    @property
+    def _flushing_log(self):
+        return self.log + '.flushing'
+
+    def _replay(self):
+        """Load votes left over by a previous process and rewrite them into a fresh log."""
+        for path in (self._flushing_log, self.log):
+            if os.path.exists(path):
+                with open(path) as log:
+                    for line in log:
+                        fields = line.split()
+                        # A torn last line means the vote was never acknowledged.
+                        if len(fields) == 2:
+                            self._counts[int(fields[0])] += int(fields[1])
+        self._total = sum(self._counts.values())
+        self._log_file = open(self.log + '.tmp', 'w')
+        self._write_log(self._counts)
+        os.replace(self.log + '.tmp', self.log)
+        if os.path.exists(self._flushing_log):
+            os.remove(self._flushing_log)
+
+    def _write_log(self, counts):
+        if self._log_file is None:
+            return
+        self._log_file.writelines(f'{choice_id} {n}\n' for choice_id, n in counts.items())
+        self._log_file.flush()
+
+    def add(self, choice_id, n=1):
+        with self._lock:
+            self._write_log({choice_id: n})
+            self._counts[choice_id] += n
+            self._total += n
+            return self._total
+
+    def drain(self):
+        with self._lock:
+            counts, self._counts = dict(self._counts), Counter()
+            self._total = 0
+            if self._log_file is not None:
+                self._log_file.close()
+                os.replace(self.log, self._flushing_log)
+                self._log_file = open(self.log, 'a')
+            return counts
+
+    def commit(self):
+        if self.log and os.path.exists(self._flushing_log):
+            os.remove(self._flushing_log)
+
+    def pending(self, choice_ids):
+        with self._lock:
+            return {choice_id: self._counts[choice_id] for choice_id in choice_ids if self._counts[choice_id]}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'POLLS_VOTE_BUFFER', {})}
+
+
+def enabled():
+    """Return True if votes should be buffered."""
+    return bool(getattr(settings, 'POLLS_VOTE_BUFFER', None))
+
+
+_buffer = None
+_flusher = None
+_buffer_lock = threading.Lock()
+_flush_lock = threading.Lock()
+
+
+def get_buffer():
+    """Return the process-wide vote buffer, starting the flusher on first use."""
+    global _buffer, _flusher
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                config = get_config()
+                _buffer = import_string(config['BACKEND'])(log=config['LOG'])
+                if config['INTERVAL']:
+                    _flusher = Flusher(config['INTERVAL'])
+                    _flusher.start()
+    return _buffer
+
+
+def apply(counts):
+    """Add the buffered counts to ``Choice.vote``, one UPDATE per distinct count."""
+    by_count = defaultdict(list)
+    for choice_id, n in counts.items():
+        by_count[n].append(choice_id)
+    with transaction.atomic():
+        for n, choice_ids in by_count.items():
+            Choice.objects.filter(pk__in=choice_ids).update(vote=F('vote') + n)
+    question_ids = Choice.objects.filter(pk__in=counts).values_list('question_id', flat=True).distinct()
+    results_cache.bump(*question_ids)
+
+
+def flush():
+    """Write all pending votes to the database and return how many were written."""
+    buffer = get_buffer()
+    with _flush_lock:
+        counts = buffer.drain()
+        if not counts:
+            buffer.commit()
+            return 0
+        try:
+            apply(counts)
+        except Exception:
+            buffer.requeue(counts)
+            raise
+        buffer.commit()
+    return sum(counts.values())
+
+
+def add(choice_id):
+    """Buffer one vote, flushing inline once ``MAX_VOTES`` are pending."""
+    if get_buffer().add(choice_id) >= get_config()['MAX_VOTES']:
+        flush()
+
+
+def pending(choice_ids):
+    """Return buffered counts for the choices if results should read your own votes."""
+    if not enabled() or not get_config()['READ_YOUR_VOTES']:
+        return {}
+    return get_buffer().pending(choice_ids)
+
+
+def with_pending(results):
+    """Add still-buffered votes to a list of result dicts (see ``results_cache``)."""
+    buffered = pending([choice['id'] for choice in results])
+    if not buffered:
+        return results
+    return [
+        {**choice, 'total_votes': choice['total_votes'] + buffered.get(choice['id'], 0)}
+        for choice in results
+    ]
+
+
+class Flusher(threading.Thread):
+    """Daemon thread calling ``flush_func`` (the vote buffer's by default) every ``interval`` seconds."""
+
+    def __init__(self, interval, flush_func=None, name='vote-buffer-flusher'):
+        super().__init__(name=name, daemon=True)
+        self.interval = interval
+        self.flush_func = flush_func or flush
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            close_old_connections()
+            try:
+                self.flush_func()
+            except Exception:
+                # The batch was requeued; try again on the next tick.
+                logger.exception('%s failed', self.name)
+
+    def stop(self):
+        self.stopped.set()
+
+
+def reset():
+    """Stop the flusher and drop the buffer (used when settings change)."""
+    global _buffer, _flusher
+    with _buffer_lock:
+        if _flusher is not None:
+            _flusher.stop()
+        _buffer = _flusher = None
+
+
+@atexit.register
+def _flush_at_exit():
+    if _buffer is not None:
+        try:
+            flush()
+        except Exception:
+            logger.exception('Flushing buffered votes at exit failed')
+
+
+def _setting_changed(setting, **kwargs):
+    if setting == 'POLLS_VOTE_BUFFER':
+        reset()
+
+
+setting_changed.connect(_setting_changed)
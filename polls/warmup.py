@@ -0,0 +1,92 @@
+"""Warm-up at boot, so a new worker's first request isn't the slow one.
+
+Django imports the URLconf (and with it every view module) and compiles
+templates on first use, i.e. during the first request a worker serves.
+``on_boot()``, called by ``sondage/wsgi.py`` and ``sondage/asgi.py`` once the
+application is built, does that work up front: it populates the URL resolver,
+compiles the polls templates into the cached template loader, and imports
+the SQL compiler and builds the query objects the first query would need.
+Last, it collects garbage and freezes everything allocated so far
+(``gc.freeze()``): otherwise the first full collection, over the hundreds of
+thousands of objects a boot allocates, lands in an early request. Frozen
+objects also stay shared between the workers of a server that forks after
+loading the application. Nothing connects to the database, so it is safe to
+run before the fork.
+
+It is on by default; set ``POLLS_WARM_UP = False`` to boot lazily.
+``manage.py profile_startup`` shows what it saves.
+"""
+import gc
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateDoesNotExist, engines
+from django.urls import get_resolver, reverse
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / 'templates'
+
+
+def template_names():
+    """Names of the polls templates, e.g. 'polls/detail.html'."""
+    return sorted(path.relative_to(TEMPLATE_DIR).as_posix() for path in TEMPLATE_DIR.glob('polls/*.html'))
+
+
+def warm_urls():
+    """Import the URLconf, build the resolver's reverse lookup tables and the question URL prefixes."""
+    from . import rendering
+
+    resolver = get_resolver()
+    resolver.url_patterns
+    reverse('polls:index')
+    for name in ('polls:detail', 'polls:vote'):
+        rendering.url_parts(name)
+
+
+def warm_templates():
+    """Compile the polls templates (and the ones they extend or include) in every engine."""
+    for engine in engines.all():
+        # Django engines also import their context processors on first render.
+        if hasattr(engine, 'engine'):
+            engine.engine.template_context_processors
+        for name in template_names():
+            try:
+                engine.get_template(name)
+            except TemplateDoesNotExist:
+                # An engine that doesn't look in app directories.
+                pass
+
+
+def warm_orm():
+    """Import the SQL compilers and build (not run) a first query, without connecting."""
+    from .models import Question
+
+    for connection in connections.all():
+        connection.ops.compiler('SQLCompiler')
+    # The first filter() fills the ABC caches behind isinstance(..., Mapping).
+    Question.objects.published()
+
+
+def freeze_garbage():
+    """Collect, then move every surviving object out of the collector's way."""
+    gc.collect()
+    gc.freeze()
+
+
+def warm_up():
+    """Warm the URL resolver, templates and ORM, then freeze the heap; return {step: seconds}."""
+    timings = {}
+    steps = (('urls', warm_urls), ('templates', warm_templates), ('orm', warm_orm), ('gc', freeze_garbage))
+    for step, func in steps:
+        start = time.perf_counter()
+        func()
+        timings[step] = time.perf_counter() - start
+    return timings
+
+
+def on_boot():
+    """Warm up unless ``POLLS_WARM_UP`` is off."""
+    if getattr(settings, 'POLLS_WARM_UP', True):
+        return warm_up()
+    return None
@@ -9,8 +9,18 @@ https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+# Django's handler, except that streamed responses are produced off the event loop.
+from polls.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sondage.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Serves the live results stream (polls:results_stream) natively.
+from polls.live import LiveResultsRouter  # noqa: E402
+from polls.warmup import on_boot  # noqa: E402
+
+application = LiveResultsRouter(django_application)
+
+# Import the URLconf and compile templates now rather than in the first request.
+on_boot()
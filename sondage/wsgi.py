@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sondage.settings')
 
 application = get_wsgi_application()
+
+# Import the URLconf and compile templates now rather than in the first request.
+from polls.warmup import on_boot  # noqa: E402
+
+on_boot()